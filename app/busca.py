@@ -0,0 +1,261 @@
+"""
+Busca textual indexada do admin.
+
+O `icontains` padrão do admin varre a tabela inteira. Para as colunas
+registradas em INDICES_BUSCA, a busca passa por um índice de texto:
+
+- PostgreSQL: índice GIN sobre to_tsvector('busca_sem_acento', colunas),
+  consultado com to_tsquery em modo prefixo (palavra:*). A configuração
+  busca_sem_acento é a 'simple' com unaccent (extensão criada pela migração)
+- SQLite: tabela virtual FTS5 (external content) mantida por triggers,
+  consultada com MATCH em modo prefixo ("palavra"*), com remove_diacritics
+
+Nos dois bancos a busca ignora acentos. Como casa prefixos de palavras,
+só colunas de texto corrido são indexadas: identificadores (telefone, NSU,
+slug) ficam no icontains, que encontra trechos do meio.
+
+Em outros bancos, ou se o índice não existir, o admin volta para a busca
+padrão. No SQLite, migrações que recriam a tabela removem os triggers:
+rode `python manage.py reconstruir_indices_busca` depois delas.
+"""
+import copy
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# model -> colunas indexadas (as migrações usam as mesmas listas)
+INDICES_BUSCA = {
+    'clientes.cliente': ['nome'],
+    'contratos.contrato': ['nome'],
+    'invoices.messagequeue': ['mensagem'],
+    'financeiro.despesaadicional': ['descricao', 'observacoes'],
+}
+
+CONFIGURACAO_PG = 'busca_sem_acento'
+SQL_CONFIGURACAO_PG = f"""
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{CONFIGURACAO_PG}') THEN
+        CREATE TEXT SEARCH CONFIGURATION {CONFIGURACAO_PG} (COPY = simple);
+        ALTER TEXT SEARCH CONFIGURATION {CONFIGURACAO_PG}
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple;
+    END IF;
+END
+$$
+"""
+
+_tabelas_fts = set()
+
+
+def termos_busca(texto: str) -> list:
+    """Palavras do termo de busca (apenas letras e dígitos)."""
+    return re.findall(r'\w+', texto.lower())
+
+
+def _vetor_pg(conexao, colunas) -> str:
+    partes = " || ' ' || ".join(
+        f"coalesce({conexao.ops.quote_name(coluna)}, '')" for coluna in colunas
+    )
+    return f"to_tsvector('{CONFIGURACAO_PG}', {partes})"
+
+
+def _tabela_fts(tabela: str) -> str:
+    return f'{tabela}_fts'
+
+
+def _sql_criar(conexao, tabela: str, colunas: list, pk: str = 'id') -> list:
+    q = conexao.ops.quote_name
+    if conexao.vendor == 'postgresql':
+        return [
+            'CREATE EXTENSION IF NOT EXISTS unaccent',
+            SQL_CONFIGURACAO_PG,
+            f'CREATE INDEX IF NOT EXISTS {q(tabela + "_busca_idx")} '
+            f'ON {q(tabela)} USING GIN ({_vetor_pg(conexao, colunas)})'
+        ]
+
+    fts = _tabela_fts(tabela)
+    lista = ', '.join(q(coluna) for coluna in colunas)
+    novos = ', '.join(f'new.{q(coluna)}' for coluna in colunas)
+    antigos = ', '.join(f'old.{q(coluna)}' for coluna in colunas)
+    remover = f"INSERT INTO {q(fts)}({q(fts)}, rowid, {lista}) VALUES ('delete', old.{q(pk)}, {antigos});"
+    inserir = f'INSERT INTO {q(fts)}(rowid, {lista}) VALUES (new.{q(pk)}, {novos});'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {q(fts)} USING fts5({lista}, content='{tabela}', "
+        f"content_rowid='{pk}', tokenize='unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER IF NOT EXISTS {q(fts + "_ai")} AFTER INSERT ON {q(tabela)} BEGIN {inserir} END',
+        f'CREATE TRIGGER IF NOT EXISTS {q(fts + "_ad")} AFTER DELETE ON {q(tabela)} BEGIN {remover} END',
+        f'CREATE TRIGGER IF NOT EXISTS {q(fts + "_au")} AFTER UPDATE ON {q(tabela)} BEGIN {remover} {inserir} END',
+        f"INSERT INTO {q(fts)}({q(fts)}) VALUES ('rebuild')",
+    ]
+
+
+def _sql_remover(conexao, tabela: str) -> list:
+    q = conexao.ops.quote_name
+    if conexao.vendor == 'postgresql':
+        return [f'DROP INDEX IF EXISTS {q(tabela + "_busca_idx")}']
+
+    fts = _tabela_fts(tabela)
+    return [
+        *(f'DROP TRIGGER IF EXISTS {q(fts + sufixo)}' for sufixo in ('_ai', '_ad', '_au')),
+        f'DROP TABLE IF EXISTS {q(fts)}',
+    ]
+
+
+def criar_indice(conexao, tabela: str, colunas: list) -> bool:
+    """
+    Cria (ou recria) o índice de busca de uma tabela.
+
+    Returns:
+        bool: False quando o banco não tem suporte
+    """
+    if conexao.vendor not in ('postgresql', 'sqlite'):
+        return False
+    with conexao.cursor() as cursor:
+        for sql in _sql_remover(conexao, tabela) + _sql_criar(conexao, tabela, colunas):
+            cursor.execute(sql)
+    _tabelas_fts.discard((conexao.alias, tabela))
+    return True
+
+
+def remover_indice(conexao, tabela: str) -> None:
+    if conexao.vendor not in ('postgresql', 'sqlite'):
+        return
+    with conexao.cursor() as cursor:
+        for sql in _sql_remover(conexao, tabela):
+            cursor.execute(sql)
+    _tabelas_fts.discard((conexao.alias, tabela))
+
+
+def operacao_indice_busca(model_label: str):
+    """RunPython que cria o índice de busca de um model (reversível)."""
+    from django.db import migrations
+
+    def criar(apps, schema_editor):
+        model = apps.get_model(model_label)
+        criar_indice(schema_editor.connection, model._meta.db_table, INDICES_BUSCA[model_label])
+
+    def remover(apps, schema_editor):
+        model = apps.get_model(model_label)
+        remover_indice(schema_editor.connection, model._meta.db_table)
+
+    return migrations.RunPython(criar, remover)
+
+
+def reconstruir_indices(alias: str = 'default') -> int:
+    """
+    Recria todos os índices de busca.
+
+    Returns:
+        int: Quantidade de índices criados
+    """
+    from django.apps import apps
+
+    conexao = connections[alias]
+    total = 0
+    for model_label, colunas in INDICES_BUSCA.items():
+        if criar_indice(conexao, apps.get_model(model_label)._meta.db_table, colunas):
+            total += 1
+    return total
+
+
+def _fts_existe(conexao, tabela: str) -> bool:
+    """Tabela FTS5 e os três triggers presentes (cacheado por processo)."""
+    chave = (conexao.alias, tabela)
+    if chave not in _tabelas_fts:
+        fts = _tabela_fts(tabela)
+        with conexao.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(*) FROM sqlite_master WHERE name IN (%s, %s, %s, %s)',
+                [fts, f'{fts}_ai', f'{fts}_ad', f'{fts}_au'],
+            )
+            if cursor.fetchone()[0] != 4:
+                return False
+        _tabelas_fts.add(chave)
+    return True
+
+
+def subconsulta_busca(model, texto: str):
+    """
+    Subquery com os IDs do model que casam com o texto, ou None se o
+    model não estiver indexado ou o banco não suportar.
+    """
+    colunas = INDICES_BUSCA.get(model._meta.label_lower)
+    termos = termos_busca(texto)
+    if not colunas or not termos:
+        return None
+
+    conexao = connections[model.objects.db]
+    q = conexao.ops.quote_name
+    tabela = model._meta.db_table
+    pk = model._meta.pk.column
+
+    if conexao.vendor == 'postgresql':
+        consulta = ' & '.join(f'{termo}:*' for termo in termos)
+        return RawSQL(
+            f'SELECT {q(pk)} FROM {q(tabela)} '
+            f"WHERE {_vetor_pg(conexao, colunas)} @@ to_tsquery('{CONFIGURACAO_PG}', %s)",
+            [consulta],
+        )
+
+    if conexao.vendor == 'sqlite' and _fts_existe(conexao, tabela):
+        fts = _tabela_fts(tabela)
+        consulta = ' '.join(f'"{termo}"*' for termo in termos)
+        return RawSQL(f'SELECT rowid FROM {q(fts)} WHERE {q(fts)} MATCH %s', [consulta])
+
+    return None
+
+
+class BuscaIndexadaAdminMixin:
+    """
+    Busca do admin pelos índices de texto.
+
+    busca_indexada lista os caminhos, a partir do model do admin, até
+    cada model indexado ('' é o próprio model). Os campos de search_fields
+    cobertos por esses índices saem do icontains; os demais continuam na
+    busca padrão, combinada por OU.
+    """
+    busca_indexada = ()
+
+    def _model_do_caminho(self, caminho):
+        model = self.model
+        for parte in filter(None, caminho.split('__')):
+            model = model._meta.get_field(parte).related_model
+        return model
+
+    def _campos_cobertos(self) -> set:
+        cobertos = set()
+        for caminho in self.busca_indexada:
+            prefixo = f'{caminho}__' if caminho else ''
+            colunas = INDICES_BUSCA.get(self._model_do_caminho(caminho)._meta.label_lower, [])
+            cobertos.update(prefixo + coluna for coluna in colunas)
+        return cobertos
+
+    def _filtro_busca_indexada(self, search_term):
+        filtro = Q()
+        for caminho in self.busca_indexada:
+            subconsulta = subconsulta_busca(self._model_do_caminho(caminho), search_term)
+            if subconsulta is None:
+                return None
+            filtro |= Q(**{f'{caminho}__in' if caminho else 'pk__in': subconsulta})
+        return filtro or None
+
+    def get_search_results(self, request, queryset, search_term):
+        filtro = self._filtro_busca_indexada(search_term) if search_term.strip() else None
+        if filtro is None:
+            return super().get_search_results(request, queryset, search_term)
+
+        cobertos = self._campos_cobertos()
+        demais = [campo for campo in self.get_search_fields(request) if campo not in cobertos]
+        resultado = queryset.filter(filtro)
+        duplicados = False
+        if demais:
+            # Busca padrão do admin restrita aos campos sem índice
+            restrito = copy.copy(self)
+            restrito.search_fields = demais
+            encontrados, duplicados = super(BuscaIndexadaAdminMixin, restrito).get_search_results(
+                request, queryset, search_term
+            )
+            resultado = resultado | encontrados
+        return resultado, duplicados
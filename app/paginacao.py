@@ -0,0 +1,50 @@
+"""
+Paginação do admin para tabelas grandes.
+
+O changelist do admin faz um COUNT(*) completo a cada página. Em tabelas
+com centenas de milhares de linhas, sem filtro, a estimativa do planner do
+PostgreSQL (pg_class.reltuples) é suficiente para montar a paginação e
+custa uma leitura de catálogo. Com filtros ou em outros bancos, a contagem
+continua exata.
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+# Abaixo disso a contagem exata já é barata e evita páginas fantasmas
+LIMITE_CONTAGEM_EXATA = 10000
+
+
+def contagem_estimada(queryset: QuerySet):
+    """
+    Estimativa de linhas da tabela do queryset, ou None se indisponível.
+
+    Só vale para querysets sem filtro no PostgreSQL.
+    """
+    conexao = connections[queryset.db]
+    if conexao.vendor != 'postgresql' or queryset.query.where:
+        return None
+
+    with conexao.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        linha = cursor.fetchone()
+    # reltuples é -1 em tabelas nunca analisadas
+    if not linha or linha[0] < 0:
+        return None
+    return linha[0]
+
+
+class PaginadorContagemAproximada(Paginator):
+    """Paginator que usa contagem_estimada em tabelas grandes sem filtro."""
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            estimativa = contagem_estimada(self.object_list)
+            if estimativa is not None and estimativa > LIMITE_CONTAGEM_EXATA:
+                return estimativa
+        return super().count
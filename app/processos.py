@@ -0,0 +1,27 @@
+"""
+Inicialização de processos filhos que usam o ORM.
+
+Este módulo não importa models: sob spawn/forkserver o initializer é
+desserializado pelo filho antes de o Django estar configurado.
+"""
+import os
+
+
+def inicializar_django():
+    """
+    Initializer de ProcessPoolExecutor.
+
+    Sob spawn/forkserver o filho começa sem settings nem apps carregados;
+    sob fork, herda conexões do pai que não podem ser compartilhadas entre
+    processos. Nos dois casos o filho termina com o Django pronto e
+    conexões próprias.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+
+    import django
+    from django.apps import apps
+    from django.db import connections
+
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
@@ -83,6 +83,25 @@ DATABASES = {
     "default": env.db(),
 }
 
+# Cache (Redis em produção; memória local quando CACHE_REDIS_URL não estiver definido).
+# A versão do cache do dashboard precisa ser compartilhada entre processos:
+# `check --deploy` falha com o cache em memória local (financeiro.E001).
+CACHE_REDIS_URL = env('CACHE_REDIS_URL', default=None)
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -134,6 +153,13 @@ DEFAULT_FROM_EMAIL = env('EMAIL_HOST_USER')
 
 # Alertas de Vencimento
 ALERT_EMAIL_RECIPIENT = env('ALERT_EMAIL_RECIPIENT')
+# Dias antes do vencimento em que o alerta é enviado (0 = no dia)
+ALERTA_VENCIMENTO_LIMIARES = env.list('ALERTA_VENCIMENTO_LIMIARES', cast=int, default=[30, 7, 0])
+# Vencimentos já passados há até N dias ainda geram o alerta "no dia" (recuperação após falhas)
+ALERTA_VENCIMENTO_RECUPERACAO_DIAS = env.int('ALERTA_VENCIMENTO_RECUPERACAO_DIAS', default=7)
+
+# Token para assinar o feed iCal de vencimentos sem login (vazio = só staff)
+CALENDARIO_VENCIMENTOS_TOKEN = env('CALENDARIO_VENCIMENTOS_TOKEN', default='')
 
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_URL = '/login/'
@@ -0,0 +1,14 @@
+from django.db import migrations
+
+from app.busca import operacao_indice_busca
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_descricao_cobranca'),
+    ]
+
+    operations = [
+        operacao_indice_busca('clientes.cliente'),
+    ]
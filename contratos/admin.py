@@ -1,6 +1,11 @@
 from django.contrib import admin
+from django.core.exceptions import ValidationError
+from django.db.models import Avg, Count
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
 from .models import Contrato
 from infra.financeiro.models import ContratoSnapshot
+from infra.financeiro.services.atribuicao_contrato import atribuicao_em_cache
 from decimal import Decimal
 
 
@@ -14,6 +19,9 @@ class ContratoSnapshotInline(admin.TabularInline):
     )
     fields = readonly_fields
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('periodo').defer('detalhamento')
+    
     def has_add_permission(self, request, obj=None):
         return False
 
@@ -26,7 +34,8 @@ class ContratoAdmin(admin.ModelAdmin):
     )
     list_filter = ('data_inicio', 'data_fim', 'cliente')
     search_fields = ('nome', 'cliente__nome', 'descricao')
-    readonly_fields = ('custo_medio', 'margem_media', 'total_snapshots')
+    list_select_related = ('cliente',)
+    readonly_fields = ('custo_medio', 'margem_media', 'total_snapshots', 'custos_mes_atual')
     inlines = [ContratoSnapshotInline]
     
     fieldsets = (
@@ -40,6 +49,10 @@ class ContratoAdmin(admin.ModelAdmin):
             'fields': ('arquivo_contrato',),
             'classes': ('collapse',)
         }),
+        ('Custos do Mês (sem fechamento)', {
+            'fields': ('custos_mes_atual',),
+            'classes': ('collapse',)
+        }),
         ('Estatísticas (Readonly)', {
             'fields': ('custo_medio', 'margem_media', 'total_snapshots'),
             'classes': ('collapse',)
@@ -56,29 +69,58 @@ class ContratoAdmin(admin.ModelAdmin):
     is_ativo.boolean = True
     is_ativo.short_description = 'Ativo'
     
+    def get_queryset(self, request):
+        # Estatísticas dos snapshots agregadas na própria query do changelist
+        return super().get_queryset(request).annotate(
+            qtd_snapshots=Count('snapshots'),
+            media_custo=Avg('snapshots__custo_total'),
+            media_margem_percentual=Avg('snapshots__margem_percentual'),
+        )
+    
     def custo_medio(self, obj):
-        """Calcula custo médio dos snapshots."""
-        snapshots = obj.snapshots.all()
-        if not snapshots:
+        """Custo médio dos snapshots."""
+        if not obj.qtd_snapshots:
             return "Sem dados"
-        
-        custo_total = sum(s.custo_total for s in snapshots)
-        media = custo_total / len(snapshots)
-        return f"R$ {media:.2f}"
+        return f"R$ {obj.media_custo:.2f}"
     custo_medio.short_description = 'Custo Médio'
+    custo_medio.admin_order_field = 'media_custo'
     
     def margem_media(self, obj):
-        """Calcula margem média percentual."""
-        snapshots = obj.snapshots.all()
-        if not snapshots:
+        """Margem média percentual dos snapshots."""
+        if not obj.qtd_snapshots:
             return "Sem dados"
-        
-        margem_total = sum(s.margem_percentual for s in snapshots)
-        media = margem_total / len(snapshots)
-        return f"{media:.1f}%"
+        return f"{obj.media_margem_percentual:.1f}%"
     margem_media.short_description = 'Margem Média'
+    margem_media.admin_order_field = 'media_margem_percentual'
     
     def total_snapshots(self, obj):
         """Total de snapshots criados."""
-        return obj.snapshots.count()
+        return obj.qtd_snapshots
     total_snapshots.short_description = 'Total de Períodos'
+    total_snapshots.admin_order_field = 'qtd_snapshots'
+
+    def custos_mes_atual(self, obj):
+        """Atribuição de custos do mês corrente, calculada sob demanda."""
+        if not obj.pk:
+            return "—"
+        try:
+            valores = atribuicao_em_cache(obj.pk)
+        except ValidationError:
+            return "Contrato fora de vigência neste mês"
+
+        detalhamento = valores['detalhamento']
+        linhas = [
+            (categoria, item.get('nome') or item.get('dominio') or item.get('descricao'),
+             f"{item.get('custo', item.get('valor')):.2f}", item.get('rateio', 1))
+            for categoria in ('dominios', 'hostings', 'vps', 'backups', 'emails', 'despesas_adicionais')
+            for item in detalhamento[categoria]
+        ]
+        url = reverse('financeiro:atribuicao_contrato_json', args=[obj.pk])
+        return format_html(
+            '<table><tr><th>Categoria</th><th>Recurso</th><th>Custo (R$)</th><th>Rateio</th></tr>{}</table>'
+            '<p>Receita: R$ {} · Custo total: R$ {} · Margem: R$ {} · <a href="{}?competencia={}">JSON</a></p>',
+            format_html_join('', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>', linhas),
+            f"{valores['receita']:.2f}", f"{valores['custo_total']:.2f}", f"{valores['margem']:.2f}",
+            url, valores['competencia'],
+        )
+    custos_mes_atual.short_description = 'Custos rateados'
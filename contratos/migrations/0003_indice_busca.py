@@ -0,0 +1,14 @@
+from django.db import migrations
+
+from app.busca import operacao_indice_busca
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratos', '0002_alter_contrato_valor_mensal'),
+    ]
+
+    operations = [
+        operacao_indice_busca('contratos.contrato'),
+    ]
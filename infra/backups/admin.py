@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.db.models import Q
+from infra.core.admin import CustoAtualAdminMixin
 from .models import VPSBackup, VPSBackupCost
 
 
@@ -19,8 +21,15 @@ class VPSBackupCostInline(admin.TabularInline):
 
 
 @admin.register(VPSBackup)
-class VPSBackupAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'vps', 'fornecedor', 'ativo', 'custo_atual', 'criado_em')
+class VPSBackupAdmin(CustoAtualAdminMixin, admin.ModelAdmin):
+    list_display = (
+        'nome', 'vps', 'fornecedor', 'ativo', 'valor_atual', 'custo_atual',
+        'contratos_vinculados', 'criado_em'
+    )
+    # O backup é rateado entre os contratos ativos da VPS
+    lookup_contratos = 'vps__vpscontrato'
+    filtro_contratos = Q(vps__vpscontrato__ativo=True)
+    list_select_related = ('vps',)
     list_filter = ('ativo', 'fornecedor', 'criado_em')
     search_fields = ('nome', 'vps__nome', 'fornecedor')
     inlines = [VPSBackupCostInline]
@@ -33,13 +42,6 @@ class VPSBackupAdmin(admin.ModelAdmin):
             'fields': ('ativo',)
         }),
     )
-    
-    def custo_atual(self, obj):
-        cost = obj.costs.filter(ativo=True).order_by('-data_inicio').first()
-        if cost:
-            return f"R$ {cost.custo_mensal:,.2f}/mês"
-        return "Sem custo"
-    custo_atual.short_description = 'Custo Atual'
 
 
 @admin.register(VPSBackupCost)
@@ -31,6 +31,8 @@ class VPSBackupCost(core_models.InfraCostModel):
     Histórico de custos do backup.
     """
 
+    campo_recurso = 'backup'
+
     backup = models.ForeignKey(
         VPSBackup,
         on_delete=models.PROTECT,
@@ -39,3 +41,7 @@ class VPSBackupCost(core_models.InfraCostModel):
 
     class Meta:
         ordering = ['-data_inicio']
+        indexes = [
+            models.Index(fields=['backup', 'data_inicio'], name='vpsbackupcost_recurso_idx'),
+            models.Index(fields=['ativo', 'data_inicio', 'data_fim'], name='vpsbackupcost_vigencia_idx'),
+        ]
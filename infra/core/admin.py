@@ -0,0 +1,104 @@
+from django.contrib import admin
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery
+
+
+class FaixaCustoAtualFilter(admin.SimpleListFilter):
+    title = 'custo atual'
+    parameter_name = 'custo_atual'
+
+    FAIXAS = {
+        'sem_custo': ('Sem custo', Q(custo_mensal_atual__isnull=True)),
+        'ate_50': ('Até R$ 50/mês', Q(custo_mensal_atual__lte=50)),
+        '50_200': ('R$ 50 a 200/mês', Q(custo_mensal_atual__gt=50, custo_mensal_atual__lte=200)),
+        'acima_200': ('Acima de R$ 200/mês', Q(custo_mensal_atual__gt=200)),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(chave, rotulo) for chave, (rotulo, _) in self.FAIXAS.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() in self.FAIXAS:
+            return queryset.filter(self.FAIXAS[self.value()][1])
+        return queryset
+
+
+class ContratosVinculadosFilter(admin.SimpleListFilter):
+    title = 'contratos vinculados'
+    parameter_name = 'vinculado'
+
+    def lookups(self, request, model_admin):
+        return [('sim', 'Com contratos'), ('nao', 'Sem contratos')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'sim':
+            return queryset.filter(qtd_contratos__gt=0)
+        if self.value() == 'nao':
+            return queryset.filter(qtd_contratos=0)
+        return queryset
+
+
+class CustoAtualAdminMixin:
+    """
+    Anota no queryset do admin o custo ativo mais recente do recurso
+    (valor total e custo mensal) e a quantidade de contratos vinculados.
+
+    Os valores vêm de subqueries correlacionadas na própria query da
+    página, em vez de uma consulta ao histórico de custos por linha.
+    O model do recurso precisa ter custos em `costs`.
+
+    Atributos:
+        lookup_contratos: Caminho até os contratos vinculados
+            (None quando o recurso pertence a um único contrato)
+        filtro_contratos: Q opcional aplicado à contagem de contratos
+    """
+    lookup_contratos = 'contratos'
+    filtro_contratos = None
+
+    def get_queryset(self, request):
+        relacao = self.model._meta.get_field('costs')
+        custo_atual = relacao.related_model.objects.filter(
+            **{relacao.field.name: OuterRef('pk')},
+            ativo=True,
+        ).order_by('-data_inicio')
+
+        queryset = super().get_queryset(request).annotate(
+            valor_total_atual=Subquery(custo_atual.values('valor_total')[:1]),
+            custo_mensal_atual=Subquery(
+                custo_atual.annotate(
+                    mensal=ExpressionWrapper(
+                        F('valor_total') / F('periodo_meses'),
+                        output_field=DecimalField(max_digits=12, decimal_places=2),
+                    )
+                ).values('mensal')[:1]
+            ),
+        )
+        if self.lookup_contratos:
+            queryset = queryset.annotate(
+                qtd_contratos=Count(self.lookup_contratos, filter=self.filtro_contratos, distinct=True)
+            )
+        return queryset
+
+    def get_list_filter(self, request):
+        filtros = [FaixaCustoAtualFilter]
+        if self.lookup_contratos:
+            filtros.append(ContratosVinculadosFilter)
+        return list(super().get_list_filter(request)) + filtros
+
+    def valor_atual(self, obj):
+        if obj.valor_total_atual is not None:
+            return f"R$ {obj.valor_total_atual:,.2f}"
+        return "—"
+    valor_atual.short_description = 'Valor Atual'
+    valor_atual.admin_order_field = 'valor_total_atual'
+
+    def custo_atual(self, obj):
+        if obj.custo_mensal_atual is not None:
+            return f"R$ {obj.custo_mensal_atual:,.2f}/mês"
+        return "Sem custo"
+    custo_atual.short_description = 'Custo Atual'
+    custo_atual.admin_order_field = 'custo_mensal_atual'
+
+    def contratos_vinculados(self, obj):
+        return obj.qtd_contratos
+    contratos_vinculados.short_description = 'Contratos'
+    contratos_vinculados.admin_order_field = 'qtd_contratos'
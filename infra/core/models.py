@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import Q
 from contratos.models import Contrato
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
@@ -22,7 +24,34 @@ class InfraModel(models.Model):
         abstract = True
 
 
+class CustoQuerySet(models.QuerySet):
+
+    def vigentes(self, inicio, fim=None):
+        """
+        Custos ativos cuja vigência cruza o intervalo [inicio, fim].
+
+        fim é inclusivo; None deixa o intervalo em aberto. Para um único
+        dia, use vigentes(dia, dia).
+        """
+        queryset = self.filter(ativo=True).filter(
+            Q(data_fim__isnull=True) | Q(data_fim__gte=inicio)
+        )
+        if fim is not None:
+            queryset = queryset.filter(data_inicio__lte=fim)
+        return queryset
+
+
 class InfraCostModel(models.Model):
+    """
+    Custo de um recurso com vigência [data_inicio, data_fim].
+
+    Cada subclasse informa em campo_recurso o FK para o recurso e declara
+    os índices de vigência: (recurso, data_inicio) para a busca do custo
+    vigente de um recurso e (ativo, data_inicio, data_fim) para os custos
+    vigentes de um período.
+    """
+    campo_recurso = None
+
     valor_total = models.DecimalField(max_digits=10, decimal_places=2)
     periodo_meses = models.IntegerField(
         validators=[MinValueValidator(1)]
@@ -33,6 +62,8 @@ class InfraCostModel(models.Model):
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
 
+    objects = CustoQuerySet.as_manager()
+
     @property
     def custo_mensal(self):
         if not self.periodo_meses:
@@ -44,3 +75,33 @@ class InfraCostModel(models.Model):
 
     class Meta:
         abstract = True
+
+    def custos_sobrepostos(self):
+        """Outros custos ativos do mesmo recurso com vigência cruzando a deste."""
+        recurso_id = getattr(self, f'{self.campo_recurso}_id')
+        if not self.ativo or recurso_id is None or self.data_inicio is None:
+            return self.__class__.objects.none()
+        return self.__class__.objects.filter(
+            **{f'{self.campo_recurso}_id': recurso_id}
+        ).exclude(pk=self.pk).vigentes(self.data_inicio, self.data_fim)
+
+    def clean(self):
+        if self.data_fim and self.data_inicio and self.data_fim < self.data_inicio:
+            raise ValidationError('Data de fim não pode ser anterior à data de início')
+        self.validar_sobreposicao()
+
+    def validar_sobreposicao(self):
+        """
+        Rejeita vigência cruzando a de outro custo ativo do mesmo recurso.
+
+        Chamado por clean() e pelos signals pre_save do app financeiro
+        (quando o save altera vigência, status ou recurso).
+        """
+        sobreposto = self.custos_sobrepostos().first()
+        if sobreposto:
+            fim = f"{sobreposto.data_fim:%d/%m/%Y}" if sobreposto.data_fim else 'em aberto'
+            raise ValidationError(
+                f'Vigência sobrepõe outro custo ativo deste recurso '
+                f'({sobreposto.data_inicio:%d/%m/%Y} a {fim}). '
+                f'Encerre o custo anterior (data de fim) antes de cadastrar o novo.'
+            )
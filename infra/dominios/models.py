@@ -10,6 +10,8 @@ class Dominio(core_models.InfraModel):
 
 
 class DomainCost(core_models.InfraCostModel):
+    campo_recurso = 'domain'
+
     domain = models.ForeignKey(
         Dominio,
         on_delete=models.PROTECT,
@@ -18,3 +20,7 @@ class DomainCost(core_models.InfraCostModel):
 
     class Meta:
         ordering = ['-data_inicio']
+        indexes = [
+            models.Index(fields=['domain', 'data_inicio'], name='domaincost_recurso_idx'),
+            models.Index(fields=['ativo', 'data_inicio', 'data_fim'], name='domaincost_vigencia_idx'),
+        ]
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from infra.core.admin import CustoAtualAdminMixin
 from .models import DomainEmail, DomainEmailCost
 
 
@@ -19,11 +20,14 @@ class DomainEmailCostInline(admin.TabularInline):
 
 
 @admin.register(DomainEmail)
-class DomainEmailAdmin(admin.ModelAdmin):
+class DomainEmailAdmin(CustoAtualAdminMixin, admin.ModelAdmin):
     list_display = (
         'dominio', 'contrato', 'fornecedor', 'quantidade_caixas',
-        'ativo', 'custo_atual', 'criado_em'
+        'ativo', 'valor_atual', 'custo_atual', 'criado_em'
     )
+    # Email pertence a um único contrato (coluna contrato)
+    lookup_contratos = None
+    list_select_related = ('dominio', 'contrato__cliente')
     list_filter = ('ativo', 'fornecedor', 'criado_em', 'contrato__cliente')
     search_fields = ('dominio__nome', 'fornecedor', 'contrato__nome', 'contrato__cliente__nome')
     inlines = [DomainEmailCostInline]
@@ -38,13 +42,6 @@ class DomainEmailAdmin(admin.ModelAdmin):
             'fields': ('ativo',)
         }),
     )
-    
-    def custo_atual(self, obj):
-        cost = obj.costs.filter(ativo=True).order_by('-data_inicio').first()
-        if cost:
-            return f"R$ {cost.custo_mensal:,.2f}/mês"
-        return "Sem custo"
-    custo_atual.short_description = 'Custo Atual'
 
 
 @admin.register(DomainEmailCost)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.10 on 2026-10-19 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='domainemailcost',
+            index=models.Index(fields=['email', 'data_inicio'], name='domainemailcost_recurso_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='domainemailcost',
+            index=models.Index(fields=['ativo', 'data_inicio', 'data_fim'], name='domainemailcost_vigencia_idx'),
+        ),
+    ]
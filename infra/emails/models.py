@@ -47,6 +47,8 @@ class DomainEmailCost(core_models.InfraCostModel):
     - troca de preço futura
     """
 
+    campo_recurso = 'email'
+
     email = models.ForeignKey(
         DomainEmail,
         on_delete=models.PROTECT,
@@ -55,4 +57,8 @@ class DomainEmailCost(core_models.InfraCostModel):
 
     class Meta:
         ordering = ['-data_inicio']
+        indexes = [
+            models.Index(fields=['email', 'data_inicio'], name='domainemailcost_recurso_idx'),
+            models.Index(fields=['ativo', 'data_inicio', 'data_fim'], name='domainemailcost_vigencia_idx'),
+        ]
 
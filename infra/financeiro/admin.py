@@ -3,9 +3,16 @@ from django.utils.html import format_html
 from django.urls import path, reverse
 from django.shortcuts import redirect
 from django.contrib import messages
-from django.core.exceptions import ValidationError
-from .models import PeriodoFinanceiro, ContratoSnapshot, DespesaAdicional
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
+from app.busca import BuscaIndexadaAdminMixin
+from .models import (
+    PeriodoFinanceiro, AlertaEnviado, ContratoAnomalia, EmailPendente, ContratoSnapshot, ContratoSnapshotItem, CustoInfra, DespesaAdicional
+)
+from django.template.response import TemplateResponse
 from .services import fechar_periodo
+from .services.importacao_custos import TIPOS_IMPORTACAO, importar_custos, ler_planilha
 
 
 # Customizar o título do admin
@@ -15,13 +22,14 @@ admin.site.index_title = 'Painel de Administração'
 
 
 @admin.register(DespesaAdicional)
-class DespesaAdicionalAdmin(admin.ModelAdmin):
+class DespesaAdicionalAdmin(BuscaIndexadaAdminMixin, admin.ModelAdmin):
     list_display = (
         'descricao', 'contrato', 'valor', 'mes_ano_referencia',
         'criado_em', 'criado_por'
     )
     list_filter = ('ano_referencia', 'mes_referencia', 'contrato__cliente')
     search_fields = ('descricao', 'contrato__nome', 'contrato__cliente__nome', 'observacoes')
+    busca_indexada = ('', 'contrato', 'contrato__cliente')
     readonly_fields = ('criado_em',)
     
     fieldsets = (
@@ -59,6 +67,20 @@ class ContratoSnapshotInline(admin.TabularInline):
     )
     fields = readonly_fields
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('contrato__cliente').defer('detalhamento')
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class ContratoSnapshotItemInline(admin.TabularInline):
+    model = ContratoSnapshotItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ('categoria', 'nome', 'recurso_tipo', 'recurso_id', 'custo', 'custo_total', 'rateio')
+    fields = readonly_fields
+    
     def has_add_permission(self, request, obj=None):
         return False
 
@@ -124,39 +146,49 @@ class PeriodoFinanceiroAdmin(admin.ModelAdmin):
             )
     status_badge.short_description = 'Status'
     
+    def get_queryset(self, request):
+        # Totais da página numa única query agregada (também no change view)
+        return super().get_queryset(request).annotate(
+            qtd_snapshots=Count('contrato_snapshots'),
+            soma_receita=Sum('contrato_snapshots__receita'),
+            soma_custo=Sum('contrato_snapshots__custo_total'),
+            soma_margem=Sum('contrato_snapshots__margem'),
+        ).annotate(
+            percentual_margem=Case(
+                When(soma_receita__gt=0, then=F('soma_margem') * 100 / F('soma_receita')),
+                default=Value(0),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+    
     def total_contratos(self, obj):
-        return obj.contrato_snapshots.count()
+        return obj.qtd_snapshots
     total_contratos.short_description = 'Contratos'
+    total_contratos.admin_order_field = 'qtd_snapshots'
     
     def receita_total(self, obj):
-        total = sum(s.receita for s in obj.contrato_snapshots.all())
-        return f"R$ {total:,.2f}"
+        return f"R$ {obj.soma_receita or 0:,.2f}"
     receita_total.short_description = 'Receita Total'
+    receita_total.admin_order_field = 'soma_receita'
     
     def custo_total(self, obj):
-        total = sum(s.custo_total for s in obj.contrato_snapshots.all())
-        return f"R$ {total:,.2f}"
+        return f"R$ {obj.soma_custo or 0:,.2f}"
     custo_total.short_description = 'Custo Total'
+    custo_total.admin_order_field = 'soma_custo'
     
     def margem_total(self, obj):
-        total = sum(s.margem for s in obj.contrato_snapshots.all())
-        return f"R$ {total:,.2f}"
+        return f"R$ {obj.soma_margem or 0:,.2f}"
     margem_total.short_description = 'Margem Total'
+    margem_total.admin_order_field = 'soma_margem'
     
     def margem_percentual(self, obj):
-        from decimal import Decimal
-        snapshots = obj.contrato_snapshots.all()
-        if not snapshots:
+        if not obj.qtd_snapshots:
             return "N/A"
-        
-        receita = sum(s.receita for s in snapshots)
-        margem = sum(s.margem for s in snapshots)
-        
-        if receita > 0:
-            percentual = (margem / receita * 100)
-            return f"{percentual:.1f}%"
+        if obj.soma_receita > 0:
+            return f"{obj.percentual_margem:.1f}%"
         return "0%"
     margem_percentual.short_description = 'Margem %'
+    margem_percentual.admin_order_field = 'percentual_margem'
     
     def acoes(self, obj):
         if not obj.fechado:
@@ -209,9 +241,19 @@ class ContratoSnapshotAdmin(admin.ModelAdmin):
         'contrato', 'periodo', 'receita', 'custo_total',
         'margem', 'margem_percentual_display', 'criado_em'
     )
-    list_filter = ('periodo__ano', 'periodo__mes', 'contrato__cliente__tipo', 'contrato__cliente')
+    list_filter = ('contrato__cliente__tipo', 'contrato__cliente')
     search_fields = ('contrato__nome', 'contrato__cliente__nome')
+    date_hierarchy = 'competencia'
+    list_select_related = ('contrato__cliente', 'periodo')
     readonly_fields = [f.name for f in ContratoSnapshot._meta.fields]
+    inlines = [ContratoSnapshotItemInline]
+    
+    def get_queryset(self, request):
+        """Changelist não exibe o detalhamento: evita carregar o JSON."""
+        qs = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            qs = qs.defer('detalhamento')
+        return qs
     
     def margem_percentual_display(self, obj):
         """Exibe margem percentual ou 'Interno' para contratos internos."""
@@ -223,7 +265,7 @@ class ContratoSnapshotAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Referência', {
-            'fields': ('contrato', 'periodo', 'criado_em')
+            'fields': ('contrato', 'periodo', 'competencia', 'criado_em')
         }),
         ('Valores', {
             'fields': ('receita',)
@@ -250,3 +292,154 @@ class ContratoSnapshotAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         """Snapshots são imutáveis."""
         return False
+
+
+@admin.register(ContratoSnapshotItem)
+class ContratoSnapshotItemAdmin(admin.ModelAdmin):
+    list_display = (
+        'competencia', 'contrato', 'categoria', 'nome',
+        'custo', 'custo_total', 'rateio'
+    )
+    list_filter = ('categoria', 'recurso_tipo')
+    search_fields = ('nome', 'contrato__nome', 'contrato__cliente__nome')
+    date_hierarchy = 'competencia'
+    list_select_related = ('contrato__cliente',)
+    readonly_fields = [f.name for f in ContratoSnapshotItem._meta.fields]
+    
+    def has_add_permission(self, request):
+        """Itens só podem ser criados via fechamento."""
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        """Itens de snapshot são imutáveis."""
+        return False
+
+
+@admin.register(CustoInfra)
+class CustoInfraAdmin(admin.ModelAdmin):
+    list_display = (
+        'recurso_nome', 'categoria', 'fornecedor', 'custo_mensal',
+        'valor_total', 'periodo_meses', 'data_inicio', 'data_fim', 'vencimento', 'ativo'
+    )
+    list_filter = ('categoria', 'ativo')
+    search_fields = ('recurso_nome', 'fornecedor')
+    date_hierarchy = 'vencimento'
+    readonly_fields = [f.name for f in CustoInfra._meta.fields]
+    change_list_template = 'admin/financeiro/custoinfra/change_list.html'
+    
+    def has_add_permission(self, request):
+        """O livro é mantido pelos signals dos models de custo."""
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'importar/',
+                self.admin_site.admin_view(self.importar_custos_view),
+                name='financeiro_custoinfra_importar'
+            ),
+        ]
+        return custom_urls + urls
+    
+    def importar_custos_view(self, request):
+        """Importação do extrato do fornecedor: prévia (diff) ou gravação."""
+        models_custo = [model for model, _, _ in TIPOS_IMPORTACAO.values()]
+        if not all(
+            request.user.has_perm(f'{model._meta.app_label}.add_{model._meta.model_name}')
+            for model in models_custo
+        ):
+            raise PermissionDenied
+        
+        resultado = None
+        if request.method == 'POST' and request.FILES.get('arquivo'):
+            arquivo = request.FILES['arquivo']
+            aplicar = request.POST.get('aplicar') == '1'
+            try:
+                resultado = importar_custos(ler_planilha(arquivo, arquivo.name), aplicar=aplicar)
+            except ValidationError as e:
+                messages.error(request, e.messages[0])
+            else:
+                if resultado['aplicado']:
+                    messages.success(request, f"{len(resultado['custos'])} custo(s) importado(s).")
+                    return redirect('admin:financeiro_custoinfra_changelist')
+                if resultado['erros']:
+                    messages.error(request, f"{len(resultado['erros'])} linha(s) com erro: nada foi importado.")
+        
+        contexto = {
+            **self.admin_site.each_context(request),
+            'title': 'Importar custos do fornecedor',
+            'opts': self.model._meta,
+            'resultado': resultado,
+        }
+        return TemplateResponse(request, 'admin/financeiro/custoinfra/importar.html', contexto)
+
+
+@admin.register(ContratoAnomalia)
+class ContratoAnomaliaAdmin(admin.ModelAdmin):
+    list_display = ('contrato', 'competencia', 'metrica', 'tipo', 'valor', 'referencia', 'score')
+    list_filter = ('tipo', 'metrica', 'competencia')
+    search_fields = ('contrato__nome', 'contrato__cliente__nome')
+    list_select_related = ('contrato__cliente',)
+    date_hierarchy = 'competencia'
+    readonly_fields = [f.name for f in ContratoAnomalia._meta.fields]
+    
+    def has_add_permission(self, request):
+        """Anomalias são detectadas no fechamento do período."""
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AlertaEnviado)
+class AlertaEnviadoAdmin(admin.ModelAdmin):
+    list_display = ('recurso_nome', 'vencimento', 'limiar', 'origem_tipo', 'enviado_em')
+    list_filter = ('limiar', 'origem_tipo')
+    search_fields = ('recurso_nome',)
+    date_hierarchy = 'vencimento'
+    readonly_fields = [f.name for f in AlertaEnviado._meta.fields]
+    
+    def has_add_permission(self, request):
+        """O log é gravado pela task de alertas de vencimento."""
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(EmailPendente)
+class EmailPendenteAdmin(admin.ModelAdmin):
+    list_display = ('assunto', 'status', 'tentativas', 'criado_em', 'enviado_em')
+    list_filter = ('status',)
+    search_fields = ('assunto', 'ultimo_erro')
+    date_hierarchy = 'criado_em'
+    readonly_fields = [f.name for f in EmailPendente._meta.fields]
+    actions = ['reenviar_emails']
+    
+    def has_add_permission(self, request):
+        """Emails são enfileirados pelas tasks."""
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    @admin.action(description='Reenviar emails selecionados')
+    def reenviar_emails(self, request, queryset):
+        from .tasks import task_enviar_emails_pendentes
+        
+        total = queryset.exclude(status__in=['enviado', 'enviando']).update(status='pendente', tentativas=0)
+        transaction.on_commit(task_enviar_emails_pendentes.delay)
+        messages.success(request, f'{total} email(s) colocados de volta na fila.')
@@ -7,4 +7,5 @@ class FinanceiroConfig(AppConfig):
     
     def ready(self):
         """Importar signals quando o app estiver pronto."""
+        import infra.financeiro.checks
         import infra.financeiro.signals
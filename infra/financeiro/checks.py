@@ -0,0 +1,31 @@
+"""
+System checks do app financeiro.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends em que cada processo tem o próprio cache
+CACHES_POR_PROCESSO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def verificar_cache_compartilhado(app_configs, **kwargs):
+    """
+    O contador de versão do dashboard (cache_dashboard) vive no cache.
+
+    Com um cache por processo, um worker invalida só a própria cópia e os
+    demais seguem servindo seções obsoletas.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in CACHES_POR_PROCESSO:
+        return []
+    return [
+        Error(
+            f'O cache padrão ({backend}) não é compartilhado entre processos.',
+            hint='Defina CACHE_REDIS_URL para usar o Redis.',
+            id='financeiro.E001',
+        )
+    ]
@@ -0,0 +1,93 @@
+"""
+Management command para auditar períodos fechados.
+
+Recalcula o rateio de cada período fechado com as regras atuais e compara
+com os snapshots gravados. Apenas leitura: nenhum dado fechado é alterado.
+
+O recálculo parte dos vínculos e custos atuais: um vínculo alterado depois
+do fechamento é reportado como divergência, assim como uma mudança de regra.
+
+Uso:
+    python manage.py auditar_periodos
+    python manage.py auditar_periodos --mes 12 --ano 2025
+    python manage.py auditar_periodos --workers 4
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from infra.financeiro.models import PeriodoFinanceiro
+from infra.financeiro.services.auditoria import auditar_periodos
+
+
+class Command(BaseCommand):
+    help = (
+        'Audita períodos fechados comparando snapshots com o rateio recalculado '
+        'a partir dos vínculos e custos atuais (vínculos alterados após o '
+        'fechamento aparecem como divergência)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mes',
+            type=int,
+            help='Mês do período (1-12)'
+        )
+        parser.add_argument(
+            '--ano',
+            type=int,
+            help='Ano do período'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help='Processos em paralelo (1 = sem paralelismo)'
+        )
+
+    def handle(self, *args, **options):
+        mes = options['mes']
+        ano = options['ano']
+        
+        periodos = PeriodoFinanceiro.objects.filter(fechado=True).order_by('ano', 'mes')
+        if mes:
+            if not 1 <= mes <= 12:
+                raise CommandError('Mês deve estar entre 1 e 12')
+            periodos = periodos.filter(mes=mes)
+        if ano:
+            periodos = periodos.filter(ano=ano)
+        
+        periodo_ids = list(periodos.values_list('id', flat=True))
+        if not periodo_ids:
+            self.stdout.write(self.style.WARNING('Nenhum período fechado encontrado'))
+            return
+        
+        self.stdout.write(f'Auditando {len(periodo_ids)} período(s)...')
+        resultados = auditar_periodos(periodo_ids, workers=options['workers'])
+        
+        total_divergencias = 0
+        for resultado in resultados:
+            divergencias = resultado['divergencias']
+            total_divergencias += len(divergencias)
+            
+            if resultado['erro']:
+                self.stdout.write(self.style.ERROR(f"✗ {resultado['periodo']}: {resultado['erro']}"))
+            
+            if not divergencias:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✓ {resultado['periodo']}: {resultado['contratos']} contrato(s) conferidos"
+                ))
+                continue
+            
+            self.stdout.write(self.style.WARNING(
+                f"⚠ {resultado['periodo']}: {len(divergencias)} divergência(s)"
+            ))
+            for d in divergencias:
+                self.stdout.write(
+                    f"  {d['contrato']} | {d['campo']}: "
+                    f"armazenado={d['armazenado']} recalculado={d['recalculado']}"
+                )
+        
+        if total_divergencias:
+            raise CommandError(f'{total_divergencias} divergência(s) encontrada(s)')
+        
+        self.stdout.write(self.style.SUCCESS('✓ Todos os períodos conferem com os snapshots'))
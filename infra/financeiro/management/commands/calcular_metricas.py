@@ -0,0 +1,54 @@
+"""
+Management command para (re)calcular as métricas móveis dos contratos.
+
+As métricas são derivadas dos snapshots (imutáveis), então recalcular é seguro.
+
+Uso:
+    python manage.py calcular_metricas --mes 12 --ano 2025
+    python manage.py calcular_metricas --todos
+"""
+from django.core.management.base import BaseCommand, CommandError
+from infra.financeiro.models import PeriodoFinanceiro
+from infra.financeiro.services import calcular_metricas_periodo
+
+
+class Command(BaseCommand):
+    help = 'Calcula as métricas móveis de rentabilidade dos contratos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mes',
+            type=int,
+            help='Mês do período (1-12)'
+        )
+        parser.add_argument(
+            '--ano',
+            type=int,
+            help='Ano do período'
+        )
+        parser.add_argument(
+            '--todos',
+            action='store_true',
+            help='Recalcular todos os períodos fechados'
+        )
+
+    def handle(self, *args, **options):
+        mes = options['mes']
+        ano = options['ano']
+        
+        if options['todos']:
+            periodos = PeriodoFinanceiro.objects.filter(fechado=True).order_by('ano', 'mes')
+        elif mes and ano:
+            if not 1 <= mes <= 12:
+                raise CommandError('Mês deve estar entre 1 e 12')
+            periodos = PeriodoFinanceiro.objects.filter(mes=mes, ano=ano, fechado=True)
+            if not periodos.exists():
+                raise CommandError(f'Período fechado {mes:02d}/{ano} não encontrado.')
+        else:
+            raise CommandError('Informe --mes e --ano ou --todos')
+        
+        for periodo in periodos:
+            total = calcular_metricas_periodo(periodo)
+            self.stdout.write(f'  {periodo}: {total} contrato(s)')
+        
+        self.stdout.write(self.style.SUCCESS('✓ Métricas calculadas com sucesso!'))
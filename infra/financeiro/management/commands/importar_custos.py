@@ -0,0 +1,58 @@
+"""
+Management command para importar custos de infraestrutura do extrato do
+fornecedor (CSV ou XLSX).
+
+Colunas: tipo (dominio, hosting, vps, backup, email), recurso, fornecedor,
+valor_total, periodo_meses, data_inicio, data_fim (opcional), vencimento.
+
+Uso:
+    python manage.py importar_custos extrato.xlsx --dry-run
+    python manage.py importar_custos extrato.csv
+"""
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from infra.financeiro.services.importacao_custos import importar_custos, ler_planilha
+
+
+class Command(BaseCommand):
+    help = 'Importa custos de infraestrutura de um extrato CSV/XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo .csv ou .xlsx')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas mostra o que seria importado, sem gravar'
+        )
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        try:
+            with open(caminho, 'rb') as arquivo:
+                resultado = importar_custos(ler_planilha(arquivo, caminho), aplicar=not options['dry_run'])
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler {caminho}: {e}')
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+
+        for custo in resultado['custos']:
+            anterior = custo['custo_mensal_anterior']
+            variacao = f"R$ {anterior} → R$ {custo['custo_mensal']}" if anterior is not None else f"R$ {custo['custo_mensal']} (novo)"
+            self.stdout.write(
+                f"  linha {custo['linha']} | {custo['categoria']} {custo['recurso']} | "
+                f"{variacao}/mês a partir de {custo['data_inicio']:%d/%m/%Y}"
+            )
+        for custo in resultado['encerrados']:
+            self.stdout.write(
+                f"  encerra {custo['categoria']} {custo['recurso']} "
+                f"(R$ {custo['custo_mensal']}/mês) em {custo['data_fim']:%d/%m/%Y}"
+            )
+        for erro in resultado['erros']:
+            self.stdout.write(self.style.ERROR(f"✗ linha {erro['linha']}: {erro['mensagem']}"))
+
+        if resultado['erros']:
+            raise CommandError(f"{len(resultado['erros'])} linha(s) com erro: nada foi importado")
+        if resultado['aplicado']:
+            self.stdout.write(self.style.SUCCESS(f"✓ {len(resultado['custos'])} custo(s) importado(s)"))
+        else:
+            self.stdout.write(self.style.WARNING(f"Simulação: {len(resultado['custos'])} custo(s) seriam importados"))
@@ -0,0 +1,35 @@
+"""
+Management command para listar custos ativos com vigências sobrepostas.
+
+Cadastros anteriores à validação de vigência podem ter dois custos ativos
+do mesmo recurso valendo ao mesmo tempo (ex: reajuste cadastrado sem
+encerrar o custo anterior). Corrija cada par informando a data de fim do
+custo anterior ou inativando-o.
+
+Uso:
+    python manage.py listar_custos_sobrepostos
+"""
+from django.core.management.base import BaseCommand, CommandError
+from infra.financeiro.services.livro_custos import listar_sobreposicoes
+
+
+def _periodo(inicio, fim) -> str:
+    return f"{inicio:%d/%m/%Y} a {fim:%d/%m/%Y}" if fim else f"{inicio:%d/%m/%Y} em aberto"
+
+
+class Command(BaseCommand):
+    help = 'Lista custos ativos do mesmo recurso com vigências sobrepostas'
+
+    def handle(self, *args, **options):
+        sobreposicoes = listar_sobreposicoes()
+        if not sobreposicoes:
+            self.stdout.write(self.style.SUCCESS('✓ Nenhum custo sobreposto'))
+            return
+
+        for s in sobreposicoes:
+            self.stdout.write(
+                f"  {s['tipo']} | {s['recurso']}: "
+                f"#{s['custo_id']} ({_periodo(s['inicio'], s['fim'])}) sobrepõe "
+                f"#{s['sobreposto_id']} ({_periodo(s['sobreposto_inicio'], s['sobreposto_fim'])})"
+            )
+        raise CommandError(f'{len(sobreposicoes)} sobreposição(ões) encontrada(s)')
@@ -0,0 +1,23 @@
+"""
+Management command para recriar os índices de busca textual do admin.
+
+Necessário no SQLite após migrações que recriam uma tabela indexada
+(os triggers que mantêm a tabela FTS5 são removidos junto). No
+PostgreSQL apenas recria os índices GIN.
+
+Uso:
+    python manage.py reconstruir_indices_busca
+"""
+from django.core.management.base import BaseCommand
+from app.busca import reconstruir_indices
+
+
+class Command(BaseCommand):
+    help = 'Recria os índices de busca textual usados pelo admin'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias do banco')
+
+    def handle(self, *args, **options):
+        total = reconstruir_indices(options['database'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Índices de busca recriados: {total}'))
@@ -0,0 +1,19 @@
+"""
+Management command para reconstruir o livro consolidado de custos (CustoInfra).
+
+Necessário após atualizações em massa (QuerySet.update, SQL direto) nos
+models de custo, que não disparam os signals de sincronização.
+
+Uso:
+    python manage.py reconstruir_livro_custos
+"""
+from django.core.management.base import BaseCommand
+from infra.financeiro.services import reconstruir_livro
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o livro consolidado de custos de infraestrutura'
+
+    def handle(self, *args, **options):
+        total = reconstruir_livro()
+        self.stdout.write(self.style.SUCCESS(f'✓ Livro de custos reconstruído: {total} registro(s)'))
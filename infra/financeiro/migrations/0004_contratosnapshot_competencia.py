@@ -0,0 +1,44 @@
+# Generated by Django 5.2.10 on 2026-10-19 07:33
+
+from datetime import date
+
+from django.db import migrations, models
+
+
+def preencher_competencia(apps, schema_editor):
+    PeriodoFinanceiro = apps.get_model('financeiro', 'PeriodoFinanceiro')
+    ContratoSnapshot = apps.get_model('financeiro', 'ContratoSnapshot')
+
+    for periodo in PeriodoFinanceiro.objects.all():
+        ContratoSnapshot.objects.filter(periodo=periodo).update(
+            competencia=date(periodo.ano, periodo.mes, 1)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratos', '0002_alter_contrato_valor_mensal'),
+        ('financeiro', '0003_contratosnapshot_custo_despesas_adicionais_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='contratosnapshot',
+            options={'ordering': ['-competencia']},
+        ),
+        migrations.AddField(
+            model_name='contratosnapshot',
+            name='competencia',
+            field=models.DateField(help_text='Primeiro dia do mês do período (cópia de periodo.ano/mes para evitar join)', null=True),
+        ),
+        migrations.RunPython(preencher_competencia, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contratosnapshot',
+            index=models.Index(fields=['competencia', 'contrato'], name='snapshot_competencia_contr_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contratosnapshot',
+            index=models.Index(fields=['contrato', 'competencia'], name='snapshot_contrato_compet_idx'),
+        ),
+    ]
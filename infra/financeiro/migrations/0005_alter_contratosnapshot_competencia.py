@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0004_contratosnapshot_competencia'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contratosnapshot',
+            name='competencia',
+            field=models.DateField(help_text='Primeiro dia do mês do período (cópia de periodo.ano/mes para evitar join)'),
+        ),
+    ]
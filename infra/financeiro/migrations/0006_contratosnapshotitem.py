@@ -0,0 +1,82 @@
+# Generated by Django 5.2.10 on 2026-10-19 07:36
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+RECURSO_TIPO_POR_CATEGORIA = {
+    'dominios': 'dominios.dominio',
+    'hostings': 'hosting.hosting',
+    'vps': 'vps.vps',
+    'backups': 'backups.vpsbackup',
+    'emails': 'emails.domainemail',
+    'despesas_adicionais': 'financeiro.despesaadicional',
+}
+
+
+def migrar_detalhamento(apps, schema_editor):
+    """Gera itens a partir do detalhamento JSON dos snapshots existentes (sem recurso_id)."""
+    ContratoSnapshot = apps.get_model('financeiro', 'ContratoSnapshot')
+    ContratoSnapshotItem = apps.get_model('financeiro', 'ContratoSnapshotItem')
+
+    itens = []
+    for snapshot in ContratoSnapshot.objects.all().iterator():
+        detalhamento = snapshot.detalhamento or {}
+        for categoria, recurso_tipo in RECURSO_TIPO_POR_CATEGORIA.items():
+            for linha in detalhamento.get(categoria, []):
+                if categoria == 'despesas_adicionais':
+                    nome = linha.get('descricao', '')
+                    custo = custo_total = linha.get('valor', 0)
+                else:
+                    nome = linha.get('nome') or linha.get('dominio', '')
+                    custo = linha.get('custo', 0)
+                    custo_total = linha.get('custo_total', custo)
+                itens.append(ContratoSnapshotItem(
+                    snapshot_id=snapshot.id,
+                    contrato_id=snapshot.contrato_id,
+                    competencia=snapshot.competencia,
+                    categoria=categoria,
+                    recurso_tipo=recurso_tipo,
+                    nome=nome[:200],
+                    custo=Decimal(str(custo)),
+                    custo_total=Decimal(str(custo_total)),
+                    rateio=linha.get('rateio', 1),
+                ))
+
+    ContratoSnapshotItem.objects.bulk_create(itens, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratos', '0002_alter_contrato_valor_mensal'),
+        ('financeiro', '0005_alter_contratosnapshot_competencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContratoSnapshotItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('competencia', models.DateField()),
+                ('categoria', models.CharField(choices=[('dominios', 'Domínios'), ('hostings', 'Hostings'), ('vps', 'VPS'), ('backups', 'Backups'), ('emails', 'Emails'), ('despesas_adicionais', 'Despesas Adicionais')], max_length=30)),
+                ('recurso_tipo', models.CharField(help_text="Model do recurso (ex: 'vps.vps', 'dominios.dominio')", max_length=50)),
+                ('recurso_id', models.PositiveBigIntegerField(blank=True, help_text='ID do recurso. NULL para itens migrados do detalhamento antigo', null=True)),
+                ('nome', models.CharField(max_length=200)),
+                ('custo', models.DecimalField(decimal_places=2, help_text='Parcela do custo atribuída ao contrato', max_digits=10)),
+                ('custo_total', models.DecimalField(decimal_places=2, help_text='Custo mensal total do recurso antes do rateio', max_digits=10)),
+                ('rateio', models.PositiveIntegerField(default=1, help_text='Quantidade de contratos que dividiram o custo')),
+                ('contrato', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='snapshot_itens', to='contratos.contrato')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='itens', to='financeiro.contratosnapshot')),
+            ],
+            options={
+                'verbose_name': 'Item de Snapshot',
+                'verbose_name_plural': 'Itens de Snapshot',
+                'ordering': ['-competencia', 'categoria', 'nome'],
+                'indexes': [models.Index(fields=['recurso_tipo', 'recurso_id', 'competencia'], name='snapitem_recurso_compet_idx'), models.Index(fields=['competencia', 'categoria'], name='snapitem_compet_categoria_idx'), models.Index(fields=['contrato', 'competencia'], name='snapitem_contrato_compet_idx')],
+            },
+        ),
+        migrations.RunPython(migrar_detalhamento, migrations.RunPython.noop),
+    ]
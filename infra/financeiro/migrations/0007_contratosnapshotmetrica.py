@@ -0,0 +1,42 @@
+# Generated by Django 5.2.10 on 2026-10-19 07:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratos', '0002_alter_contrato_valor_mensal'),
+        ('financeiro', '0006_contratosnapshotitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContratoSnapshotMetrica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('competencia', models.DateField()),
+                ('media_receita_3m', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('media_receita_6m', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('media_receita_12m', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('media_custo_3m', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('media_custo_6m', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('media_custo_12m', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('media_margem_3m', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('media_margem_6m', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('media_margem_12m', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('tendencia_margem', models.DecimalField(decimal_places=2, help_text='Inclinação da margem nos últimos 12 meses (R$/mês, mínimos quadrados)', max_digits=10)),
+                ('meses_prejuizo_consecutivos', models.PositiveSmallIntegerField(default=0, help_text='Meses seguidos com margem negativa até esta competência')),
+                ('calculado_em', models.DateTimeField(auto_now=True)),
+                ('contrato', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='snapshot_metricas', to='contratos.contrato')),
+                ('snapshot', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='metrica', to='financeiro.contratosnapshot')),
+            ],
+            options={
+                'verbose_name': 'Métrica de Contrato',
+                'verbose_name_plural': 'Métricas de Contratos',
+                'ordering': ['-competencia', '-media_margem_3m'],
+                'indexes': [models.Index(fields=['competencia', 'media_margem_3m'], name='metrica_compet_margem3m_idx'), models.Index(fields=['competencia', 'meses_prejuizo_consecutivos'], name='metrica_compet_prejuizo_idx'), models.Index(fields=['contrato', 'competencia'], name='metrica_contrato_compet_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.10 on 2026-10-19 07:45
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def _custo_mensal(custo):
+    if not custo.periodo_meses:
+        return Decimal('0.00')
+    return (custo.valor_total / Decimal(custo.periodo_meses)).quantize(Decimal('0.01'))
+
+
+def popular_livro(apps, schema_editor):
+    """Copia os custos existentes dos cinco models para o livro consolidado."""
+    CustoInfra = apps.get_model('financeiro', 'CustoInfra')
+
+    fontes = [
+        ('dominios', 'DomainCost', 'dominios.domaincost', 'dominios.dominio', ['domain'],
+         lambda c: (c.domain_id, c.domain.nome, c.domain.fornecedor)),
+        ('hosting', 'HostingCost', 'hosting.hostingcost', 'hosting.hosting', ['hosting'],
+         lambda c: (c.hosting_id, c.hosting.nome, c.hosting.fornecedor)),
+        ('vps', 'VPSCost', 'vps.vpscost', 'vps.vps', ['vps'],
+         lambda c: (c.vps_id, c.vps.nome, c.vps.fornecedor)),
+        ('backups', 'VPSBackupCost', 'backups.vpsbackupcost', 'backups.vpsbackup', ['backup__vps'],
+         lambda c: (c.backup_id, f"{c.backup.nome} ({c.backup.vps.nome})",
+                    c.backup.fornecedor or c.backup.vps.fornecedor)),
+        ('emails', 'DomainEmailCost', 'emails.domainemailcost', 'emails.domainemail', ['email__dominio'],
+         lambda c: (c.email_id, f"Email {c.email.dominio.nome}", c.email.fornecedor)),
+    ]
+    categorias = {
+        'dominios': 'dominios', 'hosting': 'hostings', 'vps': 'vps',
+        'backups': 'backups', 'emails': 'emails',
+    }
+
+    linhas = []
+    for app_label, model_name, origem_tipo, recurso_tipo, relacionados, extrair in fontes:
+        Model = apps.get_model(app_label, model_name)
+        for custo in Model.objects.select_related(*relacionados).iterator():
+            recurso_id, nome, fornecedor = extrair(custo)
+            linhas.append(CustoInfra(
+                categoria=categorias[app_label],
+                origem_tipo=origem_tipo,
+                origem_id=custo.pk,
+                recurso_tipo=recurso_tipo,
+                recurso_id=recurso_id,
+                recurso_nome=nome[:255],
+                fornecedor=fornecedor or '',
+                valor_total=custo.valor_total,
+                periodo_meses=custo.periodo_meses,
+                custo_mensal=_custo_mensal(custo),
+                data_inicio=custo.data_inicio,
+                data_fim=custo.data_fim,
+                vencimento=custo.vencimento,
+                ativo=custo.ativo,
+            ))
+
+    CustoInfra.objects.bulk_create(linhas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0001_initial'),
+        ('dominios', '0001_initial'),
+        ('emails', '0001_initial'),
+        ('financeiro', '0007_contratosnapshotmetrica'),
+        ('hosting', '0001_initial'),
+        ('vps', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustoInfra',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('categoria', models.CharField(choices=[('dominios', 'Domínios'), ('hostings', 'Hostings'), ('vps', 'VPS'), ('backups', 'Backups'), ('emails', 'Emails')], max_length=20)),
+                ('origem_tipo', models.CharField(help_text="Model do custo de origem (ex: 'vps.vpscost')", max_length=50)),
+                ('origem_id', models.PositiveBigIntegerField()),
+                ('recurso_tipo', models.CharField(help_text="Model do recurso (ex: 'vps.vps', 'dominios.dominio')", max_length=50)),
+                ('recurso_id', models.PositiveBigIntegerField()),
+                ('recurso_nome', models.CharField(max_length=255)),
+                ('fornecedor', models.CharField(blank=True, max_length=200)),
+                ('valor_total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('periodo_meses', models.IntegerField()),
+                ('custo_mensal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('data_inicio', models.DateField()),
+                ('data_fim', models.DateField(blank=True, null=True)),
+                ('vencimento', models.DateField()),
+                ('ativo', models.BooleanField(default=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Custo de Infraestrutura',
+                'verbose_name_plural': 'Livro de Custos',
+                'ordering': ['vencimento'],
+                'indexes': [models.Index(fields=['ativo', 'data_inicio', 'data_fim'], name='custoinfra_vigencia_idx'), models.Index(fields=['ativo', 'vencimento'], name='custoinfra_vencimento_idx'), models.Index(fields=['recurso_tipo', 'recurso_id'], name='custoinfra_recurso_idx')],
+                'unique_together': {('origem_tipo', 'origem_id')},
+            },
+        ),
+        migrations.RunPython(popular_livro, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.10 on 2026-10-19 07:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratos', '0002_alter_contrato_valor_mensal'),
+        ('financeiro', '0008_custoinfra'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContratoAnomalia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('competencia', models.DateField()),
+                ('metrica', models.CharField(choices=[('receita', 'Receita'), ('custo_dominios', 'Custo Domínios'), ('custo_hostings', 'Custo Hostings'), ('custo_vps', 'Custo VPS'), ('custo_backups', 'Custo Backups'), ('custo_emails', 'Custo Emails'), ('custo_despesas_adicionais', 'Despesas Adicionais'), ('custo_total', 'Custo Total'), ('margem', 'Margem')], max_length=30)),
+                ('tipo', models.CharField(choices=[('zscore', 'Fora da média histórica'), ('salto', 'Salto mensal')], max_length=10)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('referencia', models.DecimalField(decimal_places=2, help_text='Média histórica (zscore) ou valor do mês anterior (salto)', max_digits=10)),
+                ('score', models.DecimalField(decimal_places=2, help_text='Z-score ou variação percentual', max_digits=10)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('contrato', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='anomalias', to='contratos.contrato')),
+                ('periodo', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='anomalias', to='financeiro.periodofinanceiro')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='anomalias', to='financeiro.contratosnapshot')),
+            ],
+            options={
+                'verbose_name': 'Anomalia de Contrato',
+                'verbose_name_plural': 'Anomalias de Contratos',
+                'ordering': ['-competencia', 'contrato', 'metrica'],
+                'indexes': [models.Index(fields=['competencia', 'contrato'], name='anomalia_compet_contrato_idx')],
+                'constraints': [models.UniqueConstraint(fields=('snapshot', 'metrica', 'tipo'), name='unique_anomalia_snapshot_metrica')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.10 on 2026-10-19 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0009_contratoanomalia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertaEnviado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origem_tipo', models.CharField(help_text="Model do custo de origem (ex: 'vps.vpscost')", max_length=50)),
+                ('origem_id', models.PositiveBigIntegerField()),
+                ('vencimento', models.DateField()),
+                ('limiar', models.PositiveSmallIntegerField(help_text='Dias antes do vencimento (0 = no dia)')),
+                ('recurso_nome', models.CharField(max_length=255)),
+                ('enviado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Alerta Enviado',
+                'verbose_name_plural': 'Alertas Enviados',
+                'ordering': ['-enviado_em'],
+                'indexes': [models.Index(fields=['vencimento'], name='alerta_vencimento_idx')],
+                'constraints': [models.UniqueConstraint(fields=('origem_tipo', 'origem_id', 'vencimento', 'limiar'), name='unique_alerta_custo_vencimento_limiar')],
+            },
+        ),
+    ]
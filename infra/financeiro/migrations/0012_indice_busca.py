@@ -0,0 +1,14 @@
+from django.db import migrations
+
+from app.busca import operacao_indice_busca
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0011_emailpendente'),
+    ]
+
+    operations = [
+        operacao_indice_busca('financeiro.despesaadicional'),
+    ]
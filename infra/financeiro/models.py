@@ -3,6 +3,7 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from contratos.models import Contrato
 from decimal import Decimal
+from datetime import date
 
 
 class PeriodoFinanceiro(models.Model):
@@ -29,6 +30,11 @@ class PeriodoFinanceiro(models.Model):
         status = "Fechado" if self.fechado else "Aberto"
         return f"{self.mes:02d}/{self.ano} ({status})"
 
+    @property
+    def competencia(self):
+        """Primeiro dia do mês do período."""
+        return date(self.ano, self.mes, 1)
+
     def clean(self):
         if not 1 <= self.mes <= 12:
             raise ValidationError('Mês deve estar entre 1 e 12')
@@ -102,6 +108,10 @@ class ContratoSnapshot(models.Model):
         related_name='contrato_snapshots'
     )
 
+    competencia = models.DateField(
+        help_text="Primeiro dia do mês do período (cópia de periodo.ano/mes para evitar join)"
+    )
+
     receita = models.DecimalField(
         max_digits=10, 
         decimal_places=2,
@@ -135,13 +145,359 @@ class ContratoSnapshot(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['-periodo__ano', '-periodo__mes']
+        ordering = ['-competencia']
         constraints = [
             models.UniqueConstraint(
                 fields=['contrato', 'periodo'],
                 name='unique_contrato_snapshot'
             )
         ]
+        indexes = [
+            models.Index(fields=['competencia', 'contrato'], name='snapshot_competencia_contr_idx'),
+            models.Index(fields=['contrato', 'competencia'], name='snapshot_contrato_compet_idx'),
+        ]
 
     def __str__(self):
         return f"{self.contrato} - {self.periodo}"
+
+    def save(self, *args, **kwargs):
+        if self.competencia is None and self.periodo_id:
+            self.competencia = self.periodo.competencia
+        super().save(*args, **kwargs)
+
+
+class ContratoSnapshotItem(models.Model):
+    """
+    Linha de custo de um snapshot (versão normalizada do detalhamento).
+
+    Gravado em lote no fechamento, permite consultas como
+    "quais contratos carregaram a VPS X no último ano" sem ler o JSON.
+    """
+    CATEGORIA_CHOICES = [
+        ('dominios', 'Domínios'),
+        ('hostings', 'Hostings'),
+        ('vps', 'VPS'),
+        ('backups', 'Backups'),
+        ('emails', 'Emails'),
+        ('despesas_adicionais', 'Despesas Adicionais'),
+    ]
+
+    snapshot = models.ForeignKey(
+        ContratoSnapshot,
+        on_delete=models.PROTECT,
+        related_name='itens'
+    )
+    contrato = models.ForeignKey(
+        Contrato,
+        on_delete=models.PROTECT,
+        related_name='snapshot_itens'
+    )
+    competencia = models.DateField()
+
+    categoria = models.CharField(max_length=30, choices=CATEGORIA_CHOICES)
+    recurso_tipo = models.CharField(
+        max_length=50,
+        help_text="Model do recurso (ex: 'vps.vps', 'dominios.dominio')"
+    )
+    recurso_id = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        help_text="ID do recurso. NULL para itens migrados do detalhamento antigo"
+    )
+    nome = models.CharField(max_length=200)
+
+    custo = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text="Parcela do custo atribuída ao contrato"
+    )
+    custo_total = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text="Custo mensal total do recurso antes do rateio"
+    )
+    rateio = models.PositiveIntegerField(
+        default=1,
+        help_text="Quantidade de contratos que dividiram o custo"
+    )
+
+    class Meta:
+        verbose_name = 'Item de Snapshot'
+        verbose_name_plural = 'Itens de Snapshot'
+        ordering = ['-competencia', 'categoria', 'nome']
+        indexes = [
+            models.Index(fields=['recurso_tipo', 'recurso_id', 'competencia'], name='snapitem_recurso_compet_idx'),
+            models.Index(fields=['competencia', 'categoria'], name='snapitem_compet_categoria_idx'),
+            models.Index(fields=['contrato', 'competencia'], name='snapitem_contrato_compet_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_categoria_display()} {self.nome} - R$ {self.custo}"
+
+
+class ContratoSnapshotMetrica(models.Model):
+    """
+    Métricas móveis de rentabilidade do contrato, calculadas no fechamento.
+
+    Médias de 3/6/12 meses consideram os snapshots existentes na janela
+    (competência do snapshot e meses anteriores).
+    """
+    snapshot = models.OneToOneField(
+        ContratoSnapshot,
+        on_delete=models.PROTECT,
+        related_name='metrica'
+    )
+    contrato = models.ForeignKey(
+        Contrato,
+        on_delete=models.PROTECT,
+        related_name='snapshot_metricas'
+    )
+    competencia = models.DateField()
+
+    media_receita_3m = models.DecimalField(max_digits=10, decimal_places=2)
+    media_receita_6m = models.DecimalField(max_digits=10, decimal_places=2)
+    media_receita_12m = models.DecimalField(max_digits=10, decimal_places=2)
+
+    media_custo_3m = models.DecimalField(max_digits=10, decimal_places=2)
+    media_custo_6m = models.DecimalField(max_digits=10, decimal_places=2)
+    media_custo_12m = models.DecimalField(max_digits=10, decimal_places=2)
+
+    media_margem_3m = models.DecimalField(max_digits=10, decimal_places=2)
+    media_margem_6m = models.DecimalField(max_digits=10, decimal_places=2)
+    media_margem_12m = models.DecimalField(max_digits=10, decimal_places=2)
+
+    tendencia_margem = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text="Inclinação da margem nos últimos 12 meses (R$/mês, mínimos quadrados)"
+    )
+    meses_prejuizo_consecutivos = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Meses seguidos com margem negativa até esta competência"
+    )
+
+    calculado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Métrica de Contrato'
+        verbose_name_plural = 'Métricas de Contratos'
+        ordering = ['-competencia', '-media_margem_3m']
+        indexes = [
+            models.Index(fields=['competencia', 'media_margem_3m'], name='metrica_compet_margem3m_idx'),
+            models.Index(fields=['competencia', 'meses_prejuizo_consecutivos'], name='metrica_compet_prejuizo_idx'),
+            models.Index(fields=['contrato', 'competencia'], name='metrica_contrato_compet_idx'),
+        ]
+
+    def __str__(self):
+        return f"Métricas {self.contrato} - {self.competencia:%m/%Y}"
+
+
+class ContratoAnomalia(models.Model):
+    """
+    Valor fora do padrão no snapshot de um contrato, detectado no fechamento.
+
+    Dois critérios, avaliados por métrica (receita, custo por categoria,
+    margem) contra o histórico do próprio contrato:
+    - zscore: distância até a média dos meses anteriores, em desvios-padrão
+    - salto: variação percentual em relação ao mês imediatamente anterior
+    """
+    METRICA_CHOICES = [
+        ('receita', 'Receita'),
+        ('custo_dominios', 'Custo Domínios'),
+        ('custo_hostings', 'Custo Hostings'),
+        ('custo_vps', 'Custo VPS'),
+        ('custo_backups', 'Custo Backups'),
+        ('custo_emails', 'Custo Emails'),
+        ('custo_despesas_adicionais', 'Despesas Adicionais'),
+        ('custo_total', 'Custo Total'),
+        ('margem', 'Margem'),
+    ]
+    TIPO_CHOICES = [
+        ('zscore', 'Fora da média histórica'),
+        ('salto', 'Salto mensal'),
+    ]
+
+    periodo = models.ForeignKey(
+        PeriodoFinanceiro,
+        on_delete=models.PROTECT,
+        related_name='anomalias'
+    )
+    snapshot = models.ForeignKey(
+        ContratoSnapshot,
+        on_delete=models.PROTECT,
+        related_name='anomalias'
+    )
+    contrato = models.ForeignKey(
+        Contrato,
+        on_delete=models.PROTECT,
+        related_name='anomalias'
+    )
+    competencia = models.DateField()
+
+    metrica = models.CharField(max_length=30, choices=METRICA_CHOICES)
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    valor = models.DecimalField(max_digits=10, decimal_places=2)
+    referencia = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text="Média histórica (zscore) ou valor do mês anterior (salto)"
+    )
+    score = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text="Z-score ou variação percentual"
+    )
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Anomalia de Contrato'
+        verbose_name_plural = 'Anomalias de Contratos'
+        ordering = ['-competencia', 'contrato', 'metrica']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['snapshot', 'metrica', 'tipo'],
+                name='unique_anomalia_snapshot_metrica'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['competencia', 'contrato'], name='anomalia_compet_contrato_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.contrato} - {self.get_metrica_display()} ({self.competencia:%m/%Y})"
+
+
+class CustoInfra(models.Model):
+    """
+    Livro consolidado dos custos de infraestrutura.
+
+    Uma linha por registro de DomainCost, HostingCost, VPSCost, VPSBackupCost
+    e DomainEmailCost, mantida em sincronia pelos signals. Guarda o custo
+    mensal já calculado e a vigência, para que "custos ativos no mês X" e
+    "vencimentos entre A e B" sejam uma única consulta indexada.
+    """
+    CATEGORIA_CHOICES = [
+        ('dominios', 'Domínios'),
+        ('hostings', 'Hostings'),
+        ('vps', 'VPS'),
+        ('backups', 'Backups'),
+        ('emails', 'Emails'),
+    ]
+
+    categoria = models.CharField(max_length=20, choices=CATEGORIA_CHOICES)
+
+    origem_tipo = models.CharField(
+        max_length=50,
+        help_text="Model do custo de origem (ex: 'vps.vpscost')"
+    )
+    origem_id = models.PositiveBigIntegerField()
+
+    recurso_tipo = models.CharField(
+        max_length=50,
+        help_text="Model do recurso (ex: 'vps.vps', 'dominios.dominio')"
+    )
+    recurso_id = models.PositiveBigIntegerField()
+    recurso_nome = models.CharField(max_length=255)
+    fornecedor = models.CharField(max_length=200, blank=True)
+
+    valor_total = models.DecimalField(max_digits=10, decimal_places=2)
+    periodo_meses = models.IntegerField()
+    custo_mensal = models.DecimalField(max_digits=10, decimal_places=2)
+
+    data_inicio = models.DateField()
+    data_fim = models.DateField(null=True, blank=True)
+    vencimento = models.DateField()
+    ativo = models.BooleanField(default=True)
+
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Custo de Infraestrutura'
+        verbose_name_plural = 'Livro de Custos'
+        ordering = ['vencimento']
+        unique_together = ['origem_tipo', 'origem_id']
+        indexes = [
+            models.Index(fields=['ativo', 'data_inicio', 'data_fim'], name='custoinfra_vigencia_idx'),
+            models.Index(fields=['ativo', 'vencimento'], name='custoinfra_vencimento_idx'),
+            models.Index(fields=['recurso_tipo', 'recurso_id'], name='custoinfra_recurso_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_categoria_display()} {self.recurso_nome} - R$ {self.custo_mensal}/mês"
+
+
+class AlertaEnviado(models.Model):
+    """
+    Registro dos alertas de vencimento já enviados.
+
+    Um alerta por custo, vencimento e limiar: a renovação muda o vencimento
+    e reinicia o ciclo; o registro evita reenvios e permite recuperar
+    alertas perdidos quando a task deixa de rodar.
+    """
+    origem_tipo = models.CharField(
+        max_length=50,
+        help_text="Model do custo de origem (ex: 'vps.vpscost')"
+    )
+    origem_id = models.PositiveBigIntegerField()
+    vencimento = models.DateField()
+    limiar = models.PositiveSmallIntegerField(help_text="Dias antes do vencimento (0 = no dia)")
+
+    recurso_nome = models.CharField(max_length=255)
+    enviado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Alerta Enviado'
+        verbose_name_plural = 'Alertas Enviados'
+        ordering = ['-enviado_em']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['origem_tipo', 'origem_id', 'vencimento', 'limiar'],
+                name='unique_alerta_custo_vencimento_limiar'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['vencimento'], name='alerta_vencimento_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recurso_nome} - {self.vencimento:%d/%m/%Y} ({self.limiar} dias)"
+
+
+class EmailPendente(models.Model):
+    """
+    Caixa de saída de emails do sistema.
+
+    As tasks que geram alertas apenas enfileiram o email já renderizado;
+    task_enviar_emails_pendentes esvazia a fila reaproveitando uma única
+    conexão SMTP, com novas tentativas em caso de falha.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('enviando', 'Enviando'),
+        ('enviado', 'Enviado'),
+        ('erro', 'Erro'),
+    ]
+
+    assunto = models.CharField(max_length=255)
+    corpo_texto = models.TextField()
+    corpo_html = models.TextField(blank=True)
+    destinatarios = models.JSONField(default=list)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    ultimo_erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    reservado_em = models.DateTimeField(null=True, blank=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Email Pendente'
+        verbose_name_plural = 'Emails Pendentes'
+        ordering = ['criado_em']
+        indexes = [
+            models.Index(fields=['status', 'criado_em'], name='email_status_criado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.assunto} ({self.get_status_display()})"
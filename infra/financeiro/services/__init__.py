@@ -1,9 +1,21 @@
 from .rateio import calcular_custo_mensal, ratear_por_contratos, validar_periodo
 from .fechamento_periodo import fechar_periodo
+from .metricas import calcular_metricas_periodo
+from .anomalias import detectar_anomalias_periodo
+from .itens_snapshot import contratos_por_recurso, custos_por_recurso
+from .livro_custos import custo_mensal_vigente, custo_vigente, custos_vigentes, reconstruir_livro
 
 __all__ = [
     'calcular_custo_mensal',
     'ratear_por_contratos',
     'validar_periodo',
     'fechar_periodo',
+    'calcular_metricas_periodo',
+    'detectar_anomalias_periodo',
+    'contratos_por_recurso',
+    'custos_por_recurso',
+    'custo_vigente',
+    'custos_vigentes',
+    'custo_mensal_vigente',
+    'reconstruir_livro',
 ]
@@ -0,0 +1,99 @@
+"""
+Motor de alertas de vencimento de infraestrutura.
+
+Uma consulta por intervalo no livro de custos (CustoInfra) cobre toda a
+janela de alerta; cada custo recebe o limiar mais urgente já atingido
+(ex: a 5 dias do vencimento, o de 7 dias). O log AlertaEnviado evita
+reenvios e faz a recuperação: se a task deixar de rodar, o próximo
+envio inclui os limiares atingidos nesse intervalo.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+
+from infra.financeiro.models import AlertaEnviado, CustoInfra
+from .calendario_vencimentos import TIPO_POR_CATEGORIA
+
+
+def limiares_configurados() -> list:
+    """Limiares em dias, do maior para o menor (settings.ALERTA_VENCIMENTO_LIMIARES)."""
+    return sorted({int(limiar) for limiar in settings.ALERTA_VENCIMENTO_LIMIARES if int(limiar) >= 0}, reverse=True)
+
+
+def alertas_pendentes(hoje: date = None, limiares=None, recuperacao_dias: int = None) -> list:
+    """
+    Alertas a enviar: limiar atingido e ainda não registrado.
+
+    Args:
+        limiares: Dias antes do vencimento (padrão: settings)
+        recuperacao_dias: Vencimentos já passados há até N dias ainda
+            geram o alerta do menor limiar (padrão: settings)
+
+    Returns:
+        list: [{'tipo', 'nome', 'fornecedor', 'vencimento', 'dias_restantes',
+                'valor', 'limiar', 'origem_tipo', 'origem_id'}],
+              ordenada por vencimento
+    """
+    hoje = hoje or date.today()
+    limiares = sorted(set(limiares), reverse=True) if limiares is not None else limiares_configurados()
+    if not limiares:
+        return []
+    if recuperacao_dias is None:
+        recuperacao_dias = settings.ALERTA_VENCIMENTO_RECUPERACAO_DIAS
+
+    inicio = hoje - timedelta(days=recuperacao_dias)
+    fim = hoje + timedelta(days=limiares[0])
+
+    custos = list(CustoInfra.objects.filter(
+        ativo=True,
+        vencimento__gte=inicio,
+        vencimento__lte=fim,
+    ).order_by('vencimento', 'recurso_nome').values(
+        'origem_tipo', 'origem_id', 'categoria', 'recurso_nome', 'fornecedor', 'valor_total', 'vencimento',
+    ))
+    if not custos:
+        return []
+
+    enviados = set(AlertaEnviado.objects.filter(
+        vencimento__gte=inicio,
+        vencimento__lte=fim,
+    ).values_list('origem_tipo', 'origem_id', 'vencimento', 'limiar'))
+
+    alertas = []
+    for custo in custos:
+        dias = (custo['vencimento'] - hoje).days
+        # Limiar mais urgente já atingido (o menor >= dias restantes)
+        limiar = min((limiar for limiar in limiares if limiar >= dias), default=None)
+        if limiar is None:
+            continue
+        chave = (custo['origem_tipo'], custo['origem_id'], custo['vencimento'])
+        if any((*chave, enviado) in enviados for enviado in limiares if enviado <= limiar):
+            continue
+
+        alertas.append({
+            'tipo': TIPO_POR_CATEGORIA[custo['categoria']],
+            'nome': custo['recurso_nome'],
+            'fornecedor': custo['fornecedor'],
+            'vencimento': custo['vencimento'].isoformat(),
+            'dias_restantes': dias,
+            'valor': float(custo['valor_total']),
+            'limiar': limiar,
+            'origem_tipo': custo['origem_tipo'],
+            'origem_id': custo['origem_id'],
+        })
+    return alertas
+
+
+def registrar_alertas(alertas) -> int:
+    """Grava os alertas enviados no log (ignorando duplicados)."""
+    registros = AlertaEnviado.objects.bulk_create([
+        AlertaEnviado(
+            origem_tipo=alerta['origem_tipo'],
+            origem_id=alerta['origem_id'],
+            vencimento=date.fromisoformat(alerta['vencimento']),
+            limiar=alerta['limiar'],
+            recurso_nome=alerta['nome'][:255],
+        )
+        for alerta in alertas
+    ], ignore_conflicts=True)
+    return len(registros)
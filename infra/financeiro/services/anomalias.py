@@ -0,0 +1,137 @@
+"""
+Detecção de anomalias nos snapshots de contratos.
+
+Executada no fechamento: o histórico dos contratos do período é carregado
+em uma única query, transposto em colunas (uma por métrica) e avaliado em
+uma única passada. As anomalias encontradas são gravadas em
+ContratoAnomalia e lidas pelo dashboard.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+
+from infra.financeiro.models import ContratoAnomalia, ContratoSnapshot, PeriodoFinanceiro
+from .cache_dashboard import invalidar_dashboard
+from .periodos import ano_mes, indice_mes, quantizar
+
+METRICAS = [metrica for metrica, _ in ContratoAnomalia.METRICA_CHOICES]
+JANELA_MESES = 12
+HISTORICO_MINIMO = 3
+LIMITE_ZSCORE = Decimal('3')
+LIMITE_SALTO = Decimal('50')  # variação percentual mês a mês
+VARIACAO_MINIMA = Decimal('10.00')  # diferenças menores (R$) são ruído
+
+
+def _media_desvio(coluna):
+    """Média e desvio-padrão populacional de uma coluna de Decimals."""
+    n = Decimal(len(coluna))
+    media = sum(coluna) / n
+    variancia = sum((valor - media) ** 2 for valor in coluna) / n
+    return media, variancia.sqrt()
+
+
+def detectar_anomalias(historico, mes_final: int) -> list:
+    """
+    Avalia a competência mes_final de um contrato contra o seu histórico.
+
+    Args:
+        historico: Lista ordenada de (indice_mes, valores), com valores na
+            ordem de METRICAS
+        mes_final: Índice do mês avaliado
+
+    Returns:
+        list: [{'metrica', 'tipo', 'valor', 'referencia', 'score'}]
+    """
+    por_mes = dict(historico)
+    atual = por_mes.get(mes_final)
+    if atual is None:
+        return []
+
+    anteriores = [
+        valores for indice, valores in historico
+        if mes_final - JANELA_MESES <= indice < mes_final
+    ]
+    colunas = list(zip(*anteriores)) if len(anteriores) >= HISTORICO_MINIMO else []
+    mes_anterior = por_mes.get(mes_final - 1)
+
+    anomalias = []
+    for posicao, metrica in enumerate(METRICAS):
+        valor = atual[posicao]
+
+        if colunas:
+            media, desvio = _media_desvio(colunas[posicao])
+            if desvio > 0 and abs(valor - media) >= VARIACAO_MINIMA:
+                zscore = (valor - media) / desvio
+                if abs(zscore) >= LIMITE_ZSCORE:
+                    anomalias.append({
+                        'metrica': metrica,
+                        'tipo': 'zscore',
+                        'valor': valor,
+                        'referencia': quantizar(media),
+                        'score': quantizar(zscore),
+                    })
+
+        if mes_anterior is not None:
+            anterior = mes_anterior[posicao]
+            if anterior != 0 and abs(valor - anterior) >= VARIACAO_MINIMA:
+                variacao = (valor - anterior) / abs(anterior) * 100
+                if abs(variacao) >= LIMITE_SALTO:
+                    anomalias.append({
+                        'metrica': metrica,
+                        'tipo': 'salto',
+                        'valor': valor,
+                        'referencia': anterior,
+                        'score': quantizar(variacao),
+                    })
+
+    return anomalias
+
+
+def detectar_anomalias_periodo(periodo: PeriodoFinanceiro) -> int:
+    """
+    Detecta e grava as anomalias de todos os snapshots de um período.
+
+    Idempotente: as anomalias anteriores do período são substituídas.
+
+    Returns:
+        int: Quantidade de anomalias gravadas
+    """
+    competencia = periodo.competencia
+    mes_final = indice_mes(competencia)
+
+    snapshots = list(
+        ContratoSnapshot.objects.filter(periodo=periodo).order_by().values_list('id', 'contrato_id')
+    )
+    ContratoAnomalia.objects.filter(periodo=periodo).delete()
+    # delete/bulk_create não disparam os signals do cache do dashboard
+    transaction.on_commit(invalidar_dashboard)
+    if not snapshots:
+        return 0
+
+    historico_por_contrato = {}
+    historico = ContratoSnapshot.objects.filter(
+        contrato_id__in=[contrato_id for _, contrato_id in snapshots],
+        competencia__lte=competencia,
+        competencia__gte=date(*ano_mes(mes_final - JANELA_MESES), 1),
+    ).order_by('contrato_id', 'competencia').values_list(
+        'contrato_id', 'competencia', *METRICAS
+    )
+    for contrato_id, comp, *valores in historico:
+        historico_por_contrato.setdefault(contrato_id, []).append(
+            (indice_mes(comp), tuple(valores))
+        )
+
+    anomalias = [
+        ContratoAnomalia(
+            periodo=periodo,
+            snapshot_id=snapshot_id,
+            contrato_id=contrato_id,
+            competencia=competencia,
+            **anomalia
+        )
+        for snapshot_id, contrato_id in snapshots
+        for anomalia in detectar_anomalias(historico_por_contrato.get(contrato_id, []), mes_final)
+    ]
+    ContratoAnomalia.objects.bulk_create(anomalias, batch_size=500)
+    return len(anomalias)
@@ -0,0 +1,195 @@
+"""
+Atribuição de custos de um único contrato, sob demanda.
+
+Responde "quanto o contrato X custa neste mês" sem fechar o período:
+busca apenas os recursos vinculados ao contrato e, em subquery, quantos
+contratos ativos compartilham cada recurso. O resultado tem a mesma
+estrutura de valores/detalhamento do fechamento (recalcular_periodo),
+com um número fixo de queries (8) independente do tamanho da base.
+"""
+from datetime import date, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from contratos.models import Contrato
+from infra.backups.models import VPSBackupCost
+from infra.dominios.models import Dominio, DomainCost
+from infra.emails.models import DomainEmailCost
+from infra.financeiro.models import DespesaAdicional
+from infra.hosting.models import Hosting, HostingCost
+from infra.vps.models import VPSContrato, VPSCost
+from invoices.models import InvoiceContrato
+from .cache_dashboard import secao_em_cache
+from .fechamento_periodo import _calcular_valores_snapshot, _novo_rateio
+from .rateio import calcular_custo_mensal, ratear_valor
+
+
+def _vigente(primeiro_dia: date, ultimo_dia: date, prefixo: str = '') -> Q:
+    """data_inicio antes do fim do mês e data_fim vazia ou dentro/após o mês."""
+    return Q(**{f'{prefixo}data_inicio__lt': ultimo_dia}) & (
+        Q(**{f'{prefixo}data_fim__isnull': True}) | Q(**{f'{prefixo}data_fim__gte': primeiro_dia})
+    )
+
+
+def _contagem(subconsulta, campo: str):
+    """Subquery de COUNT agrupada pelo campo correlacionado."""
+    return Coalesce(
+        Subquery(
+            subconsulta.order_by().values(campo).annotate(total=Count('pk')).values('total')[:1],
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def _contratos_m2m(model_recurso, campo_custo: str, primeiro_dia: date, ultimo_dia: date):
+    """Contratos ativos vinculados (M2M) ao recurso do custo."""
+    relacao = model_recurso._meta.get_field('contratos')
+    campo_recurso = relacao.m2m_field_name()
+    vinculos = relacao.remote_field.through.objects.filter(
+        _vigente(primeiro_dia, ultimo_dia, 'contrato__'),
+        **{campo_recurso: OuterRef(campo_custo)},
+    )
+    return _contagem(vinculos, campo_recurso)
+
+
+def _contratos_vps(campo_vps: str, primeiro_dia: date, ultimo_dia: date):
+    """Vínculos VPSContrato vigentes no mês com contrato também ativo."""
+    vinculos = VPSContrato.objects.filter(
+        _vigente(primeiro_dia, ultimo_dia),
+        _vigente(primeiro_dia, ultimo_dia, 'contrato__'),
+        vps=OuterRef(campo_vps),
+    )
+    return _contagem(vinculos, 'vps')
+
+
+def atribuir_custos_contrato(contrato_id: int, competencia: date = None) -> dict:
+    """
+    Calcula receita, custos rateados e margem de um contrato num mês.
+
+    Args:
+        contrato_id: ID do contrato
+        competencia: Qualquer dia do mês (padrão: mês atual)
+
+    Returns:
+        dict: Mesmos campos de _calcular_valores_snapshot (receita,
+        custo_*, custo_total, margem, margem_percentual, detalhamento)
+        mais 'competencia' (AAAA-MM)
+
+    Raises:
+        Contrato.DoesNotExist: Contrato inexistente
+        ValidationError: Contrato fora de vigência no mês
+    """
+    competencia = (competencia or date.today()).replace(day=1)
+    primeiro_dia = competencia
+    ultimo_dia = date(competencia.year + competencia.month // 12, competencia.month % 12 + 1, 1)
+
+    contrato = Contrato.objects.select_related('cliente').get(pk=contrato_id)
+    if not (contrato.data_inicio < ultimo_dia and (contrato.data_fim is None or contrato.data_fim >= primeiro_dia)):
+        raise ValidationError(f"Contrato {contrato} não está ativo em {competencia:%m/%Y}")
+
+    rateio = _novo_rateio()
+    detalhamento = rateio['detalhamento']
+    ultimo_dia_mes = ultimo_dia - timedelta(days=1)
+
+    # Receita (InvoiceContrato do mês)
+    itens = list(InvoiceContrato.objects.filter(
+        contrato=contrato,
+        invoice__mes_referencia=competencia.month,
+        invoice__ano_referencia=competencia.year,
+    ).select_related('invoice'))
+    for item in itens:
+        rateio['receita'] += item.valor
+        detalhamento['invoices'].append({
+            'id': item.invoice.id,
+            'status': item.invoice.status,
+            'valor_invoice': float(item.invoice.valor_total),
+            'valor_contrato': float(item.valor),
+            'vencimento': str(item.invoice.vencimento),
+            'order_nsu': item.invoice.order_nsu or ''
+        })
+    if not itens:
+        detalhamento['invoices'].append({'observacao': 'Sem invoice no período - receita zerada'})
+
+    # Domínios e hostings (M2M sem vigência própria); VPS e backups
+    # (vínculo VPSContrato vigente no mês)
+    vinculo_vps = 'vps__vpscontrato__'
+    vinculo_backup = 'backup__vps__vpscontrato__'
+    compartilhados = [
+        ('dominios', DomainCost, Q(domain__contratos=contrato),
+         _contratos_m2m(Dominio, 'domain_id', primeiro_dia, ultimo_dia)),
+        ('hostings', HostingCost, Q(hosting__contratos=contrato),
+         _contratos_m2m(Hosting, 'hosting_id', primeiro_dia, ultimo_dia)),
+        ('vps', VPSCost, _vigente(primeiro_dia, ultimo_dia, vinculo_vps) & Q(**{f'{vinculo_vps}contrato': contrato}),
+         _contratos_vps('vps_id', primeiro_dia, ultimo_dia)),
+        ('backups', VPSBackupCost,
+         _vigente(primeiro_dia, ultimo_dia, vinculo_backup) & Q(**{f'{vinculo_backup}contrato': contrato}),
+         _contratos_vps('backup__vps_id', primeiro_dia, ultimo_dia)),
+    ]
+
+    for categoria, model_custo, vinculo, contagem in compartilhados:
+        custos = model_custo.objects.vigentes(primeiro_dia, ultimo_dia_mes).filter(vinculo).select_related(
+            'backup__vps' if categoria == 'backups' else model_custo.campo_recurso
+        ).annotate(contratos_rateio=contagem)
+        for cost in custos:
+            recurso = getattr(cost, model_custo.campo_recurso)
+            custo_mensal = calcular_custo_mensal(cost)
+            custo_rateado = ratear_valor(custo_mensal, cost.contratos_rateio)
+            linha = {'nome': recurso.nome}
+            if categoria == 'backups':
+                linha['vps'] = recurso.vps.nome
+            linha.update({
+                'custo': float(custo_rateado),
+                'custo_total': float(custo_mensal),
+                'rateio': cost.contratos_rateio,
+            })
+            rateio[f'custo_{categoria}'] += custo_rateado
+            detalhamento[categoria].append(linha)
+
+    # Emails (custo direto, sem rateio)
+    emails = DomainEmailCost.objects.vigentes(primeiro_dia, ultimo_dia_mes).filter(
+        email__contrato=contrato
+    ).select_related('email__dominio')
+    for cost in emails:
+        custo_mensal = calcular_custo_mensal(cost)
+        rateio['custo_emails'] += custo_mensal
+        detalhamento['emails'].append({
+            'dominio': cost.email.dominio.nome,
+            'fornecedor': cost.email.fornecedor,
+            'custo': float(custo_mensal),
+            'custo_total': float(custo_mensal),
+            'rateio': 1
+        })
+
+    # Despesas adicionais do mês
+    for despesa in DespesaAdicional.objects.filter(
+        contrato=contrato,
+        mes_referencia=competencia.month,
+        ano_referencia=competencia.year,
+    ):
+        rateio['custo_despesas_adicionais'] += despesa.valor
+        detalhamento['despesas_adicionais'].append({
+            'descricao': despesa.descricao,
+            'valor': float(despesa.valor),
+            'observacoes': despesa.observacoes
+        })
+
+    valores = _calcular_valores_snapshot(contrato, rateio)
+    valores['competencia'] = f'{competencia:%Y-%m}'
+    return valores
+
+
+def atribuicao_em_cache(contrato_id: int, competencia: date = None) -> dict:
+    """
+    atribuir_custos_contrato no cache versionado do dashboard.
+
+    A versão muda a cada alteração de custos, vínculos, contratos,
+    invoices ou despesas (signals), invalidando a atribuição.
+    """
+    competencia = (competencia or date.today()).replace(day=1)
+    return secao_em_cache(
+        f'atribuicao:{contrato_id}:{competencia:%Y-%m}',
+        lambda: atribuir_custos_contrato(contrato_id, competencia),
+    )
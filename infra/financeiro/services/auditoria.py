@@ -0,0 +1,182 @@
+"""
+Auditoria de períodos fechados.
+
+Recalcula o rateio de um período fechado com as regras atuais e compara,
+campo a campo, com os snapshots gravados. Nunca altera dados fechados.
+
+O recálculo usa os vínculos (M2M, VPSContrato) e os registros de custo
+atuais, não uma cópia das entradas do fechamento: vincular ou desvincular
+um recurso depois do fechamento também aparece como divergência.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+
+from app.processos import inicializar_django
+from infra.financeiro.models import ContratoSnapshot, PeriodoFinanceiro
+from .fechamento_periodo import recalcular_periodo
+
+CAMPOS_AUDITADOS = [
+    'receita',
+    'custo_dominios',
+    'custo_hostings',
+    'custo_vps',
+    'custo_backups',
+    'custo_emails',
+    'custo_despesas_adicionais',
+    'custo_total',
+    'margem',
+    'margem_percentual',
+]
+CATEGORIAS_DETALHAMENTO = [
+    'dominios', 'hostings', 'vps', 'backups', 'emails', 'despesas_adicionais'
+]
+
+
+def _normalizar_linhas(linhas) -> list:
+    """Ordena as linhas de uma categoria do detalhamento para comparação."""
+    return sorted(
+        (tuple(sorted((chave, str(valor)) for chave, valor in linha.items())) for linha in linhas)
+    )
+
+
+def _linhas_invoices(linhas) -> list:
+    """Invoices: compara só o vínculo e o valor (o status muda após o fechamento)."""
+    return sorted(
+        (linha.get('id'), Decimal(str(linha.get('valor_contrato', 0))))
+        for linha in linhas if 'id' in linha
+    )
+
+
+def comparar_snapshot(snapshot: ContratoSnapshot, valores: dict) -> list:
+    """
+    Compara um snapshot gravado com os valores recalculados.
+
+    Returns:
+        list: [{'campo', 'armazenado', 'recalculado'}] para cada divergência
+    """
+    diferencas = []
+    for campo in CAMPOS_AUDITADOS:
+        armazenado = getattr(snapshot, campo)
+        recalculado = valores[campo]
+        if armazenado != recalculado:
+            diferencas.append({
+                'campo': campo,
+                'armazenado': armazenado,
+                'recalculado': recalculado,
+            })
+
+    detalhamento_armazenado = snapshot.detalhamento or {}
+    detalhamento_recalculado = valores['detalhamento']
+    for categoria in CATEGORIAS_DETALHAMENTO:
+        armazenado = _normalizar_linhas(detalhamento_armazenado.get(categoria, []))
+        recalculado = _normalizar_linhas(detalhamento_recalculado.get(categoria, []))
+        if armazenado != recalculado:
+            diferencas.append({
+                'campo': f'detalhamento.{categoria}',
+                'armazenado': detalhamento_armazenado.get(categoria, []),
+                'recalculado': detalhamento_recalculado.get(categoria, []),
+            })
+
+    armazenado = _linhas_invoices(detalhamento_armazenado.get('invoices', []))
+    recalculado = _linhas_invoices(detalhamento_recalculado.get('invoices', []))
+    if armazenado != recalculado:
+        diferencas.append({
+            'campo': 'detalhamento.invoices',
+            'armazenado': armazenado,
+            'recalculado': recalculado,
+        })
+
+    return diferencas
+
+
+def auditar_periodo(periodo_id: int) -> dict:
+    """
+    Audita um período fechado.
+
+    A leitura roda dentro de uma transação sempre revertida, garantindo
+    que nada seja gravado.
+
+    Returns:
+        dict: {
+            'periodo': str,
+            'contratos': int,
+            'divergencias': [{'contrato_id', 'contrato', 'campo', 'armazenado', 'recalculado'}],
+            'erro': str | None
+        }
+    """
+    with transaction.atomic():
+        periodo = PeriodoFinanceiro.objects.get(id=periodo_id)
+        resultado = {
+            'periodo': str(periodo),
+            'contratos': 0,
+            'divergencias': [],
+            'erro': None,
+        }
+
+        try:
+            recalculados = recalcular_periodo(periodo)
+        except ValidationError as e:
+            recalculados = {}
+            resultado['erro'] = '; '.join(e.messages)
+
+        snapshots = ContratoSnapshot.objects.filter(
+            periodo=periodo
+        ).select_related('contrato__cliente')
+
+        vistos = set()
+        for snapshot in snapshots:
+            vistos.add(snapshot.contrato_id)
+            valores = recalculados.get(snapshot.contrato_id)
+            if valores is None:
+                diferencas = [{
+                    'campo': 'snapshot',
+                    'armazenado': 'existe',
+                    'recalculado': 'contrato fora do período',
+                }]
+            else:
+                diferencas = comparar_snapshot(snapshot, valores)
+
+            for diferenca in diferencas:
+                resultado['divergencias'].append({
+                    'contrato_id': snapshot.contrato_id,
+                    'contrato': str(snapshot.contrato),
+                    **diferenca,
+                })
+
+        for contrato_id in recalculados.keys() - vistos:
+            resultado['divergencias'].append({
+                'contrato_id': contrato_id,
+                'contrato': f'Contrato #{contrato_id}',
+                'campo': 'snapshot',
+                'armazenado': 'ausente',
+                'recalculado': 'contrato ativo no período',
+            })
+
+        resultado['contratos'] = len(vistos | recalculados.keys())
+
+        # Somente leitura: descarta qualquer escrita acidental
+        transaction.set_rollback(True)
+        return resultado
+
+
+def auditar_periodos(periodo_ids, workers: int = 1) -> list:
+    """
+    Audita vários períodos, em paralelo quando workers > 1.
+
+    Os workers usam o contexto padrão de multiprocessing da plataforma
+    (fork, spawn ou forkserver); app.processos.inicializar_django configura
+    o Django em cada um.
+
+    Returns:
+        list: Resultados de auditar_periodo, na ordem dos IDs informados
+    """
+    periodo_ids = list(periodo_ids)
+    if workers <= 1 or len(periodo_ids) <= 1:
+        return [auditar_periodo(periodo_id) for periodo_id in periodo_ids]
+
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=inicializar_django) as executor:
+        return list(executor.map(auditar_periodo, periodo_ids))
@@ -0,0 +1,84 @@
+"""
+Cache versionado do dashboard financeiro.
+
+Cada seção do dashboard é guardada no cache com uma chave que inclui um
+contador de versão dos dados. Os signals incrementam o contador sempre que
+um model lido pelo dashboard muda, então chaves antigas deixam de ser lidas
+(e expiram sozinhas) sem precisar apagar nada.
+
+Se o contador for descartado (reinício ou despejo por LRU) enquanto as
+seções sobrevivem, ele recomeça do relógio em nanossegundos, nunca de um
+valor já usado: seções antigas não voltam a ser lidas como atuais.
+"""
+import time
+from datetime import date, datetime
+
+from django.core.cache import cache
+from django.utils import timezone
+
+CHAVE_VERSAO = 'financeiro:dashboard:versao'
+CHAVE_ATUALIZADO_EM = 'financeiro:dashboard:atualizado_em'
+TIMEOUT_SECAO = 60 * 60 * 6  # 6 horas
+
+
+def _versao_inicial() -> int:
+    """Sempre maior que qualquer versão anterior do contador."""
+    return time.time_ns()
+
+
+def versao_dados() -> int:
+    """Versão atual dos dados do dashboard."""
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, _versao_inicial(), timeout=None)
+        versao = cache.get(CHAVE_VERSAO)
+    return versao
+
+
+def dados_atualizados_em() -> datetime:
+    """Momento da última invalidação (Last-Modified dos endpoints de gráfico)."""
+    atualizado_em = cache.get(CHAVE_ATUALIZADO_EM)
+    if atualizado_em is None:
+        cache.add(CHAVE_ATUALIZADO_EM, timezone.now().replace(microsecond=0), timeout=None)
+        atualizado_em = cache.get(CHAVE_ATUALIZADO_EM)
+    return atualizado_em
+
+
+def invalidar_dashboard() -> None:
+    """Incrementa a versão, tornando todas as seções em cache obsoletas."""
+    cache.set(CHAVE_ATUALIZADO_EM, timezone.now().replace(microsecond=0), timeout=None)
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        # Chave ausente (cache reiniciado ou despejada): recomeça do relógio
+        cache.add(CHAVE_VERSAO, _versao_inicial(), timeout=None)
+        cache.incr(CHAVE_VERSAO)
+
+
+def buscar_secao(nome: str, calcular, timeout: int = TIMEOUT_SECAO):
+    """
+    Retorna a seção do cache ou calcula e guarda.
+
+    A chave inclui o dia, pois várias seções dependem da data atual
+    (mês corrente, dias até o vencimento).
+
+    Args:
+        nome: Identificador da seção (ex: 'cards')
+        calcular: Callable sem argumentos que produz o valor da seção
+        timeout: Validade em segundos
+
+    Returns:
+        tuple: (valor, veio_do_cache)
+    """
+    chave = f'financeiro:dashboard:v{versao_dados()}:{date.today().isoformat()}:{nome}'
+    valor = cache.get(chave)
+    if valor is not None:
+        return valor, True
+    valor = calcular()
+    cache.set(chave, valor, timeout)
+    return valor, False
+
+
+def secao_em_cache(nome: str, calcular, timeout: int = TIMEOUT_SECAO):
+    """Como buscar_secao, retornando apenas o valor."""
+    return buscar_secao(nome, calcular, timeout)[0]
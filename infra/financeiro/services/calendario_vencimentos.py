@@ -0,0 +1,138 @@
+"""
+Calendário de vencimentos de infraestrutura.
+
+Responde qualquer intervalo de datas com uma única consulta ao livro
+consolidado de custos (CustoInfra), já ordenada e classificada por
+urgência no banco. Alimenta o dashboard e os feeds JSON/iCal.
+"""
+from datetime import date, timedelta
+
+from django.db.models import Case, CharField, IntegerField, Value, When
+from django.utils import timezone
+
+from infra.financeiro.models import CustoInfra
+
+TIPO_POR_CATEGORIA = {
+    'dominios': 'Domínio',
+    'hostings': 'Hosting',
+    'vps': 'VPS',
+    'backups': 'Backup',
+    'emails': 'Email',
+}
+
+URGENCIAS = {
+    'vencido': {'nivel': 'vencido', 'cor': '#8b0000', 'texto': 'VENCIDO'},
+    'alta': {'nivel': 'alta', 'cor': '#dc3545', 'texto': 'URGENTE'},
+    'media': {'nivel': 'media', 'cor': '#ffc107', 'texto': 'Atenção'},
+    'baixa': {'nivel': 'baixa', 'cor': '#28a745', 'texto': 'Normal'},
+}
+
+
+def vencimentos_entre(inicio: date, fim: date, hoje: date = None) -> list:
+    """
+    Custos ativos com vencimento entre inicio e fim (inclusive).
+
+    Ordenação: já vencidos primeiro (mais antigos), depois por vencimento.
+    Urgência: vencido (<= hoje), alta (<= 7 dias), media (<= 15), baixa.
+
+    Returns:
+        list: [{
+            'tipo', 'categoria', 'nome', 'fornecedor', 'valor', 'vencimento',
+            'dias_restantes', 'urgencia', 'vencido', 'uid'
+        }]
+    """
+    hoje = hoje or date.today()
+
+    linhas = CustoInfra.objects.filter(
+        ativo=True,
+        vencimento__gte=inicio,
+        vencimento__lte=fim,
+    ).annotate(
+        nivel=Case(
+            When(vencimento__lte=hoje, then=Value('vencido')),
+            When(vencimento__lte=hoje + timedelta(days=7), then=Value('alta')),
+            When(vencimento__lte=hoje + timedelta(days=15), then=Value('media')),
+            default=Value('baixa'),
+            output_field=CharField(),
+        ),
+        ordem_vencido=Case(
+            When(vencimento__lt=hoje, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ),
+    ).order_by('ordem_vencido', 'vencimento', 'recurso_nome').values(
+        'origem_tipo', 'origem_id', 'categoria', 'recurso_nome', 'fornecedor',
+        'valor_total', 'vencimento', 'nivel', 'ordem_vencido',
+    )
+
+    return [{
+        'tipo': TIPO_POR_CATEGORIA[linha['categoria']],
+        'categoria': linha['categoria'],
+        'nome': linha['recurso_nome'],
+        'fornecedor': linha['fornecedor'],
+        'valor': linha['valor_total'],
+        'vencimento': linha['vencimento'],
+        'dias_restantes': (linha['vencimento'] - hoje).days,
+        'urgencia': URGENCIAS[linha['nivel']],
+        'vencido': linha['ordem_vencido'] == 0,
+        'uid': f"{linha['origem_tipo']}-{linha['origem_id']}",
+    } for linha in linhas]
+
+
+def _escapar_ical(texto: str) -> str:
+    return (
+        str(texto)
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\n', '\\n')
+    )
+
+
+def _dobrar_linha_ical(linha: str) -> str:
+    """Quebra linhas com mais de 75 octetos (RFC 5545, 3.1)."""
+    partes = []
+    atual = ''
+    for caractere in linha:
+        limite = 75 if not partes else 74
+        if len((atual + caractere).encode('utf-8')) > limite:
+            partes.append(atual)
+            atual = caractere
+        else:
+            atual += caractere
+    partes.append(atual)
+    return '\r\n '.join(partes)
+
+
+def gerar_ical(vencimentos: list, dominio: str = 'control') -> str:
+    """
+    Gera um VCALENDAR com um evento de dia inteiro por vencimento.
+
+    Args:
+        vencimentos: Resultado de vencimentos_entre
+        dominio: Sufixo dos UIDs dos eventos
+    """
+    agora = timezone.now().strftime('%Y%m%dT%H%M%SZ')
+    linhas = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//control//Vencimentos de Infraestrutura//PT-BR',
+        'CALSCALE:GREGORIAN',
+        'X-WR-CALNAME:Vencimentos de Infraestrutura',
+    ]
+    for item in vencimentos:
+        resumo = f"Vencimento {item['tipo']}: {item['nome']}"
+        descricao = f"Fornecedor: {item['fornecedor'] or '-'}\nValor: R$ {item['valor']}"
+        linhas.extend([
+            'BEGIN:VEVENT',
+            f"UID:{item['uid']}@{dominio}",
+            f'DTSTAMP:{agora}',
+            f"DTSTART;VALUE=DATE:{item['vencimento']:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{item['vencimento'] + timedelta(days=1):%Y%m%d}",
+            f'SUMMARY:{_escapar_ical(resumo)}',
+            f'DESCRIPTION:{_escapar_ical(descricao)}',
+            'TRANSP:TRANSPARENT',
+            'END:VEVENT',
+        ])
+    linhas.append('END:VCALENDAR')
+    return '\r\n'.join(_dobrar_linha_ical(linha) for linha in linhas) + '\r\n'
@@ -0,0 +1,135 @@
+"""
+Aging de contas a receber.
+
+Invoices em aberto (pendente/atrasado) agrupadas por cliente e por faixa de
+atraso em uma única agregação condicional, filtrada pelos índices de
+status e vencimento.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+from invoices.models import Invoice
+
+STATUS_EM_ABERTO = ['pendente', 'atrasado']
+
+# chave -> (rótulo, menor atraso em dias, maior atraso em dias ou None)
+FAIXAS_AGING = {
+    'a_vencer': ('A vencer', None, 0),
+    'dias_1_15': ('1–15 dias', 1, 15),
+    'dias_16_30': ('16–30 dias', 16, 30),
+    'dias_31_60': ('31–60 dias', 31, 60),
+    'dias_60_mais': ('Mais de 60 dias', 61, None),
+}
+
+
+def _filtro_faixa(hoje: date, minimo, maximo) -> Q:
+    """Atraso = hoje - vencimento; 'a vencer' inclui o próprio dia."""
+    filtro = Q()
+    if minimo is not None:
+        filtro &= Q(vencimento__lte=hoje - timedelta(days=minimo))
+    if maximo is not None:
+        filtro &= Q(vencimento__gte=hoje - timedelta(days=maximo))
+    return filtro
+
+
+def aging_recebiveis(hoje: date = None) -> dict:
+    """
+    Aging das invoices em aberto, por cliente e total.
+
+    Returns:
+        dict: {
+            'data_base': date,
+            'faixas': [(chave, rótulo)],
+            'clientes': [{'cliente_id', 'cliente', 'telefone', 'qtd', 'total',
+                          'vencido', <chave da faixa>: Decimal, ...,
+                          'valores': [Decimal na ordem das faixas]}],
+            'total': {'qtd', 'total', 'vencido', <chave da faixa>, 'valores'}
+        }
+    """
+    hoje = hoje or date.today()
+
+    agregacoes = {
+        chave: Sum('valor_total', filter=_filtro_faixa(hoje, minimo, maximo), default=Decimal('0.00'))
+        for chave, (_, minimo, maximo) in FAIXAS_AGING.items()
+    }
+    linhas = Invoice.objects.filter(
+        status__in=STATUS_EM_ABERTO,
+    ).values(
+        'cliente_id', 'cliente__nome', 'cliente__telefone'
+    ).annotate(
+        qtd=Count('id'),
+        total=Sum('valor_total'),
+        **agregacoes
+    ).order_by()
+
+    total = dict.fromkeys(['qtd', 'total', 'vencido', *FAIXAS_AGING], Decimal('0.00'))
+    total['qtd'] = 0
+    clientes = []
+    for linha in linhas:
+        cliente = {
+            'cliente_id': linha['cliente_id'],
+            'cliente': linha['cliente__nome'],
+            'telefone': linha['cliente__telefone'] or '',
+            'qtd': linha['qtd'],
+            'total': linha['total'],
+            'vencido': linha['total'] - linha['a_vencer'],
+            **{chave: linha[chave] for chave in FAIXAS_AGING},
+        }
+        clientes.append(cliente)
+        for chave in total:
+            total[chave] += cliente[chave]
+        cliente['valores'] = [cliente[chave] for chave in FAIXAS_AGING]
+
+    # Maiores atrasos primeiro: é a ordem de trabalho da cobrança
+    clientes.sort(key=lambda c: (-c['dias_60_mais'], -c['vencido'], c['cliente']))
+    total['valores'] = [total[chave] for chave in FAIXAS_AGING]
+
+    return {
+        'data_base': hoje,
+        'faixas': [(chave, rotulo) for chave, (rotulo, _, _) in FAIXAS_AGING.items()],
+        'clientes': clientes,
+        'total': total,
+    }
+
+
+def gerar_planilha_aging(aging: dict) -> Workbook:
+    """Planilha do aging: uma linha por cliente e a linha de total."""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = f"Aging {aging['data_base']:%d-%m-%Y}"
+
+    faixas = aging['faixas']
+    sheet.append(['Cliente', 'Telefone', 'Invoices', *(rotulo for _, rotulo in faixas), 'Vencido', 'Total'])
+    for cell in sheet[1]:
+        cell.font = Font(bold=True)
+
+    for cliente in aging['clientes']:
+        sheet.append([
+            cliente['cliente'],
+            cliente['telefone'],
+            cliente['qtd'],
+            *(float(cliente[chave]) for chave, _ in faixas),
+            float(cliente['vencido']),
+            float(cliente['total']),
+        ])
+
+    total = aging['total']
+    sheet.append([])
+    sheet.append([
+        'TOTAL',
+        '',
+        total['qtd'],
+        *(float(total[chave]) for chave, _ in faixas),
+        float(total['vencido']),
+        float(total['total']),
+    ])
+    for cell in sheet[sheet.max_row]:
+        cell.font = Font(bold=True)
+
+    sheet.column_dimensions['A'].width = 30
+    sheet.column_dimensions['B'].width = 18
+    return workbook
@@ -9,17 +9,23 @@ Princípios:
 """
 from decimal import Decimal
 from datetime import date, timedelta
-from django.db.models import Sum, Avg, Count, Q, F
+from math import ceil
+from django.db.models import Sum, Avg, Count, Q, F, Exists, OuterRef, Subquery
+from django.db.models.functions import Abs
 from django.utils import timezone
 
-from infra.financeiro.models import PeriodoFinanceiro, ContratoSnapshot, DespesaAdicional
+from infra.financeiro.models import (
+    PeriodoFinanceiro, ContratoAnomalia, ContratoSnapshot, ContratoSnapshotItem, ContratoSnapshotMetrica, DespesaAdicional
+)
 from contratos.models import Contrato
-from invoices.models import Invoice, MessageQueue
-from infra.dominios.models import DomainCost
-from infra.vps.models import VPSCost
-from infra.hosting.models import HostingCost
-from infra.emails.models import DomainEmailCost
-from infra.backups.models import VPSBackupCost
+from invoices.models import Invoice, InvoiceContrato, MessageQueue
+from .itens_snapshot import custos_por_recurso
+from .livro_custos import custo_mensal_vigente
+from .calendario_vencimentos import vencimentos_entre
+
+INVOICES_POR_PAGINA = 25
+INVOICES_POR_PAGINA_MAX = 100
+CORES_NIVEL_ALERTA = {'alto': '#dc3545', 'medio': '#ffc107'}
 
 
 class DashboardService:
@@ -158,13 +164,8 @@ class DashboardService:
         )
         receita_contratos = sum(c.valor_mensal for c in contratos_ativos)
         
-        # Custos ativos (soma de todas as categorias)
-        despesa = Decimal('0.00')
-        despesa += self._somar_custos_ativos(DomainCost)
-        despesa += self._somar_custos_ativos(VPSCost)
-        despesa += self._somar_custos_ativos(HostingCost)
-        despesa += self._somar_custos_ativos(DomainEmailCost)
-        despesa += self._somar_custos_ativos(VPSBackupCost)
+        # Custos ativos (soma de todas as categorias, uma agregação no livro de custos)
+        despesa = custo_mensal_vigente(self.primeiro_dia_mes_atual)
         despesa += (
             DespesaAdicional.objects.filter(
                 mes_referencia=self.primeiro_dia_mes_atual.month,
@@ -188,21 +189,6 @@ class DashboardService:
             'margem_pct_contratos': margem_pct_contratos,
         }
     
-    def _somar_custos_ativos(self, model_class):
-        """Soma custo mensal de um tipo de custo ativo."""
-        custos = model_class.objects.filter(
-            data_inicio__lte=self.primeiro_dia_mes_atual,
-            ativo=True
-        ).filter(
-            Q(data_fim__isnull=True) | Q(data_fim__gte=self.primeiro_dia_mes_atual)
-        )
-        
-        total = Decimal('0.00')
-        for custo in custos:
-            total += custo.custo_mensal
-        
-        return total
-    
     # ========================================
     # 2️⃣ ANÁLISE POR CONTRATO (ÚLTIMOS 3 MESES)
     # ========================================
@@ -219,28 +205,30 @@ class DashboardService:
         - Tendência
         """
         # Últimos 3 períodos fechados
-        periodos = PeriodoFinanceiro.objects.filter(
+        periodos = list(PeriodoFinanceiro.objects.filter(
             fechado=True
-        ).order_by('-ano', '-mes')[:3]
+        ).order_by('-ano', '-mes')[:3])
         
-        if not periodos.exists():
+        if not periodos:
             return []
         
-        periodos_list = list(periodos)
-        periodos_list.reverse()  # Ordem cronológica
+        # Uma única query para todos os snapshots dos períodos, agrupada em memória
+        snapshots = ContratoSnapshot.objects.filter(
+            competencia__in=[p.competencia for p in periodos]
+        ).select_related('contrato__cliente', 'periodo', 'metrica').defer(
+            'detalhamento'
+        ).order_by(
+            '-contrato__data_inicio', 'contrato_id', 'competencia'
+        )
         
-        # Buscar contratos com snapshots nesses períodos
-        contratos = Contrato.objects.filter(
-            snapshots__periodo__in=periodos
-        ).distinct().select_related('cliente')
+        snapshots_por_contrato = {}
+        for snapshot in snapshots:
+            snapshots_por_contrato.setdefault(snapshot.contrato_id, []).append(snapshot)
         
         resultado = []
         
-        for contrato in contratos:
-            snapshots_contrato = ContratoSnapshot.objects.filter(
-                contrato=contrato,
-                periodo__in=periodos
-            ).select_related('periodo').order_by('periodo__ano', 'periodo__mes')
+        for snapshots_contrato in snapshots_por_contrato.values():
+            contrato = snapshots_contrato[0].contrato
             
             dados_meses = []
             for snapshot in snapshots_contrato:
@@ -252,11 +240,23 @@ class DashboardService:
                     'custo': snapshot.custo_total,
                     'lucro': snapshot.margem,
                     'margem_pct': margem_pct,
-                    'is_interno': snapshot.contrato.cliente.tipo == 'interno'
+                    'is_interno': contrato.cliente.tipo == 'interno'
                 })
             
-            # Calcular tendência (último mês vs primeiro mês)
-            if len(dados_meses) >= 2:
+            # Tendência: inclinação da margem calculada no fechamento (12 meses).
+            # Snapshots sem métrica usam último mês vs primeiro mês.
+            metrica = getattr(snapshots_contrato[-1], 'metrica', None)
+            if metrica is not None:
+                if metrica.tendencia_margem > 0:
+                    tendencia = '↑'
+                    tendencia_cor = 'green'
+                elif metrica.tendencia_margem < 0:
+                    tendencia = '↓'
+                    tendencia_cor = 'red'
+                else:
+                    tendencia = '='
+                    tendencia_cor = 'gray'
+            elif len(dados_meses) >= 2:
                 lucro_inicial = dados_meses[0]['lucro']
                 lucro_final = dados_meses[-1]['lucro']
                 
@@ -290,6 +290,36 @@ class DashboardService:
         
         return resultado[:limit]
     
+    def get_contratos_em_prejuizo(self, limit=10):
+        """
+        Contratos com margem negativa no último período fechado.
+        
+        Leitura indexada das métricas calculadas no fechamento,
+        ordenada pelos meses seguidos de prejuízo.
+        """
+        ultimo_periodo = PeriodoFinanceiro.objects.filter(
+            fechado=True
+        ).order_by('-ano', '-mes').first()
+        
+        if not ultimo_periodo:
+            return []
+        
+        metricas = ContratoSnapshotMetrica.objects.filter(
+            competencia=ultimo_periodo.competencia,
+            meses_prejuizo_consecutivos__gt=0
+        ).select_related('contrato__cliente').order_by(
+            '-meses_prejuizo_consecutivos', 'media_margem_3m'
+        )[:limit]
+        
+        return [{
+            'contrato': m.contrato,
+            'cliente': m.contrato.cliente.nome,
+            'meses_prejuizo': m.meses_prejuizo_consecutivos,
+            'media_margem_3m': m.media_margem_3m,
+            'media_margem_12m': m.media_margem_12m,
+            'tendencia_margem': m.tendencia_margem,
+        } for m in metricas]
+    
     # ========================================
     # 3️⃣ VENCIMENTOS (PRÓXIMOS 30 DIAS)
     # ========================================
@@ -299,282 +329,90 @@ class DashboardService:
         Retorna todos os custos que vencem nos próximos X dias.
         
         Exibe item por item (não agrupa).
-        Ordenado por data de vencimento.
-        """
-        data_limite = self.hoje + timedelta(days=dias)
-        
-        vencimentos = []
-        
-        # Domínios
-        dominios = DomainCost.objects.filter(
-            vencimento__gte=self.hoje,
-            vencimento__lte=data_limite,
-            ativo=True
-        ).select_related('domain').order_by('vencimento')
-        
-        for custo in dominios:
-            dias_restantes = (custo.vencimento - self.hoje).days
-            vencimentos.append({
-                'tipo': 'Domínio',
-                'nome': custo.domain.nome,
-                'fornecedor': custo.domain.fornecedor,
-                'valor': custo.valor_total,
-                'vencimento': custo.vencimento,
-                'dias_restantes': dias_restantes,
-                'urgencia': self._calcular_urgencia(dias_restantes)
-            })
-        
-        # VPS
-        vps_costs = VPSCost.objects.filter(
-            vencimento__gte=self.hoje,
-            vencimento__lte=data_limite,
-            ativo=True
-        ).select_related('vps').order_by('vencimento')
-        
-        for custo in vps_costs:
-            dias_restantes = (custo.vencimento - self.hoje).days
-            vencimentos.append({
-                'tipo': 'VPS',
-                'nome': custo.vps.nome,
-                'fornecedor': custo.vps.fornecedor,
-                'valor': custo.valor_total,
-                'vencimento': custo.vencimento,
-                'dias_restantes': dias_restantes,
-                'urgencia': self._calcular_urgencia(dias_restantes)
-            })
-        
-        # Hostings
-        hostings = HostingCost.objects.filter(
-            vencimento__gte=self.hoje,
-            vencimento__lte=data_limite,
-            ativo=True
-        ).select_related('hosting').order_by('vencimento')
-        
-        for custo in hostings:
-            dias_restantes = (custo.vencimento - self.hoje).days
-            vencimentos.append({
-                'tipo': 'Hosting',
-                'nome': custo.hosting.nome,
-                'fornecedor': custo.hosting.fornecedor,
-                'valor': custo.valor_total,
-                'vencimento': custo.vencimento,
-                'dias_restantes': dias_restantes,
-                'urgencia': self._calcular_urgencia(dias_restantes)
-            })
-        
-        # Emails
-        emails = DomainEmailCost.objects.filter(
-            vencimento__gte=self.hoje,
-            vencimento__lte=data_limite,
-            ativo=True
-        ).select_related('email__dominio').order_by('vencimento')
-        
-        for custo in emails:
-            dias_restantes = (custo.vencimento - self.hoje).days
-            vencimentos.append({
-                'tipo': 'Email',
-                'nome': f"Email {custo.email.dominio.nome}",
-                'fornecedor': custo.email.fornecedor,
-                'valor': custo.valor_total,
-                'vencimento': custo.vencimento,
-                'dias_restantes': dias_restantes,
-                'urgencia': self._calcular_urgencia(dias_restantes)
-            })
-        
-        # Backups
-        backups = VPSBackupCost.objects.filter(
-            vencimento__gte=self.hoje,
-            vencimento__lte=data_limite,
-            ativo=True
-        ).select_related('backup__vps').order_by('vencimento')
-        
-        for custo in backups:
-            dias_restantes = (custo.vencimento - self.hoje).days
-            vencimentos.append({
-                'tipo': 'Backup',
-                'nome': f"{custo.backup.nome} ({custo.backup.vps.nome})",
-                'fornecedor': custo.backup.fornecedor or custo.backup.vps.fornecedor,
-                'valor': custo.valor_total,
-                'vencimento': custo.vencimento,
-                'dias_restantes': dias_restantes,
-                'urgencia': self._calcular_urgencia(dias_restantes)
-            })
-        
-        # Ordenar por vencimento (mais próximo primeiro)
-        vencimentos.sort(key=lambda x: x['vencimento'])
-        
-        return vencimentos
-    
-    def _calcular_urgencia(self, dias_restantes):
-        """Define nível de urgência baseado em dias restantes."""
-        if dias_restantes <= 0:
-            return {'nivel': 'vencido', 'cor': '#8b0000', 'texto': 'VENCIDO'}
-        elif dias_restantes <= 7:
-            return {'nivel': 'alta', 'cor': '#dc3545', 'texto': 'URGENTE'}
-        elif dias_restantes <= 15:
-            return {'nivel': 'media', 'cor': '#ffc107', 'texto': 'Atenção'}
-        else:
-            return {'nivel': 'baixa', 'cor': '#28a745', 'texto': 'Normal'}
+        Ordenado por data de vencimento (uma única query no livro de custos).
+        """
+        return vencimentos_entre(self.hoje, self.hoje + timedelta(days=dias), hoje=self.hoje)
     
     def get_vencimentos_incluindo_vencidos(self, dias_futuro=30, dias_passado=30):
         """
         Retorna vencimentos incluindo itens já vencidos.
         
+        Ordenação: vencidos primeiro (mais antigos), depois próximos (mais próximos).
+        
         Args:
             dias_futuro: Quantos dias no futuro buscar
             dias_passado: Quantos dias no passado buscar (vencidos)
         """
-        data_inicio = self.hoje - timedelta(days=dias_passado)
-        data_limite = self.hoje + timedelta(days=dias_futuro)
-        
-        vencimentos = []
-        
-        # Domínios
-        dominios = DomainCost.objects.filter(
-            vencimento__gte=data_inicio,
-            vencimento__lte=data_limite,
-            ativo=True
-        ).select_related('domain').order_by('vencimento')
-        
-        for custo in dominios:
-            dias_restantes = (custo.vencimento - self.hoje).days
-            vencimentos.append({
-                'tipo': 'Domínio',
-                'nome': custo.domain.nome,
-                'fornecedor': custo.domain.fornecedor,
-                'valor': custo.valor_total,
-                'vencimento': custo.vencimento,
-                'dias_restantes': dias_restantes,
-                'urgencia': self._calcular_urgencia(dias_restantes),
-                'vencido': dias_restantes < 0
-            })
-        
-        # VPS
-        vps_costs = VPSCost.objects.filter(
-            vencimento__gte=data_inicio,
-            vencimento__lte=data_limite,
-            ativo=True
-        ).select_related('vps').order_by('vencimento')
-        
-        for custo in vps_costs:
-            dias_restantes = (custo.vencimento - self.hoje).days
-            vencimentos.append({
-                'tipo': 'VPS',
-                'nome': custo.vps.nome,
-                'fornecedor': custo.vps.fornecedor,
-                'valor': custo.valor_total,
-                'vencimento': custo.vencimento,
-                'dias_restantes': dias_restantes,
-                'urgencia': self._calcular_urgencia(dias_restantes),
-                'vencido': dias_restantes < 0
-            })
-        
-        # Hostings
-        hostings = HostingCost.objects.filter(
-            vencimento__gte=data_inicio,
-            vencimento__lte=data_limite,
-            ativo=True
-        ).select_related('hosting').order_by('vencimento')
-        
-        for custo in hostings:
-            dias_restantes = (custo.vencimento - self.hoje).days
-            vencimentos.append({
-                'tipo': 'Hosting',
-                'nome': custo.hosting.nome,
-                'fornecedor': custo.hosting.fornecedor,
-                'valor': custo.valor_total,
-                'vencimento': custo.vencimento,
-                'dias_restantes': dias_restantes,
-                'urgencia': self._calcular_urgencia(dias_restantes),
-                'vencido': dias_restantes < 0
-            })
-        
-        # Emails
-        emails = DomainEmailCost.objects.filter(
-            vencimento__gte=data_inicio,
-            vencimento__lte=data_limite,
-            ativo=True
-        ).select_related('email__dominio').order_by('vencimento')
-        
-        for custo in emails:
-            dias_restantes = (custo.vencimento - self.hoje).days
-            vencimentos.append({
-                'tipo': 'Email',
-                'nome': f"Email {custo.email.dominio.nome}",
-                'fornecedor': custo.email.fornecedor,
-                'valor': custo.valor_total,
-                'vencimento': custo.vencimento,
-                'dias_restantes': dias_restantes,
-                'urgencia': self._calcular_urgencia(dias_restantes),
-                'vencido': dias_restantes < 0
-            })
-        
-        # Backups
-        backups = VPSBackupCost.objects.filter(
-            vencimento__gte=data_inicio,
-            vencimento__lte=data_limite,
-            ativo=True
-        ).select_related('backup__vps').order_by('vencimento')
-        
-        for custo in backups:
-            dias_restantes = (custo.vencimento - self.hoje).days
-            vencimentos.append({
-                'tipo': 'Backup',
-                'nome': f"{custo.backup.nome} ({custo.backup.vps.nome})",
-                'fornecedor': custo.backup.fornecedor or custo.backup.vps.fornecedor,
-                'valor': custo.valor_total,
-                'vencimento': custo.vencimento,
-                'dias_restantes': dias_restantes,
-                'urgencia': self._calcular_urgencia(dias_restantes),
-                'vencido': dias_restantes < 0
-            })
-        
-        # Ordenar: vencidos primeiro (mais antigos), depois próximos (mais próximos)
-        vencimentos.sort(key=lambda x: (not x['vencido'], x['vencimento']))
-        
-        return vencimentos
+        return vencimentos_entre(
+            self.hoje - timedelta(days=dias_passado),
+            self.hoje + timedelta(days=dias_futuro),
+            hoje=self.hoje,
+        )
     
-    def get_status_invoices(self):
+    def get_status_invoices(self, pagina=1, por_pagina=INVOICES_POR_PAGINA):
         """
         Retorna status dos invoices do mês atual e meses anteriores em atraso.
+        
+        Totais por status vêm de uma agregação condicional; as listas são
+        paginadas no servidor (no máximo INVOICES_POR_PAGINA_MAX por página),
+        a mesma página valendo para as duas listas.
         """
         mes_atual = self.hoje.month
         ano_atual = self.hoje.year
+        por_pagina = max(1, min(int(por_pagina), INVOICES_POR_PAGINA_MAX))
         
         # Invoices do mês atual
         invoices_mes_atual = Invoice.objects.filter(
             mes_referencia=mes_atual,
             ano_referencia=ano_atual
-        ).select_related('cliente').order_by('status', 'vencimento')
+        ).select_related('cliente').order_by('status', 'vencimento', 'id')
         
         # Invoices em atraso (meses anteriores não pagos)
         invoices_atrasados = Invoice.objects.filter(
             Q(ano_referencia__lt=ano_atual) | 
             Q(ano_referencia=ano_atual, mes_referencia__lt=mes_atual),
             status__in=['pendente', 'atrasado']
-        ).select_related('cliente').order_by('ano_referencia', 'mes_referencia')
+        ).select_related('cliente').order_by('ano_referencia', 'mes_referencia', 'id')
+        
+        # Totais mês atual (uma query)
+        totais_mes = invoices_mes_atual.order_by().aggregate(
+            total=Sum('valor_total'),
+            pago=Sum('valor_total', filter=Q(status='pago')),
+            pendente=Sum('valor_total', filter=Q(status='pendente')),
+            atrasado=Sum('valor_total', filter=Q(status='atrasado')),
+            qtd_total=Count('id'),
+            qtd_pagos=Count('id', filter=Q(status='pago')),
+            qtd_pendentes=Count('id', filter=Q(status='pendente')),
+            qtd_atrasados=Count('id', filter=Q(status='atrasado')),
+        )
         
-        # Calcular totais mês atual
-        total_mes_atual = invoices_mes_atual.aggregate(Sum('valor_total'))['valor_total__sum'] or Decimal('0.00')
-        pagos_mes_atual = invoices_mes_atual.filter(status='pago').aggregate(Sum('valor_total'))['valor_total__sum'] or Decimal('0.00')
-        pendentes_mes_atual = invoices_mes_atual.filter(status='pendente').aggregate(Sum('valor_total'))['valor_total__sum'] or Decimal('0.00')
-        atrasados_mes_atual = invoices_mes_atual.filter(status='atrasado').aggregate(Sum('valor_total'))['valor_total__sum'] or Decimal('0.00')
+        # Totais atrasados (uma query)
+        totais_atrasados = invoices_atrasados.order_by().aggregate(
+            total=Sum('valor_total'),
+            qtd=Count('id'),
+        )
         
-        # Calcular totais atrasados
-        total_atrasados = invoices_atrasados.aggregate(Sum('valor_total'))['valor_total__sum'] or Decimal('0.00')
+        total_paginas = max(
+            1,
+            ceil(totais_mes['qtd_total'] / por_pagina),
+            ceil(totais_atrasados['qtd'] / por_pagina),
+        )
+        pagina = max(1, min(int(pagina), total_paginas))
+        inicio = (pagina - 1) * por_pagina
+        fim = inicio + por_pagina
         
         return {
             'mes_atual': {
                 'mes': mes_atual,
                 'ano': ano_atual,
-                'total': total_mes_atual,
-                'pago': pagos_mes_atual,
-                'pendente': pendentes_mes_atual,
-                'atrasado': atrasados_mes_atual,
-                'qtd_total': invoices_mes_atual.count(),
-                'qtd_pagos': invoices_mes_atual.filter(status='pago').count(),
-                'qtd_pendentes': invoices_mes_atual.filter(status='pendente').count(),
-                'qtd_atrasados': invoices_mes_atual.filter(status='atrasado').count(),
+                'total': totais_mes['total'] or Decimal('0.00'),
+                'pago': totais_mes['pago'] or Decimal('0.00'),
+                'pendente': totais_mes['pendente'] or Decimal('0.00'),
+                'atrasado': totais_mes['atrasado'] or Decimal('0.00'),
+                'qtd_total': totais_mes['qtd_total'],
+                'qtd_pagos': totais_mes['qtd_pagos'],
+                'qtd_pendentes': totais_mes['qtd_pendentes'],
+                'qtd_atrasados': totais_mes['qtd_atrasados'],
                 'invoices': [{
                     'id': inv.id,
                     'cliente': inv.cliente.nome,
@@ -582,11 +420,11 @@ class DashboardService:
                     'status': inv.status,
                     'vencimento': inv.vencimento,
                     'dias_vencimento': (inv.vencimento - self.hoje).days if inv.vencimento else None
-                } for inv in invoices_mes_atual]
+                } for inv in invoices_mes_atual[inicio:fim]]
             },
             'atrasados': {
-                'total': total_atrasados,
-                'qtd': invoices_atrasados.count(),
+                'total': totais_atrasados['total'] or Decimal('0.00'),
+                'qtd': totais_atrasados['qtd'],
                 'invoices': [{
                     'id': inv.id,
                     'cliente': inv.cliente.nome,
@@ -595,7 +433,14 @@ class DashboardService:
                     'status': inv.status,
                     'vencimento': inv.vencimento,
                     'dias_atraso': (self.hoje - inv.vencimento).days if inv.vencimento else 0
-                } for inv in invoices_atrasados]
+                } for inv in invoices_atrasados[inicio:fim]]
+            },
+            'paginacao': {
+                'pagina': pagina,
+                'por_pagina': por_pagina,
+                'total_paginas': total_paginas,
+                'tem_anterior': pagina > 1,
+                'tem_proxima': pagina < total_paginas,
             }
         }
     
@@ -662,84 +507,119 @@ class DashboardService:
         
         return categorias
 
-    def get_alertas_anomalia(self):
+    def get_custos_por_recurso(self, limit=10):
         """
-        Retorna alertas para possiveis anomalias operacionais.
+        Retorna os recursos mais caros do último período fechado.
+        
+        Fonte: ContratoSnapshotItem (sem ler o JSON de detalhamento).
         """
-        mes_atual = self.hoje.month
-        ano_atual = self.hoje.year
+        ultimo_periodo = PeriodoFinanceiro.objects.filter(
+            fechado=True
+        ).order_by('-ano', '-mes').first()
+        
+        if not ultimo_periodo:
+            return []
+        
+        rotulos = dict(ContratoSnapshotItem.CATEGORIA_CHOICES)
+        return [
+            {**recurso, 'categoria_display': rotulos.get(recurso['categoria'], recurso['categoria'])}
+            for recurso in custos_por_recurso(ultimo_periodo.competencia, limit=limit)
+        ]
 
-        alertas = []
+    def get_alertas_anomalia(self):
+        """
+        Retorna alertas para possiveis anomalias operacionais e financeiras.
 
-        invoices_sem_checkout = Invoice.objects.filter(
-            mes_referencia=mes_atual,
-            ano_referencia=ano_atual,
-            status__in=['pendente', 'atrasado']
-        ).filter(
-            Q(checkout_url='') | Q(checkout_url__isnull=True)
-        ).count()
-        if invoices_sem_checkout:
-            alertas.append({
-                'titulo': 'Invoices sem checkout',
-                'descricao': f'{invoices_sem_checkout} invoice(s) pendente/atrasado sem link de checkout.',
-                'nivel': 'alto',
-                'cor': '#dc3545',
-            })
+        Checagens de higiene: uma agregação condicional por tabela.
+        Anomalias de snapshot: gravadas no fechamento (ContratoAnomalia),
+        apenas lidas aqui.
+        """
+        pendentes = Q(status__in=['pendente', 'atrasado'])
+        higiene_invoices = Invoice.objects.filter(
+            mes_referencia=self.hoje.month,
+            ano_referencia=self.hoje.year,
+        ).aggregate(
+            sem_checkout=Count(
+                'id',
+                filter=pendentes & (Q(checkout_url='') | Q(checkout_url__isnull=True))
+            ),
+            sem_vinculo=Count(
+                'id',
+                filter=~Exists(InvoiceContrato.objects.filter(invoice=OuterRef('pk')))
+            ),
+            sem_telefone=Count(
+                'id',
+                filter=pendentes & (Q(cliente__telefone__isnull=True) | Q(cliente__telefone=''))
+            ),
+        )
+        higiene_mensagens = MessageQueue.objects.filter(status='pendente').aggregate(
+            atrasadas=Count(
+                'id',
+                filter=Q(agendado_para__lt=timezone.now() - timedelta(hours=12))
+            ),
+            sem_checkout=Count(
+                'id',
+                filter=Q(tipo__in=['5_dias', '2_dias', 'no_dia', 'atraso']) & (
+                    Q(invoice__checkout_url__isnull=True) | Q(invoice__checkout_url='')
+                )
+            ),
+        )
 
-        invoices_sem_vinculo = Invoice.objects.filter(
-            mes_referencia=mes_atual,
-            ano_referencia=ano_atual,
-            itens_contrato__isnull=True
-        ).count()
-        if invoices_sem_vinculo:
-            alertas.append({
-                'titulo': 'Invoices sem vínculo',
-                'descricao': f'{invoices_sem_vinculo} invoice(s) do mês sem vínculo de contrato.',
-                'nivel': 'medio',
-                'cor': '#ffc107',
-            })
+        checagens = [
+            (higiene_invoices['sem_checkout'], 'Invoices sem checkout',
+             '{} invoice(s) pendente/atrasado sem link de checkout.', 'alto'),
+            (higiene_invoices['sem_vinculo'], 'Invoices sem vínculo',
+             '{} invoice(s) do mês sem vínculo de contrato.', 'medio'),
+            (higiene_invoices['sem_telefone'], 'Clientes sem telefone',
+             '{} invoice(s) sem telefone para envio.', 'medio'),
+            (higiene_mensagens['atrasadas'], 'Fila de mensagens atrasada',
+             '{} mensagem(ns) pendente(s) ha mais de 12h.', 'alto'),
+            (higiene_mensagens['sem_checkout'], 'Mensagens sem checkout',
+             '{} mensagem(ns) pendente(s) sem checkout vinculado.', 'alto'),
+        ]
+        alertas = [
+            {
+                'titulo': titulo,
+                'descricao': descricao.format(quantidade),
+                'nivel': nivel,
+                'cor': CORES_NIVEL_ALERTA[nivel],
+            }
+            for quantidade, titulo, descricao, nivel in checagens
+            if quantidade
+        ]
 
-        invoices_sem_telefone = Invoice.objects.filter(
-            mes_referencia=mes_atual,
-            ano_referencia=ano_atual,
-            status__in=['pendente', 'atrasado']
-        ).filter(
-            Q(cliente__telefone__isnull=True) | Q(cliente__telefone='')
-        ).count()
-        if invoices_sem_telefone:
-            alertas.append({
-                'titulo': 'Clientes sem telefone',
-                'descricao': f'{invoices_sem_telefone} invoice(s) sem telefone para envio.',
-                'nivel': 'medio',
-                'cor': '#ffc107',
-            })
+        alertas.extend(self.get_anomalias_snapshots())
+        return alertas
 
-        mensagens_pendentes = MessageQueue.objects.filter(
-            status='pendente',
-            agendado_para__lt=timezone.now() - timedelta(hours=12)
-        ).count()
-        if mensagens_pendentes:
-            alertas.append({
-                'titulo': 'Fila de mensagens atrasada',
-                'descricao': f'{mensagens_pendentes} mensagem(ns) pendente(s) ha mais de 12h.',
-                'nivel': 'alto',
-                'cor': '#dc3545',
-            })
+    def get_anomalias_snapshots(self, limite=10):
+        """
+        Anomalias da competência fechada mais recente, maiores primeiro.
+        """
+        ultima_competencia = ContratoAnomalia.objects.order_by('-competencia').values('competencia')[:1]
+        anomalias = ContratoAnomalia.objects.filter(
+            competencia=Subquery(ultima_competencia)
+        ).select_related('contrato__cliente').order_by(Abs('score').desc())[:limite]
 
-        mensagens_sem_checkout = MessageQueue.objects.filter(
-            status='pendente',
-            tipo__in=['5_dias', '2_dias', 'no_dia', 'atraso']
-        ).filter(
-            Q(invoice__checkout_url__isnull=True) | Q(invoice__checkout_url='')
-        ).count()
-        if mensagens_sem_checkout:
+        alertas = []
+        for anomalia in anomalias:
+            if anomalia.tipo == 'zscore':
+                descricao = (
+                    f'{anomalia.get_metrica_display()}: R$ {anomalia.valor} contra média de '
+                    f'R$ {anomalia.referencia} ({anomalia.score} desvios) em {anomalia.competencia:%m/%Y}.'
+                )
+                nivel = 'alto' if abs(anomalia.score) >= 5 else 'medio'
+            else:
+                descricao = (
+                    f'{anomalia.get_metrica_display()}: R$ {anomalia.referencia} para '
+                    f'R$ {anomalia.valor} ({anomalia.score:+}%) em {anomalia.competencia:%m/%Y}.'
+                )
+                nivel = 'alto' if abs(anomalia.score) >= 100 else 'medio'
             alertas.append({
-                'titulo': 'Mensagens sem checkout',
-                'descricao': f'{mensagens_sem_checkout} mensagem(ns) pendente(s) sem checkout vinculado.',
-                'nivel': 'alto',
-                'cor': '#dc3545',
+                'titulo': f'Anomalia: {anomalia.contrato}',
+                'descricao': descricao,
+                'nivel': nivel,
+                'cor': CORES_NIVEL_ALERTA[nivel],
             })
-
         return alertas
 
     def get_receita_mes_atual_chart_data(self):
@@ -843,17 +723,28 @@ class DashboardService:
         Retorna evolução de receita, custo e margem dos últimos X meses.
         Útil para gráficos.
         """
-        periodos = PeriodoFinanceiro.objects.filter(
+        periodos = list(PeriodoFinanceiro.objects.filter(
             fechado=True
-        ).order_by('-ano', '-mes')[:meses]
+        ).order_by('-ano', '-mes')[:meses])
+        
+        # Totais de todos os períodos em uma única query agrupada por competência
+        totais = {
+            t['competencia']: t
+            for t in ContratoSnapshot.objects.filter(
+                competencia__in=[p.competencia for p in periodos]
+            ).order_by().values('competencia').annotate(
+                receita=Sum('receita'),
+                custo=Sum('custo_total'),
+            )
+        }
         
         resultado = []
         
         for periodo in reversed(periodos):
-            snapshots = ContratoSnapshot.objects.filter(periodo=periodo)
+            total = totais.get(periodo.competencia, {})
             
-            receita = snapshots.aggregate(Sum('receita'))['receita__sum'] or Decimal('0.00')
-            custo = snapshots.aggregate(Sum('custo_total'))['custo_total__sum'] or Decimal('0.00')
+            receita = total.get('receita') or Decimal('0.00')
+            custo = total.get('custo') or Decimal('0.00')
             margem = receita - custo
             margem_pct = (margem / receita * 100) if receita > 0 else Decimal('0.00')
             
@@ -0,0 +1,155 @@
+"""
+Caixa de saída de emails (EmailPendente).
+
+A geração de um email (renderização do template) é separada do envio:
+quem gera apenas enfileira; a task de envio esvazia a fila abrindo uma
+única conexão SMTP para todo o lote. Emails com falha ficam com status
+'erro' e voltam a ser tentados até MAX_TENTATIVAS. Durante o envio o
+email fica 'enviando'; reservas expiradas voltam à fila.
+"""
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.template.loader import get_template
+from django.utils import timezone
+
+from infra.financeiro.models import EmailPendente
+
+MAX_TENTATIVAS = 5
+LOTE_ENVIO = 50
+# Reserva mais antiga que isso é de um worker que caiu no meio do lote
+RESERVA_EXPIRA = timedelta(minutes=15)
+
+
+@lru_cache(maxsize=None)
+def _template(nome: str):
+    """Template compilado uma única vez por processo."""
+    return get_template(nome)
+
+
+def enfileirar_email(assunto: str, template_html: str, template_texto: str,
+                     contexto: dict, destinatarios: list) -> EmailPendente:
+    """
+    Renderiza os templates e grava o email na caixa de saída.
+
+    Args:
+        assunto: Assunto do email
+        template_html: Template do corpo HTML
+        template_texto: Template da versão em texto puro
+        contexto: Contexto dos dois templates
+        destinatarios: Lista de endereços
+    """
+    return EmailPendente.objects.create(
+        assunto=assunto[:255],
+        corpo_texto=_template(template_texto).render(contexto),
+        corpo_html=_template(template_html).render(contexto),
+        destinatarios=list(destinatarios),
+    )
+
+
+def _montar_mensagem(email: EmailPendente, conexao) -> EmailMultiAlternatives:
+    mensagem = EmailMultiAlternatives(
+        subject=email.assunto,
+        body=email.corpo_texto,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=email.destinatarios,
+        connection=conexao,
+    )
+    if email.corpo_html:
+        mensagem.attach_alternative(email.corpo_html, 'text/html')
+    return mensagem
+
+
+def recuperar_travados(agora=None) -> int:
+    """
+    Devolve à fila ('erro') os emails presos em 'enviando' há mais de
+    RESERVA_EXPIRA (worker encerrado no meio do lote).
+
+    O email pode ter sido entregue antes da queda; reenviar é preferível
+    a perdê-lo.
+
+    Returns:
+        int: Quantidade de emails recuperados
+    """
+    agora = agora or timezone.now()
+    return EmailPendente.objects.filter(
+        status='enviando',
+        reservado_em__lt=agora - RESERVA_EXPIRA,
+    ).update(status='erro', ultimo_erro='Envio interrompido antes de registrar o resultado')
+
+
+def _reservar_lote(limite: int, agora) -> list:
+    """
+    Marca o lote como 'enviando' numa transação curta.
+
+    skip_locked garante que dois workers simultâneos nunca reservem o mesmo
+    email; após o commit, a reserva é o próprio status.
+    """
+    with transaction.atomic():
+        ids = list(
+            EmailPendente.objects.select_for_update(skip_locked=True).filter(
+                Q(status='pendente') | Q(status='erro', tentativas__lt=MAX_TENTATIVAS)
+            ).order_by('criado_em').values_list('pk', flat=True)[:limite]
+        )
+        EmailPendente.objects.filter(pk__in=ids).update(
+            status='enviando',
+            tentativas=F('tentativas') + 1,
+            reservado_em=agora,
+        )
+    return list(EmailPendente.objects.filter(pk__in=ids).order_by('criado_em'))
+
+
+def enviar_pendentes(limite: int = LOTE_ENVIO) -> dict:
+    """
+    Envia os emails pendentes por uma única conexão SMTP.
+
+    O lote é reservado (status 'enviando') e o envio acontece fora de
+    transação, gravando o resultado de cada email logo após o envio: uma
+    queda no meio do lote não faz os já entregues voltarem à fila. Falha
+    ao abrir a conexão devolve o lote sem contar a tentativa e é propagada,
+    para a task tentar de novo.
+
+    Returns:
+        dict: {'enviados': int, 'erros': int}
+    """
+    resultado = {'enviados': 0, 'erros': 0}
+
+    recuperar_travados()
+    emails = _reservar_lote(limite, timezone.now())
+    if not emails:
+        return resultado
+
+    try:
+        conexao = get_connection(fail_silently=False)
+        conexao.open()
+    except Exception as exc:
+        EmailPendente.objects.filter(pk__in=[email.pk for email in emails]).update(
+            status='erro',
+            tentativas=F('tentativas') - 1,
+            ultimo_erro=str(exc)[:1000],
+        )
+        raise
+
+    with conexao:
+        for email in emails:
+            try:
+                _montar_mensagem(email, conexao).send()
+            except Exception as exc:
+                EmailPendente.objects.filter(pk=email.pk).update(
+                    status='erro',
+                    ultimo_erro=str(exc)[:1000],
+                )
+                resultado['erros'] += 1
+            else:
+                EmailPendente.objects.filter(pk=email.pk).update(
+                    status='enviado',
+                    ultimo_erro='',
+                    enviado_em=timezone.now(),
+                )
+                resultado['enviados'] += 1
+
+    return resultado
@@ -5,16 +5,19 @@ Responsável por:
 - Calcular custos ativos no período
 - Fazer rateio proporcional por contrato
 - Gerar snapshots imutáveis
+- Calcular métricas móveis de rentabilidade
 - Marcar período como fechado
 """
 from decimal import Decimal
-from datetime import date
+from datetime import date, timedelta
 from django.db import transaction, models
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from collections import defaultdict
 
-from infra.financeiro.models import PeriodoFinanceiro, ContratoSnapshot, DespesaAdicional
+from infra.financeiro.models import (
+    PeriodoFinanceiro, ContratoSnapshot, ContratoSnapshotItem, DespesaAdicional
+)
 from contratos.models import Contrato
 from invoices.models import InvoiceContrato
 from infra.dominios.models import DomainCost
@@ -23,6 +26,8 @@ from infra.vps.models import VPSCost
 from infra.backups.models import VPSBackupCost
 from infra.emails.models import DomainEmailCost
 from .rateio import calcular_custo_mensal, ratear_por_contratos, validar_periodo
+from .metricas import calcular_metricas_periodo
+from .anomalias import detectar_anomalias_periodo
 
 
 def fechar_periodo(periodo_id: int, usuario: str) -> dict:
@@ -44,37 +49,8 @@ def fechar_periodo(periodo_id: int, usuario: str) -> dict:
         periodo = PeriodoFinanceiro.objects.select_for_update().get(id=periodo_id)
         validar_periodo(periodo)
         
-        # 2. Calcular datas do período
-        primeiro_dia = date(periodo.ano, periodo.mes, 1)
-        if periodo.mes == 12:
-            ultimo_dia = date(periodo.ano + 1, 1, 1)
-        else:
-            ultimo_dia = date(periodo.ano, periodo.mes + 1, 1)
-        
-        # 3. Buscar contratos ativos no período
-        contratos_ativos = Contrato.objects.filter(
-            data_inicio__lt=ultimo_dia
-        ).filter(
-            models.Q(data_fim__isnull=True) | models.Q(data_fim__gte=primeiro_dia)
-        ).select_related('cliente').prefetch_related(
-            'dominios', 'hostings', 'vps_list'
-        )
-        
-        if not contratos_ativos.exists():
-            raise ValidationError(
-                f"Nenhum contrato ativo encontrado para o período {periodo}"
-            )
-        
-        # 4. Coletar todos os custos ativos no período
-        custos_por_tipo = _coletar_custos_periodo(primeiro_dia, ultimo_dia)
-        
-        # 5. Calcular rateio por contrato
-        rateios_por_contrato = _calcular_rateios(
-            contratos_ativos,
-            custos_por_tipo,
-            primeiro_dia,
-            ultimo_dia
-        )
+        # 2-5. Contratos ativos, custos do período e rateio por contrato
+        contratos_ativos, rateios_por_contrato = _calcular_rateios_periodo(periodo)
         
         # 6. Criar snapshots
         snapshots_criados = []
@@ -86,6 +62,15 @@ def fechar_periodo(periodo_id: int, usuario: str) -> dict:
             )
             snapshots_criados.append(snapshot)
         
+        # 6.1 Gravar itens normalizados do detalhamento em lote
+        _criar_itens_snapshot(snapshots_criados, rateios_por_contrato)
+        
+        # 6.2 Calcular métricas móveis (3/6/12 meses) sobre o histórico
+        calcular_metricas_periodo(periodo)
+        
+        # 6.3 Detectar anomalias contra o histórico de cada contrato
+        detectar_anomalias_periodo(periodo)
+        
         # 7. Marcar período como fechado
         periodo.fechado = True
         periodo.fechado_em = timezone.now()
@@ -102,6 +87,68 @@ def fechar_periodo(periodo_id: int, usuario: str) -> dict:
         }
 
 
+def recalcular_periodo(periodo: PeriodoFinanceiro) -> dict:
+    """
+    Recalcula os valores de snapshot de um período sem gravar nada.
+    
+    Usa as mesmas regras do fechamento; serve para auditar períodos fechados.
+    
+    Returns:
+        dict: {contrato_id: valores do snapshot (receita, custos, margem, detalhamento)}
+    """
+    contratos_ativos, rateios_por_contrato = _calcular_rateios_periodo(periodo)
+    return {
+        contrato.id: _calcular_valores_snapshot(contrato, rateios_por_contrato[contrato.id])
+        for contrato in contratos_ativos
+    }
+
+
+def _limites_periodo(periodo: PeriodoFinanceiro) -> tuple:
+    """Retorna (primeiro dia do mês, primeiro dia do mês seguinte)."""
+    primeiro_dia = date(periodo.ano, periodo.mes, 1)
+    if periodo.mes == 12:
+        ultimo_dia = date(periodo.ano + 1, 1, 1)
+    else:
+        ultimo_dia = date(periodo.ano, periodo.mes + 1, 1)
+    return primeiro_dia, ultimo_dia
+
+
+def _calcular_rateios_periodo(periodo: PeriodoFinanceiro) -> tuple:
+    """
+    Busca contratos ativos e custos do período e calcula o rateio.
+    
+    Returns:
+        tuple: (lista de contratos ativos, rateios por contrato)
+    
+    Raises:
+        ValidationError: Se não houver contrato ativo no período
+    """
+    primeiro_dia, ultimo_dia = _limites_periodo(periodo)
+    
+    contratos_ativos = list(Contrato.objects.filter(
+        data_inicio__lt=ultimo_dia
+    ).filter(
+        models.Q(data_fim__isnull=True) | models.Q(data_fim__gte=primeiro_dia)
+    ).select_related('cliente').prefetch_related(
+        'dominios', 'hostings', 'vps_list'
+    ))
+    
+    if not contratos_ativos:
+        raise ValidationError(
+            f"Nenhum contrato ativo encontrado para o período {periodo}"
+        )
+    
+    custos_por_tipo = _coletar_custos_periodo(primeiro_dia, ultimo_dia)
+    
+    rateios_por_contrato = _calcular_rateios(
+        contratos_ativos,
+        custos_por_tipo,
+        primeiro_dia,
+        ultimo_dia
+    )
+    return contratos_ativos, rateios_por_contrato
+
+
 def _coletar_custos_periodo(primeiro_dia: date, ultimo_dia: date) -> dict:
     """
     Coleta todos os custos de infraestrutura ativos no período.
@@ -115,43 +162,38 @@ def _coletar_custos_periodo(primeiro_dia: date, ultimo_dia: date) -> dict:
             'emails': QuerySet
         }
     """
-    filtro_periodo = {
-        'data_inicio__lt': ultimo_dia,
-        'ativo': True,
-    }
-    
-    # Custos que não têm data_fim OU têm data_fim >= primeiro_dia
+    # Vigência cruzando o mês (data_fim inclusiva)
+    ultimo_dia_mes = ultimo_dia - timedelta(days=1)
     
     return {
-        'dominios': DomainCost.objects.filter(
-            **filtro_periodo
-        ).filter(
-            models.Q(data_fim__isnull=True) | models.Q(data_fim__gte=primeiro_dia)
-        ).select_related('domain'),
-        
-        'hostings': HostingCost.objects.filter(
-            **filtro_periodo
-        ).filter(
-            models.Q(data_fim__isnull=True) | models.Q(data_fim__gte=primeiro_dia)
-        ).select_related('hosting'),
-        
-        'vps': VPSCost.objects.filter(
-            **filtro_periodo
-        ).filter(
-            models.Q(data_fim__isnull=True) | models.Q(data_fim__gte=primeiro_dia)
-        ).select_related('vps'),
-        
-        'backups': VPSBackupCost.objects.filter(
-            **filtro_periodo
-        ).filter(
-            models.Q(data_fim__isnull=True) | models.Q(data_fim__gte=primeiro_dia)
-        ).select_related('backup__vps'),
-        
-        'emails': DomainEmailCost.objects.filter(
-            **filtro_periodo
-        ).filter(
-            models.Q(data_fim__isnull=True) | models.Q(data_fim__gte=primeiro_dia)
-        ).select_related('email__dominio'),
+        'dominios': DomainCost.objects.vigentes(primeiro_dia, ultimo_dia_mes).select_related('domain'),
+        'hostings': HostingCost.objects.vigentes(primeiro_dia, ultimo_dia_mes).select_related('hosting'),
+        'vps': VPSCost.objects.vigentes(primeiro_dia, ultimo_dia_mes).select_related('vps'),
+        'backups': VPSBackupCost.objects.vigentes(primeiro_dia, ultimo_dia_mes).select_related('backup__vps'),
+        'emails': DomainEmailCost.objects.vigentes(primeiro_dia, ultimo_dia_mes).select_related('email__dominio'),
+    }
+
+
+def _novo_rateio() -> dict:
+    """Acumulador vazio do rateio de um contrato."""
+    return {
+        'receita': Decimal('0.00'),
+        'custo_dominios': Decimal('0.00'),
+        'custo_hostings': Decimal('0.00'),
+        'custo_vps': Decimal('0.00'),
+        'custo_backups': Decimal('0.00'),
+        'custo_emails': Decimal('0.00'),
+        'custo_despesas_adicionais': Decimal('0.00'),
+        'detalhamento': {
+            'dominios': [],
+            'hostings': [],
+            'vps': [],
+            'backups': [],
+            'emails': [],
+            'despesas_adicionais': [],
+            'invoices': []
+        },
+        'itens': []
     }
 
 
@@ -168,29 +210,14 @@ def _calcular_rateios(contratos, custos_por_tipo, primeiro_dia, ultimo_dia) -> d
                 'custo_vps': Decimal,
                 'custo_backups': Decimal,
                 'custo_emails': Decimal,
-                'detalhamento': dict
+                'custo_despesas_adicionais': Decimal,
+                'detalhamento': dict,
+                'itens': list  # linhas para ContratoSnapshotItem
             }
         }
     """
     contratos_list = list(contratos)
-    rateios = defaultdict(lambda: {
-        'receita': Decimal('0.00'),
-        'custo_dominios': Decimal('0.00'),
-        'custo_hostings': Decimal('0.00'),
-        'custo_vps': Decimal('0.00'),
-        'custo_backups': Decimal('0.00'),
-        'custo_emails': Decimal('0.00'),
-        'custo_despesas_adicionais': Decimal('0.00'),
-        'detalhamento': {
-            'dominios': [],
-            'hostings': [],
-            'vps': [],
-            'backups': [],
-            'emails': [],
-            'despesas_adicionais': [],
-            'invoices': []
-        }
-    })
+    rateios = defaultdict(_novo_rateio)
     
     # Receita por contrato via vínculo explícito (InvoiceContrato)
     mes_ref = primeiro_dia.month
@@ -245,6 +272,10 @@ def _calcular_rateios(contratos, custos_por_tipo, primeiro_dia, ultimo_dia) -> d
                     'custo_total': float(custo_mensal),
                     'rateio': len(contratos_domain)
                 })
+                _registrar_item(
+                    rateios[contrato.id], 'dominios', cost.domain, cost.domain.nome,
+                    custo_rateado, custo_mensal, len(contratos_domain)
+                )
     
     # Ratear hostings
     for cost in custos_por_tipo['hostings']:
@@ -261,6 +292,10 @@ def _calcular_rateios(contratos, custos_por_tipo, primeiro_dia, ultimo_dia) -> d
                     'custo_total': float(custo_mensal),
                     'rateio': len(contratos_hosting)
                 })
+                _registrar_item(
+                    rateios[contrato.id], 'hostings', cost.hosting, cost.hosting.nome,
+                    custo_rateado, custo_mensal, len(contratos_hosting)
+                )
     
     # Ratear VPS
     for cost in custos_por_tipo['vps']:
@@ -288,6 +323,10 @@ def _calcular_rateios(contratos, custos_por_tipo, primeiro_dia, ultimo_dia) -> d
                     'custo_total': float(custo_mensal),
                     'rateio': len(contratos_vps)
                 })
+                _registrar_item(
+                    rateios[contrato.id], 'vps', cost.vps, cost.vps.nome,
+                    custo_rateado, custo_mensal, len(contratos_vps)
+                )
     
     # Ratear Backups (seguem a VPS)
     for cost in custos_por_tipo['backups']:
@@ -315,6 +354,10 @@ def _calcular_rateios(contratos, custos_por_tipo, primeiro_dia, ultimo_dia) -> d
                     'custo_total': float(custo_mensal),
                     'rateio': len(contratos_backup)
                 })
+                _registrar_item(
+                    rateios[contrato.id], 'backups', cost.backup, cost.backup.nome,
+                    custo_rateado, custo_mensal, len(contratos_backup)
+                )
     
     # Emails (SEM rateio - custo direto do contrato)
     for cost in custos_por_tipo['emails']:
@@ -331,6 +374,10 @@ def _calcular_rateios(contratos, custos_por_tipo, primeiro_dia, ultimo_dia) -> d
                 'custo_total': float(custo_mensal),
                 'rateio': 1  # Sem rateio
             })
+            _registrar_item(
+                rateios[contrato.id], 'emails', cost.email, cost.email.dominio.nome,
+                custo_mensal, custo_mensal, 1
+            )
     
     # Despesas Adicionais (diretas por contrato)
     mes_ref = primeiro_dia.month
@@ -349,13 +396,45 @@ def _calcular_rateios(contratos, custos_por_tipo, primeiro_dia, ultimo_dia) -> d
             'valor': float(despesa.valor),
             'observacoes': despesa.observacoes
         })
+        _registrar_item(
+            rateios[despesa.contrato.id], 'despesas_adicionais', despesa, despesa.descricao,
+            despesa.valor, despesa.valor, 1
+        )
     
     return dict(rateios)
 
 
-def _criar_snapshot(contrato, periodo, rateio_dados) -> ContratoSnapshot:
+def _registrar_item(rateio_contrato, categoria, recurso, nome, custo, custo_total, rateio) -> None:
+    """Acumula uma linha de custo para gravação em ContratoSnapshotItem."""
+    rateio_contrato['itens'].append({
+        'categoria': categoria,
+        'recurso_tipo': recurso._meta.label_lower,
+        'recurso_id': recurso.pk,
+        'nome': nome,
+        'custo': custo,
+        'custo_total': custo_total,
+        'rateio': rateio,
+    })
+
+
+def _criar_itens_snapshot(snapshots, rateios_por_contrato) -> None:
+    """Grava em lote as linhas de custo normalizadas de todos os snapshots."""
+    itens = [
+        ContratoSnapshotItem(
+            snapshot=snapshot,
+            contrato_id=snapshot.contrato_id,
+            competencia=snapshot.competencia,
+            **item
+        )
+        for snapshot in snapshots
+        for item in rateios_por_contrato[snapshot.contrato_id]['itens']
+    ]
+    ContratoSnapshotItem.objects.bulk_create(itens, batch_size=500)
+
+
+def _calcular_valores_snapshot(contrato, rateio_dados) -> dict:
     """
-    Cria um snapshot imutável de um contrato em um período.
+    Calcula os valores gravados no snapshot a partir do rateio do contrato.
     
     Para contratos internos (cliente.tipo == 'interno'):
     - Margem percentual = NULL (não faz sentido calcular sem receita)
@@ -389,20 +468,30 @@ def _criar_snapshot(contrato, periodo, rateio_dados) -> ContratoSnapshot:
     else:
         margem_percentual = Decimal('0.00')
     
+    return {
+        'receita': receita,
+        'custo_dominios': rateio_dados['custo_dominios'],
+        'custo_hostings': rateio_dados['custo_hostings'],
+        'custo_vps': rateio_dados['custo_vps'],
+        'custo_backups': rateio_dados['custo_backups'],
+        'custo_emails': rateio_dados['custo_emails'],
+        'custo_despesas_adicionais': rateio_dados['custo_despesas_adicionais'],
+        'custo_total': custo_total,
+        'margem': margem,
+        'margem_percentual': margem_percentual,
+        'detalhamento': rateio_dados['detalhamento'],
+    }
+
+
+def _criar_snapshot(contrato, periodo, rateio_dados) -> ContratoSnapshot:
+    """
+    Cria um snapshot imutável de um contrato em um período.
+    """
     snapshot = ContratoSnapshot.objects.create(
         contrato=contrato,
         periodo=periodo,
-        receita=receita,
-        custo_dominios=rateio_dados['custo_dominios'],
-        custo_hostings=rateio_dados['custo_hostings'],
-        custo_vps=rateio_dados['custo_vps'],
-        custo_backups=rateio_dados['custo_backups'],
-        custo_emails=rateio_dados['custo_emails'],
-        custo_despesas_adicionais=rateio_dados['custo_despesas_adicionais'],
-        custo_total=custo_total,
-        margem=margem,
-        margem_percentual=margem_percentual,
-        detalhamento=rateio_dados['detalhamento']
+        competencia=periodo.competencia,
+        **_calcular_valores_snapshot(contrato, rateio_dados)
     )
     
     return snapshot
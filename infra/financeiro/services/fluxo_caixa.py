@@ -0,0 +1,141 @@
+"""
+Projeção de fluxo de caixa: custos de infraestrutura x receita de contratos.
+
+Custos (livro CustoInfra), contratos e despesas adicionais são carregados
+uma vez cada e distribuídos em vetores indexados por mês:
+- saída de caixa: valor_total no mês do vencimento e a cada periodo_meses
+  (renovação), enquanto o custo estiver vigente
+- custo por competência: custo_mensal em todos os meses de vigência
+- receita: valor_mensal dos contratos nos meses em que estão ativos
+
+Vencimentos já passados são tratados como pagamento pendente no primeiro
+mês da projeção, e o ciclo segue a partir dele.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Q
+
+from contratos.models import Contrato
+from infra.financeiro.models import CustoInfra, DespesaAdicional
+from .periodos import ano_mes, indice_mes
+
+CENTAVO = Decimal('0.01')
+
+
+def _percentual(valor) -> Decimal:
+    return Decimal(str(valor or 0)) / 100
+
+
+def projetar_fluxo_caixa(
+    meses: int = 12,
+    hoje: date = None,
+    reajuste_custos=0,
+    crescimento_receita=0,
+    churn_mensal=0,
+) -> list:
+    """
+    Projeta os próximos `meses` meses, começando no mês de hoje.
+
+    Args:
+        reajuste_custos: % aplicado aos custos a partir da próxima renovação
+        crescimento_receita: % de crescimento mensal composto da receita
+        churn_mensal: % da receita perdida a cada mês (composto)
+
+    Returns:
+        list: [{'mes': 'MM/AAAA', 'receita', 'saida_caixa', 'custo_competencia',
+                'saldo_caixa', 'resultado_competencia', 'saldo_acumulado'}]
+    """
+    hoje = hoje or date.today()
+    inicio = indice_mes(hoje)
+    fim = inicio + meses - 1
+    primeiro_dia = date(hoje.year, hoje.month, 1)
+    ultimo_mes = date(*ano_mes(fim), 1)
+    apos_fim = date(*ano_mes(fim + 1), 1)
+    fator_reajuste = 1 + _percentual(reajuste_custos)
+
+    saida = [Decimal('0.00')] * meses
+    # Vetores de diferenças: +valor no primeiro mês, -valor após o último
+    competencia = [Decimal('0.00')] * (meses + 1)
+    receita = [Decimal('0.00')] * (meses + 1)
+
+    custos = CustoInfra.objects.filter(
+        ativo=True,
+        data_inicio__lt=apos_fim,
+    ).filter(
+        Q(data_fim__isnull=True) | Q(data_fim__gte=primeiro_dia)
+    ).order_by().values_list('valor_total', 'custo_mensal', 'periodo_meses', 'data_inicio', 'data_fim', 'vencimento')
+
+    for valor_total, custo_mensal, periodo_meses, data_inicio, data_fim, vencimento in custos:
+        primeiro = max(indice_mes(data_inicio), inicio)
+        ultimo = min(indice_mes(data_fim), fim) if data_fim else fim
+        if primeiro > ultimo:
+            continue
+
+        passo = max(periodo_meses, 1)
+        pagamento = max(indice_mes(vencimento), inicio)
+        renovacao = pagamento if indice_mes(vencimento) > inicio else pagamento + passo
+
+        # Competência: valor atual até a renovação, reajustado depois dela
+        competencia[primeiro - inicio] += custo_mensal
+        competencia[ultimo - inicio + 1] -= custo_mensal
+        if fator_reajuste != 1 and renovacao <= ultimo:
+            diferenca = custo_mensal * (fator_reajuste - 1)
+            competencia[max(renovacao, primeiro) - inicio] += diferenca
+            competencia[ultimo - inicio + 1] -= diferenca
+
+        for mes in range(pagamento, ultimo + 1, passo):
+            if mes >= primeiro:
+                saida[mes - inicio] += valor_total * (fator_reajuste if mes >= renovacao else 1)
+
+    contratos = Contrato.objects.filter(
+        data_inicio__lt=apos_fim,
+        valor_mensal__gt=0,
+    ).filter(
+        Q(data_fim__isnull=True) | Q(data_fim__gte=primeiro_dia)
+    ).order_by().values_list('valor_mensal', 'data_inicio', 'data_fim')
+
+    for valor_mensal, data_inicio, data_fim in contratos:
+        primeiro = max(indice_mes(data_inicio), inicio)
+        ultimo = min(indice_mes(data_fim), fim) if data_fim else fim
+        if primeiro > ultimo:
+            continue
+        receita[primeiro - inicio] += valor_mensal
+        receita[ultimo - inicio + 1] -= valor_mensal
+
+    despesas = [Decimal('0.00')] * meses
+    despesas_adicionais = DespesaAdicional.objects.filter(
+        Q(ano_referencia__gt=hoje.year) | Q(ano_referencia=hoje.year, mes_referencia__gte=hoje.month)
+    ).filter(
+        Q(ano_referencia__lt=ultimo_mes.year)
+        | Q(ano_referencia=ultimo_mes.year, mes_referencia__lte=ultimo_mes.month)
+    ).order_by().values_list('ano_referencia', 'mes_referencia', 'valor')
+    for ano, mes, valor in despesas_adicionais:
+        despesas[indice_mes(date(ano, mes, 1)) - inicio] += valor
+
+    fator_receita = (1 + _percentual(crescimento_receita)) * (1 - _percentual(churn_mensal))
+
+    projecao = []
+    custo_acumulado = Decimal('0.00')
+    receita_acumulada = Decimal('0.00')
+    saldo_acumulado = Decimal('0.00')
+    for posicao in range(meses):
+        custo_acumulado += competencia[posicao]
+        receita_acumulada += receita[posicao]
+
+        receita_mes = (receita_acumulada * fator_receita ** posicao).quantize(CENTAVO)
+        saida_mes = (saida[posicao] + despesas[posicao]).quantize(CENTAVO)
+        custo_mes = (custo_acumulado + despesas[posicao]).quantize(CENTAVO)
+        saldo_acumulado += receita_mes - saida_mes
+
+        ano, mes = ano_mes(inicio + posicao)
+        projecao.append({
+            'mes': f'{mes:02d}/{ano}',
+            'receita': receita_mes,
+            'saida_caixa': saida_mes,
+            'custo_competencia': custo_mes,
+            'saldo_caixa': receita_mes - saida_mes,
+            'resultado_competencia': receita_mes - custo_mes,
+            'saldo_acumulado': saldo_acumulado,
+        })
+    return projecao
@@ -0,0 +1,435 @@
+"""
+Importação em lote de custos a partir do extrato do fornecedor (CSV ou XLSX).
+
+Cada linha vira um registro de custo (DomainCost, HostingCost, VPSCost,
+VPSBackupCost ou DomainEmailCost), com o recurso encontrado pelo nome e
+fornecedor. Todas as linhas são validadas numa única passada, com um
+número fixo de queries, antes de qualquer gravação:
+
+- recurso existente e sem ambiguidade
+- valores e datas válidos
+- vigência fora de meses com período já fechado
+- sem sobreposição com outros custos ativos do recurso: um custo que começou
+  antes e ainda vale é encerrado na véspera do novo (se isso não mudar os
+  períodos fechados que dependem dele); os demais casos são erro
+
+Com erro em qualquer linha nada é gravado. Ao gravar, a conferência contra
+períodos e custos existentes roda na mesma transação da gravação, com essas
+linhas travadas; os custos entram com bulk_create e o livro (CustoInfra) é
+sincronizado em lote, já que bulk_create/bulk_update não disparam os signals.
+"""
+import codecs
+import csv
+import io
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import chain
+from zipfile import BadZipFile
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from infra.backups.models import VPSBackup, VPSBackupCost
+from infra.dominios.models import Dominio, DomainCost
+from infra.emails.models import DomainEmail, DomainEmailCost
+from infra.financeiro.models import PeriodoFinanceiro
+from infra.hosting.models import Hosting, HostingCost
+from infra.vps.models import VPS, VPSCost
+from .cache_dashboard import invalidar_dashboard
+from .livro_custos import MODELOS_CUSTO, sincronizar_custos
+from .rateio import periodos_fechados_do_custo
+
+COLUNAS_OBRIGATORIAS = (
+    'tipo', 'recurso', 'fornecedor', 'valor_total', 'periodo_meses', 'data_inicio', 'vencimento'
+)
+
+# tipo -> (model de custo, recursos candidatos, (nome, fornecedor) do recurso)
+TIPOS_IMPORTACAO = {
+    'dominio': (DomainCost, lambda: Dominio.objects.all(), lambda r: (r.nome, r.fornecedor)),
+    'hosting': (HostingCost, lambda: Hosting.objects.all(), lambda r: (r.nome, r.fornecedor)),
+    'vps': (VPSCost, lambda: VPS.objects.all(), lambda r: (r.nome, r.fornecedor)),
+    'backup': (
+        VPSBackupCost,
+        lambda: VPSBackup.objects.select_related('vps'),
+        lambda r: (r.nome, r.fornecedor or r.vps.fornecedor),
+    ),
+    'email': (
+        DomainEmailCost,
+        lambda: DomainEmail.objects.select_related('dominio'),
+        lambda r: (r.dominio.nome, r.fornecedor),
+    ),
+}
+
+ALIASES_TIPO = {
+    'dominios': 'dominio', 'domínio': 'dominio', 'domínios': 'dominio',
+    'hostings': 'hosting',
+    'backups': 'backup',
+    'emails': 'email', 'e-mail': 'email',
+}
+
+
+# ========================================
+# LEITURA
+# ========================================
+
+def _encoding_csv(arquivo) -> str:
+    """
+    UTF-8 (com ou sem BOM) ou, se o início do arquivo não decodificar,
+    cp1252 — o padrão do Excel em português ao salvar "CSV (separado por
+    vírgulas)".
+    """
+    amostra = arquivo.read(64 * 1024)
+    arquivo.seek(0)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(amostra, final=False)
+    except UnicodeDecodeError:
+        return 'cp1252'
+    return 'utf-8-sig'
+
+
+def _linhas_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding=_encoding_csv(arquivo), newline='')
+    primeira = texto.readline()
+    delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+    yield from csv.reader(chain([primeira], texto), delimiter=delimitador)
+
+
+def _linhas_xlsx(arquivo):
+    planilha = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        yield from planilha.active.iter_rows(values_only=True)
+    finally:
+        planilha.close()
+
+
+def ler_planilha(arquivo, nome_arquivo: str):
+    """
+    Lê o extrato linha a linha (CSV com vírgula ou ponto e vírgula, em UTF-8
+    ou cp1252, ou XLSX em modo read-only).
+
+    Yields:
+        tuple: (número da linha na planilha, dict coluna -> valor)
+
+    Raises:
+        ValidationError: Formato não suportado, arquivo ilegível ou colunas
+            obrigatórias ausentes
+    """
+    extensao = nome_arquivo.lower().rsplit('.', 1)[-1]
+    if extensao == 'csv':
+        linhas = _linhas_csv(arquivo)
+    elif extensao == 'xlsx':
+        linhas = _linhas_xlsx(arquivo)
+    else:
+        raise ValidationError('Formato não suportado: envie um arquivo .csv ou .xlsx')
+
+    # A leitura é preguiçosa: erros de decodificação aparecem no meio da
+    # iteração e também precisam virar ValidationError.
+    try:
+        cabecalho = [str(coluna or '').strip().lower().replace(' ', '_') for coluna in next(linhas, [])]
+        faltando = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in cabecalho]
+        if faltando:
+            raise ValidationError(f"Colunas obrigatórias ausentes: {', '.join(faltando)}")
+
+        for numero, valores in enumerate(linhas, start=2):
+            if any(valor not in (None, '') for valor in valores):
+                yield numero, dict(zip(cabecalho, valores))
+    except UnicodeDecodeError:
+        raise ValidationError(
+            'Não foi possível ler o CSV: codificação não reconhecida. '
+            'Salve o arquivo como "CSV UTF-8" e envie novamente.'
+        )
+    except csv.Error as e:
+        raise ValidationError(f'CSV inválido: {e}')
+    except (BadZipFile, InvalidFileException, KeyError):
+        raise ValidationError('Arquivo .xlsx inválido ou corrompido: abra e salve novamente no Excel.')
+
+
+# ========================================
+# CONVERSÃO E VALIDAÇÃO
+# ========================================
+
+def _texto(valor) -> str:
+    return str(valor).strip() if valor is not None else ''
+
+
+def _decimal(valor, campo: str) -> Decimal:
+    """
+    Número da planilha: 1234.56, 1234,56 ou 1.234,56.
+
+    Vírgula antes do ponto (1,234.56) é rejeitada: o formato é ambíguo.
+    """
+    if isinstance(valor, (int, float, Decimal)):
+        texto = str(valor)
+    else:
+        texto = _texto(valor).replace('R$', '').replace(' ', '')
+        if ',' in texto:
+            if texto.rfind('.') > texto.rfind(','):
+                raise ValueError(f'{campo} ambíguo: {valor!r} (use 1.234,56 ou 1234.56)')
+            texto = texto.replace('.', '').replace(',', '.')
+    try:
+        numero = Decimal(texto)
+    except InvalidOperation:
+        raise ValueError(f'{campo} inválido: {valor!r}')
+    if not numero.is_finite():
+        raise ValueError(f'{campo} inválido: {valor!r}')
+    return numero
+
+
+def _data(valor, campo: str, obrigatoria: bool = True):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = _texto(valor)
+    if not texto:
+        if obrigatoria:
+            raise ValueError(f'{campo} é obrigatório')
+        return None
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f'{campo} inválido: {valor!r} (use AAAA-MM-DD ou DD/MM/AAAA)')
+
+
+def _converter_linha(dados: dict) -> dict:
+    tipo = _texto(dados.get('tipo')).lower()
+    tipo = ALIASES_TIPO.get(tipo, tipo)
+    if tipo not in TIPOS_IMPORTACAO:
+        raise ValueError(f"Tipo inválido: {dados.get('tipo')!r} (use {', '.join(TIPOS_IMPORTACAO)})")
+
+    valor_total = _decimal(dados.get('valor_total'), 'valor_total')
+    if valor_total < 0:
+        raise ValueError('valor_total não pode ser negativo')
+    campo = TIPOS_IMPORTACAO[tipo][0]._meta.get_field('valor_total')
+    maximo = Decimal(10) ** (campo.max_digits - campo.decimal_places) - Decimal(10) ** -campo.decimal_places
+    if valor_total > maximo:
+        raise ValueError(f'valor_total acima do máximo permitido ({maximo})')
+
+    periodo_meses = _decimal(dados.get('periodo_meses'), 'periodo_meses')
+    if periodo_meses < 1 or periodo_meses != periodo_meses.to_integral_value():
+        raise ValueError(f"periodo_meses deve ser um inteiro maior que zero: {dados.get('periodo_meses')!r}")
+
+    data_inicio = _data(dados.get('data_inicio'), 'data_inicio')
+    data_fim = _data(dados.get('data_fim'), 'data_fim', obrigatoria=False)
+    if data_fim and data_fim < data_inicio:
+        raise ValueError('data_fim não pode ser anterior à data_inicio')
+
+    return {
+        'tipo': tipo,
+        'chave': (_texto(dados.get('recurso')).casefold(), _texto(dados.get('fornecedor')).casefold()),
+        'valor_total': valor_total.quantize(Decimal('0.01')),
+        'periodo_meses': int(periodo_meses),
+        'data_inicio': data_inicio,
+        'data_fim': data_fim,
+        'vencimento': _data(dados.get('vencimento'), 'vencimento'),
+    }
+
+
+def _indice_recursos(tipo: str) -> dict:
+    """(nome, fornecedor) normalizados -> recursos do tipo (uma query)."""
+    _, recursos, chave = TIPOS_IMPORTACAO[tipo]
+    indice = defaultdict(list)
+    for recurso in recursos():
+        nome, fornecedor = chave(recurso)
+        indice[(nome.strip().casefold(), (fornecedor or '').strip().casefold())].append(recurso)
+    return indice
+
+
+def _sobrepoe(custo, data_inicio: date, data_fim) -> bool:
+    return (
+        (data_fim is None or custo.data_inicio <= data_fim)
+        and (custo.data_fim is None or custo.data_fim >= data_inicio)
+    )
+
+
+def _meses_fechados(data_inicio: date, data_fim, periodos_fechados) -> list:
+    """Períodos fechados cujo mês cruza a vigência (critério do fechamento)."""
+    return [
+        periodo for periodo in periodos_fechados
+        if data_inicio < date(periodo.ano + periodo.mes // 12, periodo.mes % 12 + 1, 1)
+        and (data_fim is None or data_fim >= periodo.competencia)
+    ]
+
+
+def _linha_diff(custo, numero=None, anterior=None) -> dict:
+    _, nome, fornecedor = MODELOS_CUSTO[custo.__class__][2](custo)
+    return {
+        'linha': numero,
+        'categoria': MODELOS_CUSTO[custo.__class__][0],
+        'recurso': nome,
+        'fornecedor': fornecedor,
+        'valor_total': custo.valor_total,
+        'periodo_meses': custo.periodo_meses,
+        'custo_mensal': custo.custo_mensal,
+        'custo_mensal_anterior': anterior.custo_mensal if anterior else None,
+        'data_inicio': custo.data_inicio,
+        'data_fim': custo.data_fim,
+        'vencimento': custo.vencimento,
+    }
+
+
+def importar_custos(linhas, aplicar: bool = False) -> dict:
+    """
+    Valida as linhas do extrato e, com aplicar=True e nenhum erro, grava
+    os custos numa única transação.
+
+    Args:
+        linhas: Iterável de (número da linha, dict), como o de ler_planilha
+        aplicar: False = apenas prévia (dry-run)
+
+    Returns:
+        dict: {
+            'custos': [diff de cada custo novo],
+            'encerrados': [custos existentes que recebem data_fim],
+            'erros': [{'linha': int, 'mensagem': str}],
+            'aplicado': bool
+        }
+    """
+    erros = []
+    convertidas = []
+    for numero, dados in linhas:
+        try:
+            convertidas.append((numero, _converter_linha(dados)))
+        except ValueError as e:
+            erros.append({'linha': numero, 'mensagem': str(e)})
+
+    # Recursos: uma query por tipo presente no extrato
+    indices = {tipo: _indice_recursos(tipo) for tipo in {linha['tipo'] for _, linha in convertidas}}
+    novos_por_recurso = defaultdict(list)
+    for numero, linha in convertidas:
+        candidatos = indices[linha['tipo']].get(linha['chave'], [])
+        if len(candidatos) != 1:
+            motivo = 'não encontrado' if not candidatos else f'ambíguo ({len(candidatos)} cadastros)'
+            erros.append({
+                'linha': numero,
+                'mensagem': f"Recurso {motivo}: {linha['tipo']} {linha['chave'][0]!r} / {linha['chave'][1]!r}",
+            })
+            continue
+        model_custo = TIPOS_IMPORTACAO[linha['tipo']][0]
+        custo = model_custo(
+            **{model_custo.campo_recurso: candidatos[0]},
+            valor_total=linha['valor_total'],
+            periodo_meses=linha['periodo_meses'],
+            data_inicio=linha['data_inicio'],
+            data_fim=linha['data_fim'],
+            vencimento=linha['vencimento'],
+        )
+        novos_por_recurso[(model_custo, candidatos[0].pk)].append((numero, custo))
+
+    # Com aplicar=True a checagem contra o livro roda na transação da
+    # gravação, com os períodos e os custos ativos travados (como em
+    # fechar_periodo): um fechamento ou uma edição concorrente espera a
+    # importação terminar em vez de invalidar o que foi validado.
+    with transaction.atomic():
+        aceitos, encerrados = _conciliar_com_livro(novos_por_recurso, erros, travar=aplicar)
+
+        erros.sort(key=lambda erro: erro['linha'])
+        resultado = {
+            'custos': [
+                _linha_diff(custo, numero, anterior)
+                for numero, custo, anterior in sorted(aceitos, key=lambda item: item[0])
+            ],
+            'encerrados': [_linha_diff(custo) for custo in encerrados],
+            'erros': erros,
+            'aplicado': False,
+        }
+        if erros or not aplicar or not aceitos:
+            return resultado
+
+        _gravar([custo for _, custo, _ in aceitos], encerrados)
+        transaction.on_commit(invalidar_dashboard)
+    resultado['aplicado'] = True
+    return resultado
+
+
+def _conciliar_com_livro(novos_por_recurso: dict, erros: list, travar: bool) -> tuple:
+    """
+    Confere os custos novos contra os períodos fechados e os custos ativos
+    dos mesmos recursos (uma query cada).
+
+    Args:
+        novos_por_recurso: (model de custo, id do recurso) -> [(linha, custo)]
+        erros: Lista onde os erros de cada linha são acrescentados
+        travar: select_for_update nos períodos e nos custos ativos lidos
+
+    Returns:
+        tuple: ([(linha, custo, custo encerrado ou None)], [custos existentes encerrados])
+    """
+    periodos = PeriodoFinanceiro.objects.order_by('ano', 'mes')
+    if travar:
+        # Todos os períodos, não só os fechados: fechar_periodo trava a linha
+        # do período antes de fechá-lo
+        periodos = periodos.select_for_update()
+    periodos_fechados = [periodo for periodo in periodos if periodo.fechado]
+
+    existentes = defaultdict(list)
+    for model_custo in {model for model, _ in novos_por_recurso}:
+        campo = model_custo.campo_recurso
+        ids = [recurso_id for model, recurso_id in novos_por_recurso if model is model_custo]
+        custos = model_custo.objects.filter(ativo=True, **{f'{campo}_id__in': ids}).select_related(
+            *MODELOS_CUSTO[model_custo][1]
+        )
+        if travar:
+            custos = custos.select_for_update(of=('self',))
+        for custo in custos:
+            existentes[(model_custo, getattr(custo, f'{campo}_id'))].append(custo)
+
+    aceitos = []
+    encerrados = {}
+    for chave, novos in novos_por_recurso.items():
+        vigentes = sorted(existentes[chave], key=lambda custo: custo.data_inicio)
+        for numero, custo in sorted(novos, key=lambda item: item[1].data_inicio):
+            fechados = _meses_fechados(custo.data_inicio, custo.data_fim, periodos_fechados)
+            if fechados:
+                erros.append({'linha': numero, 'mensagem': f'Vigência cruza período fechado ({fechados[0]})'})
+                continue
+
+            a_encerrar = []
+            problema = None
+            for anterior in (c for c in vigentes if _sobrepoe(c, custo.data_inicio, custo.data_fim)):
+                novo_fim = custo.data_inicio - timedelta(days=1)
+                if anterior.data_inicio >= custo.data_inicio:
+                    problema = f'Sobrepõe custo que começa em {anterior.data_inicio:%d/%m/%Y}'
+                elif anterior.pk and periodos_fechados_do_custo(
+                    anterior.data_inicio, novo_fim, periodos_fechados
+                ) != periodos_fechados_do_custo(anterior.data_inicio, anterior.data_fim, periodos_fechados):
+                    problema = (
+                        f'Encerrar o custo de {anterior.data_inicio:%d/%m/%Y} em {novo_fim:%d/%m/%Y} '
+                        f'alteraria períodos fechados'
+                    )
+                else:
+                    a_encerrar.append(anterior)
+            if problema:
+                erros.append({'linha': numero, 'mensagem': problema})
+                continue
+
+            for anterior in a_encerrar:
+                anterior.data_fim = custo.data_inicio - timedelta(days=1)
+                if anterior.pk:
+                    encerrados[(anterior.__class__, anterior.pk)] = anterior
+            aceitos.append((numero, custo, a_encerrar[-1] if a_encerrar else None))
+            vigentes.append(custo)
+
+    return aceitos, list(encerrados.values())
+
+
+def _gravar(novos: list, encerrados: list) -> None:
+    """bulk_update dos encerrados, bulk_create dos novos e sync do livro."""
+    por_model = defaultdict(list)
+    for custo in encerrados:
+        por_model[custo.__class__].append(custo)
+    for model_custo, custos in por_model.items():
+        model_custo.objects.bulk_update(custos, ['data_fim'], batch_size=500)
+
+    por_model = defaultdict(list)
+    for custo in novos:
+        por_model[custo.__class__].append(custo)
+    for model_custo, custos in por_model.items():
+        model_custo.objects.bulk_create(custos, batch_size=500)
+
+    sincronizar_custos(novos + encerrados)
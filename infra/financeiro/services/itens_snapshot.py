@@ -0,0 +1,65 @@
+"""
+Consultas de drill-down sobre os itens normalizados dos snapshots.
+
+Trabalham sobre ContratoSnapshotItem (indexado por recurso e competência),
+sem precisar carregar o JSON de detalhamento.
+"""
+from datetime import date
+from typing import Optional
+
+from django.db.models import Count, Max, Min, Sum
+
+from infra.financeiro.models import ContratoSnapshotItem
+
+
+def contratos_por_recurso(recurso_tipo: str, recurso_id: int, desde: Optional[date] = None):
+    """
+    Contratos que carregaram um recurso (ex: VPS X) nos snapshots.
+    
+    Args:
+        recurso_tipo: Model do recurso (ex: 'vps.vps')
+        recurso_id: ID do recurso
+        desde: Competência inicial (inclusive). None = todo o histórico
+    
+    Returns:
+        QuerySet de dicts por contrato com meses, custo rateado e intervalo
+    """
+    itens = ContratoSnapshotItem.objects.filter(
+        recurso_tipo=recurso_tipo,
+        recurso_id=recurso_id,
+    )
+    if desde:
+        itens = itens.filter(competencia__gte=desde)
+    
+    return itens.values(
+        'contrato_id', 'contrato__nome', 'contrato__cliente__nome'
+    ).annotate(
+        meses=Count('competencia', distinct=True),
+        custo=Sum('custo'),
+        primeira_competencia=Min('competencia'),
+        ultima_competencia=Max('competencia'),
+    ).order_by('-custo')
+
+
+def custos_por_recurso(competencia: date, limit: Optional[int] = None):
+    """
+    Custo de cada recurso em uma competência, somando as parcelas rateadas.
+    
+    Returns:
+        QuerySet de dicts com categoria, recurso, custo total e nº de contratos
+    """
+    custos = ContratoSnapshotItem.objects.filter(
+        competencia=competencia,
+    ).exclude(
+        categoria='despesas_adicionais'
+    ).values(
+        'categoria', 'recurso_tipo', 'recurso_id', 'nome'
+    ).annotate(
+        custo=Sum('custo'),
+        custo_mensal=Max('custo_total'),
+        contratos=Count('contrato', distinct=True),
+    ).order_by('-custo', 'nome')
+    
+    if limit:
+        return custos[:limit]
+    return custos
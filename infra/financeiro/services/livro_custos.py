@@ -0,0 +1,263 @@
+"""
+Livro consolidado de custos de infraestrutura (CustoInfra).
+
+Os cinco models de custo continuam sendo a fonte de verdade; o livro é uma
+cópia desnormalizada, mantida pelos signals, com o custo mensal já
+calculado e o nome/fornecedor do recurso. Atualizações em massa
+(QuerySet.update) não disparam signals: use o comando
+`reconstruir_livro_custos` depois delas.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from infra.financeiro.models import CustoInfra
+from infra.dominios.models import Dominio, DomainCost
+from infra.hosting.models import Hosting, HostingCost
+from infra.vps.models import VPS, VPSCost
+from infra.backups.models import VPSBackup, VPSBackupCost
+from infra.emails.models import DomainEmail, DomainEmailCost
+from .cache_dashboard import invalidar_dashboard
+
+
+def _recurso_dominio(custo):
+    return custo.domain, custo.domain.nome, custo.domain.fornecedor
+
+
+def _recurso_hosting(custo):
+    return custo.hosting, custo.hosting.nome, custo.hosting.fornecedor
+
+
+def _recurso_vps(custo):
+    return custo.vps, custo.vps.nome, custo.vps.fornecedor
+
+
+def _recurso_backup(custo):
+    backup = custo.backup
+    return (
+        backup,
+        f"{backup.nome} ({backup.vps.nome})",
+        backup.fornecedor or backup.vps.fornecedor,
+    )
+
+
+def _recurso_email(custo):
+    email = custo.email
+    return email, f"Email {email.dominio.nome}", email.fornecedor
+
+
+# model de custo -> (categoria, select_related, extrator do recurso)
+MODELOS_CUSTO = {
+    DomainCost: ('dominios', ['domain'], _recurso_dominio),
+    HostingCost: ('hostings', ['hosting'], _recurso_hosting),
+    VPSCost: ('vps', ['vps'], _recurso_vps),
+    VPSBackupCost: ('backups', ['backup__vps'], _recurso_backup),
+    DomainEmailCost: ('emails', ['email__dominio'], _recurso_email),
+}
+
+# model de recurso -> custos cujo nome/fornecedor no livro dependem dele
+RECURSOS_CUSTO = {
+    Dominio: [(DomainCost, 'domain'), (DomainEmailCost, 'email__dominio')],
+    Hosting: [(HostingCost, 'hosting')],
+    VPS: [(VPSCost, 'vps'), (VPSBackupCost, 'backup__vps')],
+    VPSBackup: [(VPSBackupCost, 'backup')],
+    DomainEmail: [(DomainEmailCost, 'email')],
+}
+
+
+def _valores_livro(custo) -> dict:
+    """Campos de CustoInfra para um registro de custo."""
+    categoria, _, extrair_recurso = MODELOS_CUSTO[custo.__class__]
+    recurso, nome, fornecedor = extrair_recurso(custo)
+    return {
+        'categoria': categoria,
+        'recurso_tipo': recurso._meta.label_lower,
+        'recurso_id': recurso.pk,
+        'recurso_nome': nome[:255],
+        'fornecedor': fornecedor or '',
+        'valor_total': custo.valor_total,
+        'periodo_meses': custo.periodo_meses,
+        'custo_mensal': custo.custo_mensal,
+        'data_inicio': custo.data_inicio,
+        'data_fim': custo.data_fim,
+        'vencimento': custo.vencimento,
+        'ativo': custo.ativo,
+    }
+
+
+def sincronizar_custo(custo) -> CustoInfra:
+    """Cria ou atualiza a linha do livro para um registro de custo."""
+    linha, _ = CustoInfra.objects.update_or_create(
+        origem_tipo=custo._meta.label_lower,
+        origem_id=custo.pk,
+        defaults=_valores_livro(custo),
+    )
+    return linha
+
+
+def remover_custo(custo) -> None:
+    """Remove a linha do livro de um registro de custo excluído."""
+    CustoInfra.objects.filter(
+        origem_tipo=custo._meta.label_lower,
+        origem_id=custo.pk,
+    ).delete()
+
+
+@transaction.atomic
+def sincronizar_custos(custos) -> int:
+    """
+    Versão em lote de sincronizar_custo, para registros gravados com
+    bulk_create/bulk_update (que não disparam os signals).
+
+    Os recursos precisam estar carregados (mesmo select_related de
+    MODELOS_CUSTO) para evitar uma query por linha.
+
+    Returns:
+        int: Quantidade de linhas gravadas
+    """
+    ids_por_origem = defaultdict(list)
+    linhas = []
+    for custo in custos:
+        ids_por_origem[custo._meta.label_lower].append(custo.pk)
+        linhas.append(CustoInfra(
+            origem_tipo=custo._meta.label_lower,
+            origem_id=custo.pk,
+            **_valores_livro(custo),
+        ))
+    if not linhas:
+        return 0
+
+    filtro = Q()
+    for origem_tipo, ids in ids_por_origem.items():
+        filtro |= Q(origem_tipo=origem_tipo, origem_id__in=ids)
+    CustoInfra.objects.filter(filtro).delete()
+    CustoInfra.objects.bulk_create(linhas, batch_size=500)
+    return len(linhas)
+
+
+def sincronizar_recurso(recurso) -> int:
+    """
+    Atualiza nome/fornecedor no livro após alteração de um recurso.
+
+    Renomear um domínio afeta os emails dele; renomear uma VPS afeta
+    os backups dela.
+
+    Returns:
+        int: Quantidade de linhas sincronizadas
+    """
+    total = 0
+    for model_custo, lookup in RECURSOS_CUSTO.get(recurso.__class__, []):
+        _, relacionados, _ = MODELOS_CUSTO[model_custo]
+        for custo in model_custo.objects.filter(**{lookup: recurso}).select_related(*relacionados):
+            sincronizar_custo(custo)
+            total += 1
+    return total
+
+
+@transaction.atomic
+def reconstruir_livro() -> int:
+    """
+    Reconstrói o livro inteiro a partir dos cinco models de custo.
+
+    Returns:
+        int: Quantidade de linhas gravadas
+    """
+    linhas = []
+    for model_custo, (_, relacionados, _) in MODELOS_CUSTO.items():
+        for custo in model_custo.objects.select_related(*relacionados).iterator():
+            linhas.append(CustoInfra(
+                origem_tipo=custo._meta.label_lower,
+                origem_id=custo.pk,
+                **_valores_livro(custo),
+            ))
+
+    CustoInfra.objects.all().delete()
+    CustoInfra.objects.bulk_create(linhas, batch_size=500)
+    transaction.on_commit(invalidar_dashboard)
+    return len(linhas)
+
+
+def custo_vigente(recurso, data: date = None):
+    """
+    Registro de custo em vigor para o recurso na data (padrão: hoje).
+
+    Consulta o model de custo pelo índice (recurso, data_inicio). Se houver
+    custos sobrepostos (cadastrados antes da validação de vigência), vale o
+    de início mais recente.
+
+    Returns:
+        DomainCost/HostingCost/VPSCost/VPSBackupCost/DomainEmailCost ou None
+    """
+    data = data or date.today()
+    return recurso.costs.vigentes(data, data).order_by('-data_inicio', '-pk').first()
+
+
+def listar_sobreposicoes() -> list:
+    """
+    Pares de custos ativos do mesmo recurso com vigências sobrepostas.
+
+    Existem em dados cadastrados antes da validação de vigência. Enquanto
+    não forem corrigidos (data de fim no anterior ou inativação), salvar um
+    deles alterando vigência, status ou recurso é rejeitado.
+
+    Returns:
+        list: [{'tipo', 'recurso', 'custo_id', 'inicio', 'fim',
+                'sobreposto_id', 'sobreposto_inicio', 'sobreposto_fim'}]
+    """
+    sobreposicoes = []
+    for model_custo, (_, relacionados, extrair_recurso) in MODELOS_CUSTO.items():
+        campo = f'{model_custo.campo_recurso}_id'
+        custos = model_custo.objects.filter(ativo=True).select_related(*relacionados).order_by(
+            campo, 'data_inicio', 'pk'
+        )
+        # Custo do recurso atual com o fim mais distante até aqui
+        mais_longo = None
+        for custo in custos.iterator():
+            if mais_longo is None or getattr(mais_longo, campo) != getattr(custo, campo):
+                mais_longo = custo
+                continue
+            if mais_longo.data_fim is None or mais_longo.data_fim >= custo.data_inicio:
+                _, nome, _ = extrair_recurso(custo)
+                sobreposicoes.append({
+                    'tipo': model_custo._meta.verbose_name,
+                    'recurso': nome,
+                    'custo_id': custo.pk,
+                    'inicio': custo.data_inicio,
+                    'fim': custo.data_fim,
+                    'sobreposto_id': mais_longo.pk,
+                    'sobreposto_inicio': mais_longo.data_inicio,
+                    'sobreposto_fim': mais_longo.data_fim,
+                })
+            if mais_longo.data_fim is not None and (custo.data_fim is None or custo.data_fim > mais_longo.data_fim):
+                mais_longo = custo
+    return sobreposicoes
+
+
+def custos_vigentes(inicio: date, fim: date):
+    """
+    Custos ativos com vigência sobrepondo o intervalo [inicio, fim].
+
+    Returns:
+        QuerySet de CustoInfra
+    """
+    return CustoInfra.objects.filter(
+        ativo=True,
+        data_inicio__lte=fim,
+    ).filter(
+        Q(data_fim__isnull=True) | Q(data_fim__gte=inicio)
+    )
+
+
+def custo_mensal_vigente(inicio: date, fim: date = None) -> Decimal:
+    """
+    Soma do custo mensal de todos os custos vigentes no intervalo.
+
+    Uma única agregação sobre o índice de vigência.
+    """
+    total = custos_vigentes(inicio, fim or inicio).aggregate(
+        total=Sum('custo_mensal')
+    )['total']
+    return total or Decimal('0.00')
@@ -0,0 +1,133 @@
+"""
+Métricas móveis de rentabilidade por contrato.
+
+Calculadas no fechamento a partir do histórico de snapshots, carregado
+em uma única query e percorrido uma única vez (sem query por contrato).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from infra.financeiro.models import ContratoSnapshot, ContratoSnapshotMetrica, PeriodoFinanceiro
+from .cache_dashboard import invalidar_dashboard
+from .periodos import indice_mes, quantizar
+
+JANELAS = (3, 6, 12)
+CAMPOS_METRICA = [
+    *(f'media_{valor}_{n}m' for valor in ('receita', 'custo', 'margem') for n in JANELAS),
+    'tendencia_margem',
+    'meses_prejuizo_consecutivos',
+    'calculado_em',
+]
+
+
+def _media(valores) -> Decimal:
+    if not valores:
+        return Decimal('0.00')
+    return quantizar(sum(valores) / Decimal(len(valores)))
+
+
+def _inclinacao(pontos) -> Decimal:
+    """Inclinação (mínimos quadrados) de uma lista de (mes, valor)."""
+    if len(pontos) < 2:
+        return Decimal('0.00')
+
+    n = Decimal(len(pontos))
+    media_x = sum(Decimal(x) for x, _ in pontos) / n
+    media_y = sum(y for _, y in pontos) / n
+
+    numerador = sum((Decimal(x) - media_x) * (y - media_y) for x, y in pontos)
+    denominador = sum((Decimal(x) - media_x) ** 2 for x, _ in pontos)
+    if denominador == 0:
+        return Decimal('0.00')
+    return quantizar(numerador / denominador)
+
+
+def calcular_metricas_contrato(historico, mes_final: int) -> dict:
+    """
+    Calcula as métricas de um contrato a partir do seu histórico.
+
+    Args:
+        historico: Lista ordenada de (indice_mes, receita, custo_total, margem)
+        mes_final: Índice do mês da competência avaliada
+
+    Returns:
+        dict: Campos de ContratoSnapshotMetrica
+    """
+    metricas = {}
+    for n in JANELAS:
+        janela = [linha for linha in historico if mes_final - n < linha[0] <= mes_final]
+        metricas[f'media_receita_{n}m'] = _media([linha[1] for linha in janela])
+        metricas[f'media_custo_{n}m'] = _media([linha[2] for linha in janela])
+        metricas[f'media_margem_{n}m'] = _media([linha[3] for linha in janela])
+
+    metricas['tendencia_margem'] = _inclinacao([
+        (linha[0], linha[3]) for linha in historico if mes_final - 12 < linha[0] <= mes_final
+    ])
+
+    # Meses seguidos (sem lacuna) com margem negativa até a competência
+    prejuizo = 0
+    mes_esperado = mes_final
+    for indice, _, _, margem in reversed(historico):
+        if indice > mes_final:
+            continue
+        if indice != mes_esperado or margem >= 0:
+            break
+        prejuizo += 1
+        mes_esperado -= 1
+    metricas['meses_prejuizo_consecutivos'] = prejuizo
+
+    return metricas
+
+
+def calcular_metricas_periodo(periodo: PeriodoFinanceiro) -> int:
+    """
+    Calcula e grava as métricas móveis de todos os snapshots de um período.
+
+    Idempotente: recalcular atualiza as métricas existentes.
+
+    Returns:
+        int: Quantidade de métricas gravadas
+    """
+    competencia = periodo.competencia
+    mes_final = indice_mes(competencia)
+
+    snapshots = list(
+        ContratoSnapshot.objects.filter(periodo=periodo).order_by().values_list('id', 'contrato_id')
+    )
+    if not snapshots:
+        return 0
+
+    # Histórico completo dos contratos do período em uma única query
+    historico_por_contrato = {}
+    historico = ContratoSnapshot.objects.filter(
+        contrato_id__in=[contrato_id for _, contrato_id in snapshots],
+        competencia__lte=competencia,
+    ).order_by('contrato_id', 'competencia').values_list(
+        'contrato_id', 'competencia', 'receita', 'custo_total', 'margem'
+    )
+    for contrato_id, comp, receita, custo_total, margem in historico:
+        historico_por_contrato.setdefault(contrato_id, []).append(
+            (indice_mes(comp), receita, custo_total, margem)
+        )
+
+    metricas = [
+        ContratoSnapshotMetrica(
+            snapshot_id=snapshot_id,
+            contrato_id=contrato_id,
+            competencia=competencia,
+            **calcular_metricas_contrato(historico_por_contrato.get(contrato_id, []), mes_final)
+        )
+        for snapshot_id, contrato_id in snapshots
+    ]
+
+    ContratoSnapshotMetrica.objects.bulk_create(
+        metricas,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['snapshot'],
+        update_fields=CAMPOS_METRICA,
+    )
+    # bulk_create não dispara os signals do cache do dashboard
+    transaction.on_commit(invalidar_dashboard)
+    return len(metricas)
@@ -0,0 +1,27 @@
+"""
+Aritmética de competências (meses) compartilhada pelos serviços.
+
+Competências são convertidas em um índice sequencial de meses para que
+janelas, deslocamentos e séries mensais virem operações com inteiros.
+"""
+from decimal import Decimal
+
+# Maior valor de um DecimalField(max_digits=10, decimal_places=2)
+LIMITE_DECIMAL = Decimal('99999999.99')
+
+
+def indice_mes(competencia) -> int:
+    """Converte a competência em um índice sequencial de meses."""
+    return competencia.year * 12 + competencia.month - 1
+
+
+def ano_mes(indice: int) -> tuple:
+    """Inverso de indice_mes: (ano, mês)."""
+    ano, mes = divmod(indice, 12)
+    return ano, mes + 1
+
+
+def quantizar(valor: Decimal) -> Decimal:
+    """Arredonda em centavos, limitado ao que cabe nos campos de valor."""
+    valor = max(-LIMITE_DECIMAL, min(valor, LIMITE_DECIMAL))
+    return valor.quantize(Decimal('0.01'))
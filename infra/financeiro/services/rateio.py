@@ -38,10 +38,24 @@ def ratear_por_contratos(valor: Decimal, contratos: List) -> Decimal:
     Returns:
         Decimal: Valor por contrato (arredondado)
     """
-    if not contratos or len(contratos) == 0:
+    return ratear_valor(valor, len(contratos) if contratos else 0)
+
+
+def ratear_valor(valor: Decimal, quantidade: int) -> Decimal:
+    """
+    Divide um valor igualmente entre N partes.
+    
+    Args:
+        valor: Valor total a ser rateado
+        quantidade: Número de contratos que compartilham o custo
+    
+    Returns:
+        Decimal: Valor por parte (arredondado)
+    """
+    if not quantidade:
         return Decimal('0.00')
     
-    valor_rateado = valor / Decimal(len(contratos))
+    valor_rateado = valor / Decimal(quantidade)
     return valor_rateado.quantize(Decimal('0.01'))
 
 
@@ -59,3 +73,24 @@ def validar_periodo(periodo: PeriodoFinanceiro) -> None:
         raise ValidationError(
             f"Período {periodo} já está fechado desde {periodo.fechado_em}"
         )
+
+
+def periodos_fechados_do_custo(data_inicio, data_fim, periodos_fechados) -> List[PeriodoFinanceiro]:
+    """
+    Períodos fechados que dependem de um custo com a vigência informada.
+    
+    O custo conta no período se já tinha começado no primeiro dia do mês
+    e não tinha terminado antes dele (critério da proteção de custos).
+    
+    Args:
+        data_inicio: Início da vigência do custo
+        data_fim: Fim da vigência (None = em aberto)
+        periodos_fechados: Períodos a considerar
+    
+    Returns:
+        list: Períodos, na ordem recebida
+    """
+    return [
+        periodo for periodo in periodos_fechados
+        if data_inicio <= periodo.competencia and (data_fim is None or data_fim >= periodo.competencia)
+    ]
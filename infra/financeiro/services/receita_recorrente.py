@@ -0,0 +1,91 @@
+"""
+Receita recorrente mensal (MRR) a partir dos contratos.
+
+Todos os contratos são carregados em uma única query como intervalos de
+meses [início, fim] e somados por cliente em vetores de diferenças: +valor
+no mês de início, -valor no mês seguinte ao fim. A soma acumulada dá o MRR
+de cada cliente mês a mês, e a comparação entre meses consecutivos
+classifica os movimentos:
+- novo: cliente sem MRR no mês anterior
+- expansão / contração: cliente continua, com MRR maior / menor
+- churn: cliente com MRR no mês anterior e sem MRR no mês
+
+Um contrato conta no mês se começou antes do fim do mês e não terminou
+antes do início dele (mesma regra do fechamento de período).
+Clientes internos não entram.
+"""
+from datetime import date
+from decimal import Decimal
+
+from contratos.models import Contrato
+from .periodos import ano_mes, indice_mes
+
+SERIES_MRR = [
+    'mrr', 'novo', 'expansao', 'contracao', 'churn',
+    'clientes', 'clientes_novos', 'clientes_churn',
+]
+
+
+def linha_do_tempo_mrr(meses: int = 12, hoje: date = None) -> list:
+    """
+    MRR e movimentos dos últimos `meses` meses (até o mês de hoje).
+
+    Returns:
+        list: [{'mes': 'MM/AAAA', 'mrr', 'novo', 'expansao', 'contracao',
+                'churn', 'clientes', 'clientes_novos', 'clientes_churn'}]
+        (contracao e churn positivos: valor perdido)
+    """
+    hoje = hoje or date.today()
+    mes_final = indice_mes(hoje)
+    # Um mês antes da janela: referência para os movimentos do primeiro mês
+    base = mes_final - meses
+    tamanho = meses + 1
+
+    contratos = Contrato.objects.exclude(
+        cliente__tipo='interno'
+    ).filter(
+        data_inicio__lte=hoje,
+        valor_mensal__gt=0,
+    ).order_by().values_list('cliente_id', 'valor_mensal', 'data_inicio', 'data_fim')
+
+    diferencas_por_cliente = {}
+    for cliente_id, valor, data_inicio, data_fim in contratos:
+        inicio = max(indice_mes(data_inicio), base)
+        fim = min(indice_mes(data_fim), mes_final) if data_fim else mes_final
+        if inicio > fim:
+            continue
+        diferencas = diferencas_por_cliente.setdefault(cliente_id, [Decimal('0.00')] * (tamanho + 1))
+        diferencas[inicio - base] += valor
+        diferencas[fim - base + 1] -= valor
+
+    linha = [dict.fromkeys(SERIES_MRR, Decimal('0.00')) for _ in range(tamanho)]
+    for item in linha:
+        item.update(clientes=0, clientes_novos=0, clientes_churn=0)
+
+    for diferencas in diferencas_por_cliente.values():
+        anterior = Decimal('0.00')
+        acumulado = Decimal('0.00')
+        for posicao in range(tamanho):
+            acumulado += diferencas[posicao]
+            item = linha[posicao]
+            if acumulado > 0:
+                item['mrr'] += acumulado
+                item['clientes'] += 1
+            if posicao > 0:
+                if anterior <= 0 < acumulado:
+                    item['novo'] += acumulado
+                    item['clientes_novos'] += 1
+                elif acumulado <= 0 < anterior:
+                    item['churn'] += anterior
+                    item['clientes_churn'] += 1
+                elif acumulado > anterior:
+                    item['expansao'] += acumulado - anterior
+                elif acumulado < anterior:
+                    item['contracao'] += anterior - acumulado
+            anterior = acumulado
+
+    resultado = []
+    for posicao, item in enumerate(linha[1:], start=1):
+        ano, mes = ano_mes(base + posicao)
+        resultado.append({'mes': f'{mes:02d}/{ano}', **item})
+    return resultado
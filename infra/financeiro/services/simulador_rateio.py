@@ -0,0 +1,259 @@
+"""
+Simulador de alocação ("e se...?") sobre um grafo recursos x contratos.
+
+O grafo é carregado uma vez (vínculos M2M de domínios/hostings, VPSContrato,
+backups, emails e o livro de custos) e guardado no cache versionado. Uma
+simulação aplica vínculos ou custos hipotéticos e refaz o rateio igualitário
+apenas dos recursos alterados, devolvendo a margem antes/depois de cada
+contrato afetado. Nada é gravado.
+
+Mesmas regras do fechamento: cada registro de custo é rateado igualmente
+entre os contratos ativos do recurso; backups seguem os contratos da VPS;
+emails são custo direto do contrato. A receita considerada é o
+valor_mensal do contrato (a simulação é prospectiva, sem invoices).
+"""
+from collections import ChainMap, defaultdict
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q, Sum
+
+from contratos.models import Contrato
+from infra.backups.models import VPSBackup
+from infra.dominios.models import Dominio
+from infra.emails.models import DomainEmail
+from infra.financeiro.models import DespesaAdicional
+from infra.hosting.models import Hosting
+from infra.vps.models import VPSContrato
+from .livro_custos import custos_vigentes
+from .periodos import ano_mes, indice_mes
+from .rateio import ratear_por_contratos
+
+CATEGORIAS_RECURSO = ('dominios', 'hostings', 'vps', 'backups', 'emails')
+CATEGORIAS_COMPARTILHADAS = ('dominios', 'hostings', 'vps')
+PREFIXO_RECURSO_NOVO = 'novo:'
+
+
+class GrafoRateio:
+    """
+    Recursos (categoria, id) ligados aos contratos ativos de uma competência.
+
+    Atributos:
+        contratos: {contrato_id: {'nome', 'receita', 'despesas'}}
+        vinculos: {recurso: set(contrato_id)} para domínios, hostings e VPS
+        vps_do_backup: {backup_id: vps_id}
+        contrato_do_email: {email_id: contrato_id}
+        custos: {recurso: [custo_mensal de cada registro de custo]}
+    """
+
+    def __init__(self, competencia: date):
+        self.competencia = competencia
+        self.contratos = {}
+        self.vinculos = defaultdict(set)
+        self.vps_do_backup = {}
+        self.contrato_do_email = {}
+        self.custos = defaultdict(list)
+        self.custo_por_contrato = {}
+
+    @classmethod
+    def carregar(cls, competencia: date = None) -> 'GrafoRateio':
+        """Uma query por tabela de vínculo, mais contratos, custos e despesas."""
+        competencia = (competencia or date.today()).replace(day=1)
+        ultimo_dia = date(*ano_mes(indice_mes(competencia) + 1), 1)
+        grafo = cls(competencia)
+
+        ativos = Q(data_fim__isnull=True) | Q(data_fim__gte=competencia)
+        for contrato_id, nome, cliente, valor_mensal in Contrato.objects.filter(
+            ativos, data_inicio__lt=ultimo_dia,
+        ).order_by().values_list('id', 'nome', 'cliente__nome', 'valor_mensal'):
+            grafo.contratos[contrato_id] = {
+                'nome': f'{nome} - {cliente}',
+                'receita': valor_mensal,
+                'despesas': Decimal('0.00'),
+            }
+
+        for contrato_id, valor in DespesaAdicional.objects.filter(
+            mes_referencia=competencia.month,
+            ano_referencia=competencia.year,
+            contrato_id__in=grafo.contratos,
+        ).values('contrato_id').annotate(total=Sum('valor')).values_list('contrato_id', 'total'):
+            grafo.contratos[contrato_id]['despesas'] = valor
+
+        for categoria, model, campo in (
+            ('dominios', Dominio, 'dominio_id'),
+            ('hostings', Hosting, 'hosting_id'),
+        ):
+            for recurso_id, contrato_id in model.contratos.through.objects.values_list(campo, 'contrato_id'):
+                grafo.vincular((categoria, recurso_id), contrato_id)
+
+        for vps_id, contrato_id in VPSContrato.objects.filter(
+            ativos, data_inicio__lt=ultimo_dia,
+        ).values_list('vps_id', 'contrato_id'):
+            grafo.vincular(('vps', vps_id), contrato_id)
+
+        grafo.vps_do_backup = dict(VPSBackup.objects.values_list('id', 'vps_id'))
+        grafo.contrato_do_email = dict(DomainEmail.objects.values_list('id', 'contrato_id'))
+
+        for categoria, recurso_id, custo_mensal in custos_vigentes(
+            competencia, ultimo_dia - timedelta(days=1)
+        ).values_list('categoria', 'recurso_id', 'custo_mensal'):
+            grafo.custos[(categoria, recurso_id)].append(custo_mensal)
+
+        grafo.custo_por_contrato = grafo._custos_contratos(grafo.custos, grafo.vinculos)
+        return grafo
+
+    def vincular(self, recurso, contrato_id) -> None:
+        if contrato_id in self.contratos:
+            self.vinculos[recurso].add(contrato_id)
+
+    def _contratos_do_recurso(self, recurso, vinculos) -> list:
+        categoria, recurso_id = recurso
+        if categoria == 'backups':
+            return sorted(vinculos.get(('vps', self.vps_do_backup.get(recurso_id)), ()))
+        if categoria == 'emails':
+            contrato_id = self.contrato_do_email.get(recurso_id)
+            return [contrato_id] if contrato_id in self.contratos else []
+        return sorted(vinculos.get(recurso, ()))
+
+    def _alocar(self, recurso, custos, vinculos) -> dict:
+        """Rateio de um recurso: {contrato_id: custo}."""
+        contratos = self._contratos_do_recurso(recurso, vinculos)
+        alocacao = {}
+        for custo_mensal in custos.get(recurso, ()):
+            por_contrato = ratear_por_contratos(custo_mensal, contratos)
+            for contrato_id in contratos:
+                alocacao[contrato_id] = alocacao.get(contrato_id, Decimal('0.00')) + por_contrato
+        return alocacao
+
+    def _custos_contratos(self, custos, vinculos) -> dict:
+        total = defaultdict(lambda: Decimal('0.00'))
+        for recurso in custos:
+            for contrato_id, valor in self._alocar(recurso, custos, vinculos).items():
+                total[contrato_id] += valor
+        return dict(total)
+
+    def _recursos_afetados(self, recursos) -> set:
+        """Recursos alterados mais os backups das VPS alteradas."""
+        afetados = set(recursos)
+        vps_alteradas = {recurso_id for categoria, recurso_id in recursos if categoria == 'vps'}
+        if vps_alteradas:
+            afetados.update(
+                ('backups', backup_id)
+                for backup_id, vps_id in self.vps_do_backup.items()
+                if vps_id in vps_alteradas and ('backups', backup_id) in self.custos
+            )
+        return afetados
+
+    def simular(self, alteracoes) -> list:
+        """
+        Aplica alterações hipotéticas e refaz o rateio dos recursos afetados.
+
+        Args:
+            alteracoes: lista de dicts, com recurso = (categoria, id); o id
+                é inteiro para um recurso existente ou 'novo:<nome>' para
+                um recurso hipotético
+                - {'acao': 'vincular', 'recurso', 'contrato'}
+                - {'acao': 'desvincular', 'recurso', 'contrato'}
+                - {'acao': 'mover', 'recurso', 'destino', 'contrato'}
+                - {'acao': 'custo', 'recurso', 'custo_mensal'} (novo registro de custo)
+
+        Returns:
+            list: Contratos afetados, maior variação de margem primeiro:
+                [{'contrato_id', 'contrato', 'receita', 'custo_antes',
+                  'custo_depois', 'margem_antes', 'margem_depois', 'variacao'}]
+
+        Raises:
+            ValueError: Alteração inválida
+        """
+        vinculos = {}
+        custos = {}
+
+        def vinculos_de(recurso):
+            if recurso not in vinculos:
+                vinculos[recurso] = set(self.vinculos.get(recurso, ()))
+            return vinculos[recurso]
+
+        for alteracao in alteracoes:
+            if not isinstance(alteracao, dict):
+                raise ValueError('Cada alteração deve ser um objeto')
+            acao = alteracao.get('acao')
+            recurso = self._validar_recurso(alteracao.get('recurso'))
+            if acao == 'custo':
+                try:
+                    custo_mensal = Decimal(str(alteracao.get('custo_mensal', '0')))
+                except InvalidOperation:
+                    raise ValueError('custo_mensal inválido')
+                if not custo_mensal.is_finite():
+                    raise ValueError('custo_mensal inválido')
+                custos.setdefault(recurso, list(self.custos.get(recurso, ()))).append(custo_mensal)
+                continue
+
+            contrato_id = alteracao.get('contrato')
+            if not isinstance(contrato_id, int) or contrato_id not in self.contratos:
+                raise ValueError(f'Contrato {contrato_id} não está ativo na competência')
+            if recurso[0] not in CATEGORIAS_COMPARTILHADAS:
+                raise ValueError(f'Vínculos de {recurso[0]} seguem outro recurso e não podem ser alterados')
+
+            if acao == 'vincular':
+                vinculos_de(recurso).add(contrato_id)
+            elif acao == 'desvincular':
+                vinculos_de(recurso).discard(contrato_id)
+            elif acao == 'mover':
+                destino = self._validar_recurso(alteracao.get('destino'))
+                if destino[0] != recurso[0]:
+                    raise ValueError('Origem e destino devem ser da mesma categoria')
+                vinculos_de(recurso).discard(contrato_id)
+                vinculos_de(destino).add(contrato_id)
+            else:
+                raise ValueError(f'Ação desconhecida: {acao}')
+
+        afetados = self._recursos_afetados(set(vinculos) | set(custos))
+        # Camadas sobre o grafo base: nada é copiado nem alterado nele
+        vinculos_simulados = ChainMap(vinculos, self.vinculos)
+        custos_simulados = ChainMap(custos, self.custos)
+
+        delta = defaultdict(lambda: Decimal('0.00'))
+        for recurso in afetados:
+            for contrato_id, valor in self._alocar(recurso, self.custos, self.vinculos).items():
+                delta[contrato_id] -= valor
+            for contrato_id, valor in self._alocar(recurso, custos_simulados, vinculos_simulados).items():
+                delta[contrato_id] += valor
+
+        resultado = []
+        for contrato_id, variacao_custo in delta.items():
+            contrato = self.contratos[contrato_id]
+            custo_antes = self.custo_por_contrato.get(contrato_id, Decimal('0.00')) + contrato['despesas']
+            custo_depois = custo_antes + variacao_custo
+            resultado.append({
+                'contrato_id': contrato_id,
+                'contrato': contrato['nome'],
+                'receita': contrato['receita'],
+                'custo_antes': custo_antes,
+                'custo_depois': custo_depois,
+                'margem_antes': contrato['receita'] - custo_antes,
+                'margem_depois': contrato['receita'] - custo_depois,
+                'variacao': -variacao_custo,
+            })
+        resultado.sort(key=lambda item: (item['variacao'], item['contrato_id']))
+        return resultado
+
+    @staticmethod
+    def _validar_recurso(recurso) -> tuple:
+        try:
+            categoria, recurso_id = recurso
+        except (TypeError, ValueError):
+            raise ValueError('Recurso deve ser [categoria, id]')
+        # IDs existentes são inteiros; texto só com o marcador explícito,
+        # para "12" não virar um recurso fantasma ao lado da VPS 12
+        if isinstance(recurso_id, bool) or not isinstance(recurso_id, (int, str)):
+            raise ValueError('Recurso deve ser [categoria, id]')
+        if isinstance(recurso_id, str) and not (
+            recurso_id.startswith(PREFIXO_RECURSO_NOVO) and recurso_id[len(PREFIXO_RECURSO_NOVO):].strip()
+        ):
+            raise ValueError(
+                f'ID de recurso inválido: {recurso_id!r} (use o ID inteiro de um recurso '
+                f'existente ou "{PREFIXO_RECURSO_NOVO}<nome>" para um recurso novo)'
+            )
+        if categoria not in CATEGORIAS_RECURSO:
+            raise ValueError(f'Categoria inválida: {categoria}')
+        return categoria, recurso_id
@@ -5,16 +5,27 @@ Regras:
 - Não permitir alteração de InfraCost se houver snapshot posterior
 - Não permitir exclusão de snapshots
 - Não permitir alteração de período fechado
+- Manter o livro consolidado de custos (CustoInfra) em sincronia
+- Invalidar o cache do dashboard quando os dados lidos por ele mudarem
 """
-from django.db.models.signals import pre_save, pre_delete
+from django.db import transaction
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
-from infra.financeiro.models import PeriodoFinanceiro, ContratoSnapshot
-from infra.dominios.models import DomainCost
-from infra.hosting.models import HostingCost
-from infra.vps.models import VPSCost
-from infra.backups.models import VPSBackupCost
-from infra.emails.models import DomainEmailCost
+from infra.financeiro.models import PeriodoFinanceiro, ContratoSnapshot, DespesaAdicional
+from infra.financeiro.services.cache_dashboard import invalidar_dashboard
+from infra.financeiro.services.rateio import periodos_fechados_do_custo
+from infra.financeiro.services.livro_custos import (
+    MODELOS_CUSTO, RECURSOS_CUSTO, remover_custo, sincronizar_custo, sincronizar_recurso
+)
+from infra.dominios.models import Dominio, DomainCost
+from infra.hosting.models import Hosting, HostingCost
+from infra.vps.models import VPS, VPSContrato, VPSCost
+from infra.backups.models import VPSBackup, VPSBackupCost
+from infra.emails.models import DomainEmail, DomainEmailCost
+from invoices.models import Invoice, InvoiceContrato
+from contratos.models import Contrato
+from clientes.models import Cliente
 
 
 @receiver(pre_save, sender=PeriodoFinanceiro)
@@ -52,54 +63,180 @@ def validar_custo_com_snapshot(cost_instance, model_name):
     cost_original = cost_instance.__class__.objects.get(pk=cost_instance.pk)
     
     # Se não mudou nada relevante, permite
-    if (cost_original.valor_total == cost_instance.valor_total and
+    mesmos_valores = (
+        cost_original.valor_total == cost_instance.valor_total and
         cost_original.periodo_meses == cost_instance.periodo_meses and
-        cost_original.data_inicio == cost_instance.data_inicio and
-        cost_original.data_fim == cost_instance.data_fim):
+        cost_original.data_inicio == cost_instance.data_inicio
+    )
+    if mesmos_valores and cost_original.data_fim == cost_instance.data_fim:
         return
     
     # Verificar se há snapshots posteriores à data_inicio
-    from infra.financeiro.models import PeriodoFinanceiro
-    from datetime import date
-    
-    periodos_fechados = PeriodoFinanceiro.objects.filter(
-        fechado=True
+    periodos_fechados = list(PeriodoFinanceiro.objects.filter(fechado=True))
+    periodos_antes = periodos_fechados_do_custo(
+        cost_original.data_inicio, cost_original.data_fim, periodos_fechados
+    )
+    periodos_depois = periodos_fechados_do_custo(
+        cost_instance.data_inicio, cost_instance.data_fim, periodos_fechados
     )
     
-    for periodo in periodos_fechados:
-        primeiro_dia_periodo = date(periodo.ano, periodo.mes, 1)
-        
-        # Se o custo estava ativo nesse período, não pode alterar
-        if (cost_instance.data_inicio <= primeiro_dia_periodo and
-            (cost_instance.data_fim is None or cost_instance.data_fim >= primeiro_dia_periodo)):
-            
-            raise ValidationError(
-                f"Não é possível alterar este custo pois há períodos fechados "
-                f"que dependem dele ({periodo}). Crie um novo registro de custo "
-                f"com data_inicio futura."
-            )
+    # Encerrar o custo (alterar só data_fim) é permitido se ele continua
+    # valendo nos mesmos períodos fechados
+    if mesmos_valores and periodos_antes == periodos_depois:
+        return
+    
+    # Se o custo estava ativo em algum período fechado, não pode alterar
+    periodos_afetados = periodos_depois or periodos_antes
+    if periodos_afetados:
+        raise ValidationError(
+            f"Não é possível alterar este custo pois há períodos fechados "
+            f"que dependem dele ({periodos_afetados[0]}). Crie um novo registro de custo "
+            f"com data_inicio futura."
+        )
+
+
+def validar_sobreposicao_ao_salvar(cost_instance):
+    """
+    Rejeita vigência sobreposta quando o save cria o custo ou altera
+    vigência, status ou recurso.
+
+    Outras edições (ex: vencimento na renovação) passam mesmo em custos
+    já sobrepostos antes da validação; `listar_custos_sobrepostos` lista
+    esses casos para correção.
+    """
+    campos = ['data_inicio', 'data_fim', 'ativo', f'{cost_instance.campo_recurso}_id']
+    if cost_instance.pk:
+        original = cost_instance.__class__.objects.filter(pk=cost_instance.pk).values(*campos).first()
+        if original and all(original[campo] == getattr(cost_instance, campo) for campo in campos):
+            return
+    cost_instance.validar_sobreposicao()
 
 
 @receiver(pre_save, sender=DomainCost)
 def validar_domain_cost(sender, instance, **kwargs):
     validar_custo_com_snapshot(instance, 'DomainCost')
+    validar_sobreposicao_ao_salvar(instance)
 
 
 @receiver(pre_save, sender=HostingCost)
 def validar_hosting_cost(sender, instance, **kwargs):
     validar_custo_com_snapshot(instance, 'HostingCost')
+    validar_sobreposicao_ao_salvar(instance)
 
 
 @receiver(pre_save, sender=VPSCost)
 def validar_vps_cost(sender, instance, **kwargs):
     validar_custo_com_snapshot(instance, 'VPSCost')
+    validar_sobreposicao_ao_salvar(instance)
 
 
 @receiver(pre_save, sender=VPSBackupCost)
 def validar_backup_cost(sender, instance, **kwargs):
     validar_custo_com_snapshot(instance, 'VPSBackupCost')
+    validar_sobreposicao_ao_salvar(instance)
 
 
 @receiver(pre_save, sender=DomainEmailCost)
 def validar_email_cost(sender, instance, **kwargs):
     validar_custo_com_snapshot(instance, 'DomainEmailCost')
+    validar_sobreposicao_ao_salvar(instance)
+
+
+# ========================================
+# LIVRO CONSOLIDADO DE CUSTOS
+# ========================================
+
+def sincronizar_livro_custo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return  # loaddata: o livro é reconstruído pelo comando
+    sincronizar_custo(instance)
+
+
+def remover_livro_custo(sender, instance, **kwargs):
+    remover_custo(instance)
+
+
+def sincronizar_livro_recurso(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return  # recurso novo ainda não tem custos
+    sincronizar_recurso(instance)
+
+
+for modelo in MODELOS_CUSTO:
+    post_save.connect(
+        sincronizar_livro_custo,
+        sender=modelo,
+        dispatch_uid=f'livro_custos_save_{modelo._meta.label_lower}',
+    )
+    post_delete.connect(
+        remover_livro_custo,
+        sender=modelo,
+        dispatch_uid=f'livro_custos_delete_{modelo._meta.label_lower}',
+    )
+
+for modelo in RECURSOS_CUSTO:
+    post_save.connect(
+        sincronizar_livro_recurso,
+        sender=modelo,
+        dispatch_uid=f'livro_custos_recurso_{modelo._meta.label_lower}',
+    )
+
+
+# ========================================
+# INVALIDAÇÃO DO CACHE DO DASHBOARD
+# ========================================
+
+# Models lidos pelas seções em cache do dashboard.
+#
+# Fora da lista, gravados em lote (bulk_create/update não disparam signals),
+# com invalidar_dashboard chamado explicitamente por quem grava:
+#   ContratoSnapshot/ContratoSnapshotItem -> fechar_periodo (PeriodoFinanceiro)
+#   ContratoSnapshotMetrica -> calcular_metricas_periodo
+#   ContratoAnomalia -> detectar_anomalias_periodo
+#   CustoInfra -> signals de custo, importar_custos, reconstruir_livro
+#   Invoice/MessageQueue em massa -> invoices.services.acoes_em_massa
+# MessageQueue não entra na lista: muda a cada envio, e a contagem de
+# pendentes do dashboard tolera o atraso até a próxima invalidação.
+MODELOS_DASHBOARD = [
+    Invoice,
+    InvoiceContrato,
+    DespesaAdicional,
+    PeriodoFinanceiro,
+    DomainCost,
+    HostingCost,
+    VPSCost,
+    VPSBackupCost,
+    DomainEmailCost,
+    Dominio,
+    Hosting,
+    VPS,
+    VPSContrato,
+    VPSBackup,
+    DomainEmail,
+    Contrato,
+    Cliente,
+]
+
+
+def invalidar_dashboard_ao_alterar(sender, **kwargs):
+    """
+    Incrementa a versão do cache após o commit, quando as linhas
+    relacionadas (ex: itens em bulk_create) já estão visíveis.
+    """
+    transaction.on_commit(invalidar_dashboard)
+
+
+for modelo in MODELOS_DASHBOARD:
+    for nome, sinal in (('save', post_save), ('delete', post_delete)):
+        sinal.connect(
+            invalidar_dashboard_ao_alterar,
+            sender=modelo,
+            dispatch_uid=f'dashboard_cache_{nome}_{modelo._meta.label_lower}',
+        )
+
+for modelo in (Dominio, Hosting):
+    m2m_changed.connect(
+        invalidar_dashboard_ao_alterar,
+        sender=modelo.contratos.through,
+        dispatch_uid=f'dashboard_cache_m2m_{modelo._meta.label_lower}',
+    )
@@ -1,3 +1,1435 @@
-from django.test import TestCase
+import io
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from openpyxl import Workbook
+
+from clientes.models import Cliente
+from contratos.models import Contrato
+from infra.dominios.models import Dominio, DomainCost
+from infra.emails.models import DomainEmail, DomainEmailCost
+from infra.financeiro.models import (
+    ContratoAnomalia,
+    ContratoSnapshot,
+    ContratoSnapshotItem,
+    ContratoSnapshotMetrica,
+    CustoInfra,
+    DespesaAdicional,
+    PeriodoFinanceiro,
+)
+from infra.financeiro.services import (
+    calcular_metricas_periodo,
+    contratos_por_recurso,
+    custo_mensal_vigente,
+    custo_vigente,
+    detectar_anomalias_periodo,
+    fechar_periodo,
+    reconstruir_livro,
+)
+from infra.backups.models import VPSBackup, VPSBackupCost
+from infra.financeiro.services.atribuicao_contrato import atribuicao_em_cache, atribuir_custos_contrato
+from infra.financeiro.services.cache_dashboard import secao_em_cache, versao_dados
+from infra.financeiro.services.importacao_custos import importar_custos, ler_planilha
+from infra.financeiro.services.fechamento_periodo import recalcular_periodo
+from infra.hosting.models import Hosting, HostingCost
+from infra.financeiro.services.calendario_vencimentos import vencimentos_entre
+from infra.financeiro.services.dashboard_service import DashboardService
+from infra.vps.models import VPS, VPSContrato, VPSCost
+
+
+class DashboardSnapshotsTests(TestCase):
+    def setUp(self):
+        self.periodos = [
+            PeriodoFinanceiro.objects.create(mes=mes, ano=2026, fechado=True)
+            for mes in (1, 2, 3)
+        ]
+        self.contratos = []
+        for indice in range(4):
+            cliente = Cliente.objects.create(
+                nome=f'Cliente {indice}',
+                email=f'cliente-analise-{indice}@example.com',
+                tipo='pessoa_juridica',
+            )
+            contrato = Contrato.objects.create(
+                cliente=cliente,
+                nome=f'Contrato {indice}',
+                valor_mensal=Decimal('100.00'),
+                data_inicio=date(2025, 1, 1),
+            )
+            self.contratos.append(contrato)
+            for ordem, periodo in enumerate(self.periodos):
+                margem = Decimal(10 * indice + ordem)
+                ContratoSnapshot.objects.create(
+                    contrato=contrato,
+                    periodo=periodo,
+                    receita=Decimal('100.00'),
+                    custo_total=Decimal('100.00') - margem,
+                    margem=margem,
+                    margem_percentual=margem,
+                )
+
+    def test_analise_contratos_usa_numero_fixo_de_queries(self):
+        with self.assertNumQueries(2):
+            resultado = DashboardService().get_analise_contratos(limit=10)
+
+        self.assertEqual(len(resultado), 4)
+        self.assertEqual(resultado[0]['contrato'], self.contratos[-1])
+        self.assertEqual([m['mes'] for m in resultado[0]['meses']], ['01/2026', '02/2026', '03/2026'])
+        self.assertEqual(resultado[0]['tendencia'], '↑')
+        self.assertEqual(resultado[0]['margem_media'], Decimal('31'))
+
+    def test_analise_contratos_respeita_limite(self):
+        resultado = DashboardService().get_analise_contratos(limit=2)
+
+        self.assertEqual([r['contrato'] for r in resultado], self.contratos[:1:-1])
+
+    def test_snapshot_herda_competencia_do_periodo(self):
+        snapshot = ContratoSnapshot.objects.filter(periodo=self.periodos[1]).first()
+
+        self.assertEqual(snapshot.competencia, date(2026, 2, 1))
+
+    def test_evolucao_mensal_agrega_em_uma_query(self):
+        with self.assertNumQueries(2):
+            evolucao = DashboardService().get_evolucao_mensal(meses=12)
+
+        self.assertEqual([e['mes'] for e in evolucao], ['01/2026', '02/2026', '03/2026'])
+        self.assertEqual(evolucao[0]['receita'], Decimal('400.00'))
+        self.assertEqual(evolucao[0]['margem'], Decimal('60'))
+
+    def test_colunas_do_admin_vem_de_anotacoes(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+
+        # Ordenado pela margem total, decrescente (6ª coluna)
+        resposta = self.client.get('/admin/financeiro/periodofinanceiro/?o=-6')
+        conteudo = resposta.content.decode()
+        self.assertContains(resposta, 'R$ 340.00')
+        self.assertLess(conteudo.index('03/2026'), conteudo.index('01/2026'))
+
+        resposta = self.client.get(f'/admin/financeiro/periodofinanceiro/{self.periodos[0].id}/change/')
+        self.assertContains(resposta, '15.0%')
+
+        with CaptureQueriesContext(connection) as poucas:
+            self.client.get('/admin/contratos/contrato/?o=-7')
+        Contrato.objects.create(
+            cliente=self.contratos[0].cliente, nome='Sem snapshots',
+            valor_mensal=Decimal('10.00'), data_inicio=date(2025, 1, 1),
+        )
+        with CaptureQueriesContext(connection) as muitas:
+            resposta = self.client.get('/admin/contratos/contrato/?o=-7')
+        conteudo = resposta.content.decode()
+        self.assertEqual(len(poucas), len(muitas))
+        self.assertContains(resposta, 'R$ 69.00')
+        self.assertContains(resposta, 'Sem dados')
+        self.assertLess(conteudo.index('R$ 99.00'), conteudo.index('R$ 69.00'))
+
+        resposta = self.client.get(f'/admin/contratos/contrato/{self.contratos[3].id}/change/')
+        self.assertContains(resposta, '31.0%')
+
+
+class FechamentoPeriodoTestMixin:
+    """Cenário com VPS compartilhada, domínio, email e despesa adicional."""
+
+    def criar_cenario(self):
+        self.cliente = Cliente.objects.create(
+            nome='Cliente Infra',
+            email='cliente-infra@example.com',
+            tipo='pessoa_juridica',
+        )
+        self.contrato_a = Contrato.objects.create(
+            cliente=self.cliente,
+            nome='Site',
+            valor_mensal=Decimal('300.00'),
+            data_inicio=date(2025, 1, 1),
+        )
+        self.contrato_b = Contrato.objects.create(
+            cliente=self.cliente,
+            nome='Sistema',
+            valor_mensal=Decimal('500.00'),
+            data_inicio=date(2025, 1, 1),
+        )
+
+        self.vps = VPS.objects.create(nome='vps-01', fornecedor='Hetzner')
+        for contrato in (self.contrato_a, self.contrato_b):
+            VPSContrato.objects.create(vps=self.vps, contrato=contrato, data_inicio=date(2025, 1, 1))
+        VPSCost.objects.create(
+            vps=self.vps,
+            valor_total=Decimal('100.00'),
+            periodo_meses=1,
+            data_inicio=date(2025, 1, 1),
+            vencimento=date(2026, 12, 5),
+        )
+
+        self.dominio = Dominio.objects.create(nome='cliente.com.br', fornecedor='Registro.br')
+        self.dominio.contratos.add(self.contrato_a)
+        DomainCost.objects.create(
+            domain=self.dominio,
+            valor_total=Decimal('120.00'),
+            periodo_meses=12,
+            data_inicio=date(2025, 1, 1),
+            vencimento=date(2026, 12, 20),
+        )
+
+        self.email = DomainEmail.objects.create(
+            dominio=self.dominio,
+            contrato=self.contrato_b,
+            fornecedor='Zoho',
+        )
+        DomainEmailCost.objects.create(
+            email=self.email,
+            valor_total=Decimal('30.00'),
+            periodo_meses=1,
+            data_inicio=date(2025, 1, 1),
+            vencimento=date(2026, 12, 10),
+        )
+
+        DespesaAdicional.objects.create(
+            contrato=self.contrato_b,
+            descricao='Suporte emergencial',
+            valor=Decimal('40.00'),
+            mes_referencia=1,
+            ano_referencia=2026,
+        )
+
+        self.periodo = PeriodoFinanceiro.objects.create(mes=1, ano=2026)
+
+
+class FechamentoPeriodoTests(FechamentoPeriodoTestMixin, TestCase):
+    def setUp(self):
+        self.criar_cenario()
+
+    def test_fechamento_grava_itens_normalizados(self):
+        fechar_periodo(self.periodo.id, 'teste')
+
+        snapshot_b = ContratoSnapshot.objects.get(contrato=self.contrato_b, periodo=self.periodo)
+        self.assertEqual(snapshot_b.custo_total, Decimal('120.00'))
+        self.assertEqual(snapshot_b.competencia, date(2026, 1, 1))
+
+        itens_b = ContratoSnapshotItem.objects.filter(snapshot=snapshot_b)
+        self.assertEqual(
+            sorted(itens_b.values_list('categoria', 'custo')),
+            [
+                ('despesas_adicionais', Decimal('40.00')),
+                ('emails', Decimal('30.00')),
+                ('vps', Decimal('50.00')),
+            ],
+        )
+        item_vps = itens_b.get(categoria='vps')
+        self.assertEqual(item_vps.recurso_tipo, 'vps.vps')
+        self.assertEqual(item_vps.recurso_id, self.vps.id)
+        self.assertEqual(item_vps.custo_total, Decimal('100.00'))
+        self.assertEqual(item_vps.rateio, 2)
+
+    def test_contratos_por_recurso_consulta_itens(self):
+        fechar_periodo(self.periodo.id, 'teste')
+
+        contratos = list(contratos_por_recurso('vps.vps', self.vps.id, desde=date(2026, 1, 1)))
+
+        self.assertEqual(
+            sorted(c['contrato_id'] for c in contratos),
+            sorted([self.contrato_a.id, self.contrato_b.id]),
+        )
+        self.assertTrue(all(c['custo'] == Decimal('50.00') for c in contratos))
+
+    def test_custos_por_recurso_com_rotulo_da_categoria(self):
+        fechar_periodo(self.periodo.id, 'teste')
+
+        recursos = DashboardService().get_custos_por_recurso()
+
+        self.assertEqual(
+            {r['categoria']: r['categoria_display'] for r in recursos},
+            {'vps': 'VPS', 'dominios': 'Domínios', 'emails': 'Emails'},
+        )
+
+    def test_fechamento_calcula_metricas_e_lista_prejuizo(self):
+        DespesaAdicional.objects.create(
+            contrato=self.contrato_a,
+            descricao='Licença anual',
+            valor=Decimal('1000.00'),
+            mes_referencia=1,
+            ano_referencia=2026,
+        )
+
+        fechar_periodo(self.periodo.id, 'teste')
+
+        metrica_a = ContratoSnapshotMetrica.objects.get(contrato=self.contrato_a)
+        self.assertEqual(metrica_a.competencia, date(2026, 1, 1))
+        self.assertEqual(metrica_a.meses_prejuizo_consecutivos, 1)
+
+        prejuizo = DashboardService().get_contratos_em_prejuizo()
+        self.assertEqual([p['contrato'] for p in prejuizo], [self.contrato_a, self.contrato_b])
+
+
+class InfraAdminCustoAtualTests(FechamentoPeriodoTestMixin, TestCase):
+    def setUp(self):
+        self.criar_cenario()
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+
+    def _criar_vps(self, nome, custo=None):
+        vps = VPS.objects.create(nome=nome, fornecedor='Contabo')
+        if custo is not None:
+            VPSCost.objects.create(
+                vps=vps, valor_total=custo, periodo_meses=1,
+                data_inicio=date(2025, 1, 1), vencimento=date(2026, 12, 1),
+            )
+            # Custo mais novo, mas inativo: não é o custo atual
+            VPSCost.objects.create(
+                vps=vps, valor_total=custo * 10, periodo_meses=1, ativo=False,
+                data_inicio=date(2026, 1, 1), vencimento=date(2026, 12, 1),
+            )
+        return vps
+
+    def test_changelist_de_vps_em_numero_fixo_de_queries(self):
+        self._criar_vps('vps-02', Decimal('40.00'))
+        with CaptureQueriesContext(connection) as poucas:
+            self.client.get('/admin/vps/vps/')
+        for indice in range(5):
+            self._criar_vps(f'vps-extra-{indice}', Decimal('300.00'))
+        with CaptureQueriesContext(connection) as muitas:
+            resposta = self.client.get('/admin/vps/vps/?o=-5')
+
+        self.assertEqual(len(poucas), len(muitas))
+        conteudo = resposta.content.decode()
+        self.assertContains(resposta, 'R$ 40.00/mês')
+        self.assertNotContains(resposta, 'R$ 400.00/mês')
+        self.assertLess(conteudo.index('vps-extra-0'), conteudo.index('vps-01'))
+        self.assertLess(conteudo.index('vps-01'), conteudo.index('vps-02'))
+
+    def test_filtros_de_custo_e_contratos(self):
+        self._criar_vps('vps-sem-custo')
+        self._criar_vps('vps-barata', Decimal('40.00'))
+
+        resposta = self.client.get('/admin/vps/vps/?custo_atual=sem_custo')
+        self.assertContains(resposta, 'vps-sem-custo')
+        self.assertNotContains(resposta, 'vps-barata')
+
+        resposta = self.client.get('/admin/vps/vps/?custo_atual=ate_50&vinculado=nao')
+        self.assertContains(resposta, 'vps-barata')
+        self.assertNotContains(resposta, 'vps-01')
+
+        resposta = self.client.get('/admin/vps/vps/?vinculado=sim')
+        self.assertContains(resposta, 'vps-01')
+        self.assertNotContains(resposta, 'vps-barata')
+
+        resposta = self.client.get('/admin/dominios/dominio/')
+        self.assertContains(resposta, 'R$ 10.00/mês')
+        self.assertContains(resposta, 'R$ 120.00')
+        for url in ('/admin/hosting/hosting/', '/admin/backups/vpsbackup/', '/admin/emails/domainemail/'):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class AuditoriaPeriodosTests(FechamentoPeriodoTestMixin, TestCase):
+    def setUp(self):
+        self.criar_cenario()
+        fechar_periodo(self.periodo.id, 'teste')
+
+    def test_periodo_sem_alteracao_nao_tem_divergencias(self):
+        from infra.financeiro.services.auditoria import auditar_periodos
+
+        [resultado] = auditar_periodos([self.periodo.id])
+
+        self.assertEqual(resultado['contratos'], 2)
+        self.assertEqual(resultado['divergencias'], [])
+
+    def test_custo_alterado_gera_divergencia_sem_alterar_snapshot(self):
+        from infra.financeiro.services.auditoria import auditar_periodos
+
+        VPSCost.objects.filter(vps=self.vps).update(valor_total=Decimal('160.00'))
+
+        [resultado] = auditar_periodos([self.periodo.id])
+
+        campos = {(d['contrato_id'], d['campo']) for d in resultado['divergencias']}
+        self.assertIn((self.contrato_a.id, 'custo_vps'), campos)
+        self.assertIn((self.contrato_b.id, 'detalhamento.vps'), campos)
+        snapshot_a = ContratoSnapshot.objects.get(contrato=self.contrato_a, periodo=self.periodo)
+        self.assertEqual(snapshot_a.custo_vps, Decimal('50.00'))
+
+    def test_auditoria_em_paralelo_com_dois_workers(self):
+        from unittest import mock
+
+        from app.processos import inicializar_django
+        from infra.financeiro.services.auditoria import auditar_periodos
+
+        VPSCost.objects.filter(vps=self.vps).update(valor_total=Decimal('160.00'))
+
+        # Workers reais não enxergam os dados da transação do teste (nem o
+        # banco em memória, sob spawn): o pool executa no próprio processo
+        with mock.patch('infra.financeiro.services.auditoria.ProcessPoolExecutor') as pool_mock:
+            executor = pool_mock.return_value.__enter__.return_value
+            executor.map.side_effect = map
+            resultados = auditar_periodos([self.periodo.id, self.periodo.id], workers=2)
+
+        pool_mock.assert_called_once_with(max_workers=2, initializer=inicializar_django)
+        self.assertEqual(len(resultados), 2)
+        for resultado in resultados:
+            self.assertEqual(resultado['contratos'], 2)
+            self.assertIn('custo_vps', {d['campo'] for d in resultado['divergencias']})
+
+    def test_worker_spawn_configura_django(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+
+        from app.processos import inicializar_django
+
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=get_context('spawn'), initializer=inicializar_django
+        ) as executor:
+            self.assertEqual(executor.submit(_apps_carregados).result(), True)
+
+
+def _apps_carregados():
+    """Executada no worker: importável só depois do initializer."""
+    from django.apps import apps
+    return apps.ready
+
+
+class MetricasContratoTests(TestCase):
+    def test_calcula_medias_tendencia_e_prejuizo_consecutivo(self):
+        from infra.financeiro.services.metricas import calcular_metricas_contrato
+
+        # (indice_mes, receita, custo, margem): 4 meses, últimos 2 com prejuízo
+        historico = [
+            (100, Decimal('100'), Decimal('70'), Decimal('30')),
+            (101, Decimal('100'), Decimal('90'), Decimal('10')),
+            (102, Decimal('100'), Decimal('110'), Decimal('-10')),
+            (103, Decimal('100'), Decimal('130'), Decimal('-30')),
+        ]
+
+        metricas = calcular_metricas_contrato(historico, mes_final=103)
+
+        self.assertEqual(metricas['media_margem_3m'], Decimal('-10.00'))
+        self.assertEqual(metricas['media_margem_12m'], Decimal('0.00'))
+        self.assertEqual(metricas['media_custo_6m'], Decimal('100.00'))
+        self.assertEqual(metricas['tendencia_margem'], Decimal('-20.00'))
+        self.assertEqual(metricas['meses_prejuizo_consecutivos'], 2)
+
+    def test_prejuizo_consecutivo_interrompido_por_lacuna(self):
+        from infra.financeiro.services.metricas import calcular_metricas_contrato
+
+        historico = [
+            (100, Decimal('0'), Decimal('10'), Decimal('-10')),
+            (102, Decimal('0'), Decimal('10'), Decimal('-10')),
+        ]
+
+        metricas = calcular_metricas_contrato(historico, mes_final=102)
+
+        self.assertEqual(metricas['meses_prejuizo_consecutivos'], 1)
+
+
+class AnomaliasTests(TestCase):
+    def test_detecta_zscore_e_salto_por_metrica(self):
+        from infra.financeiro.services.anomalias import METRICAS, detectar_anomalias
+
+        def valores(custo_vps, receita=Decimal('100.00')):
+            linha = dict.fromkeys(METRICAS, Decimal('0.00'))
+            linha.update(receita=receita, custo_vps=custo_vps, custo_total=custo_vps, margem=receita - custo_vps)
+            return tuple(linha[metrica] for metrica in METRICAS)
+
+        historico = [
+            (indice, valores(Decimal('40.00') + indice % 2))
+            for indice in range(100, 106)
+        ] + [(106, valores(Decimal('90.00')))]
+
+        anomalias = detectar_anomalias(historico, mes_final=106)
+
+        encontradas = {(a['metrica'], a['tipo']) for a in anomalias}
+        self.assertIn(('custo_vps', 'zscore'), encontradas)
+        self.assertIn(('custo_vps', 'salto'), encontradas)
+        self.assertIn(('margem', 'salto'), encontradas)
+        self.assertNotIn(('receita', 'zscore'), encontradas)
+        salto = next(a for a in anomalias if a['metrica'] == 'custo_vps' and a['tipo'] == 'salto')
+        self.assertEqual(salto['referencia'], Decimal('41.00'))
+        self.assertEqual(salto['score'], Decimal('119.51'))
+
+        # Histórico estável: nada a apontar
+        self.assertEqual(detectar_anomalias(historico[:6], mes_final=105), [])
+
+    def test_anomalias_gravadas_e_lidas_pelo_dashboard(self):
+        from infra.financeiro.services.anomalias import detectar_anomalias_periodo
+
+        cliente = Cliente.objects.create(nome='Cliente A', email='anomalia@example.com', tipo='pessoa_juridica')
+        contrato = Contrato.objects.create(
+            cliente=cliente, nome='Contrato A', valor_mensal=Decimal('100.00'), data_inicio=date(2025, 1, 1)
+        )
+        for mes, custo in ((1, '40.00'), (2, '41.00'), (3, '40.00'), (4, '95.00')):
+            periodo = PeriodoFinanceiro.objects.create(mes=mes, ano=2026, fechado=True)
+            ContratoSnapshot.objects.create(
+                contrato=contrato,
+                periodo=periodo,
+                receita=Decimal('100.00'),
+                custo_vps=Decimal(custo),
+                custo_total=Decimal(custo),
+                margem=Decimal('100.00') - Decimal(custo),
+                margem_percentual=Decimal('0.00'),
+            )
+
+        self.assertGreater(detectar_anomalias_periodo(periodo), 0)
+        total = ContratoAnomalia.objects.filter(periodo=periodo).count()
+        self.assertEqual(detectar_anomalias_periodo(periodo), total)
+
+        with self.assertNumQueries(3):
+            alertas = DashboardService().get_alertas_anomalia()
+
+        titulos = [alerta['titulo'] for alerta in alertas]
+        self.assertIn(f'Anomalia: {contrato}', titulos)
+
+
+class DashboardCacheTests(FechamentoPeriodoTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.criar_cenario()
+
+    def test_secao_reutiliza_cache_ate_dados_mudarem(self):
+        chamadas = []
+
+        def calcular():
+            chamadas.append(1)
+            return {'total': len(chamadas)}
+
+        self.assertEqual(secao_em_cache('teste', calcular), {'total': 1})
+        self.assertEqual(secao_em_cache('teste', calcular), {'total': 1})
+
+        versao = versao_dados()
+        with self.captureOnCommitCallbacks(execute=True):
+            DespesaAdicional.objects.create(
+                contrato=self.contrato_a,
+                descricao='Migração',
+                valor=Decimal('10.00'),
+                mes_referencia=1,
+                ano_referencia=2026,
+            )
+
+        self.assertGreater(versao_dados(), versao)
+        self.assertEqual(secao_em_cache('teste', calcular), {'total': 2})
+
+    def test_contador_despejado_nao_reutiliza_versoes(self):
+        from infra.financeiro.services.cache_dashboard import CHAVE_VERSAO, invalidar_dashboard
+
+        versao = versao_dados()
+        invalidar_dashboard()
+        invalidar_dashboard()
+        usada = versao_dados()
+
+        cache.delete(CHAVE_VERSAO)
+
+        self.assertGreater(versao_dados(), usada)
+        self.assertGreater(usada, versao)
+
+    def test_fechamento_invalida_apos_commit(self):
+        versao = versao_dados()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            fechar_periodo(self.periodo.id, 'teste')
+
+        self.assertGreater(versao_dados(), versao)
+
+    def test_recalculo_de_metricas_e_anomalias_invalida(self):
+        fechar_periodo(self.periodo.id, 'teste')
+        self.periodo.refresh_from_db()
+
+        for recalcular in (calcular_metricas_periodo, detectar_anomalias_periodo):
+            versao = versao_dados()
+            with self.captureOnCommitCallbacks(execute=True):
+                recalcular(self.periodo)
+            self.assertGreater(versao_dados(), versao, recalcular.__name__)
+
+    def test_deploy_exige_cache_compartilhado(self):
+        from infra.financeiro.checks import verificar_cache_compartilhado
+
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+        with override_settings(CACHES=locmem):
+            [erro] = verificar_cache_compartilhado(None)
+        with override_settings(CACHES=redis):
+            self.assertEqual(verificar_cache_compartilhado(None), [])
+
+        self.assertEqual(erro.id, 'financeiro.E001')
+
+    def test_segunda_carga_da_secao_vem_do_cache(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+        fechar_periodo(self.periodo.id, 'teste')
+
+        primeira = self.client.get('/financeiro/dashboard/secoes/evolucao/').json()
+        with CaptureQueriesContext(connection) as queries:
+            segunda = self.client.get('/financeiro/dashboard/secoes/evolucao/')
+
+        self.assertFalse(primeira['cache'])
+        self.assertTrue(segunda.json()['cache'])
+        self.assertEqual(segunda.json()['html'], primeira['html'])
+        self.assertIn('secao;dur=', segunda['Server-Timing'])
+        # Apenas sessão e usuário
+        self.assertEqual(len(queries), 2)
+
+
+class DashboardSecoesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+
+    def test_pagina_e_esqueleto_sem_consultas_de_dados(self):
+        with CaptureQueriesContext(connection) as queries:
+            resposta = self.client.get('/financeiro/dashboard/')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, 'data-secao="invoices"')
+        tabelas = ('invoices_', 'financeiro_', 'contratos_')
+        self.assertFalse([q for q in queries if any(t in q['sql'] for t in tabelas)])
+
+    def test_todas_as_secoes_respondem(self):
+        from infra.financeiro.views import SECOES_DASHBOARD
+
+        for nome in SECOES_DASHBOARD:
+            resposta = self.client.get(f'/financeiro/dashboard/secoes/{nome}/')
+            self.assertEqual(resposta.status_code, 200, nome)
+            self.assertEqual(resposta.json()['secao'], nome)
+
+        self.assertEqual(self.client.get('/financeiro/dashboard/secoes/inexistente/').status_code, 404)
+
+    def test_status_invoices_paginado_no_servidor(self):
+        from invoices.models import Invoice
+
+        hoje = date.today()
+        cliente = Cliente.objects.create(
+            nome='Cliente Invoices',
+            email='cliente-invoices@example.com',
+            tipo='pessoa_juridica',
+        )
+        Invoice.objects.bulk_create([
+            Invoice(
+                cliente=cliente,
+                mes_referencia=hoje.month,
+                ano_referencia=hoje.year,
+                valor_total=Decimal('10.00'),
+                vencimento=hoje,
+                status='pago' if indice % 2 else 'pendente',
+            )
+            for indice in range(30)
+        ])
+
+        with self.assertNumQueries(4):
+            status = DashboardService().get_status_invoices(pagina=2, por_pagina=25)
+
+        self.assertEqual(status['mes_atual']['qtd_total'], 30)
+        self.assertEqual(status['mes_atual']['qtd_pagos'], 15)
+        self.assertEqual(status['mes_atual']['pago'], Decimal('150.00'))
+        self.assertEqual(len(status['mes_atual']['invoices']), 5)
+        self.assertEqual(status['paginacao']['total_paginas'], 2)
+        self.assertFalse(status['paginacao']['tem_proxima'])
+
+        status = DashboardService().get_status_invoices(pagina=1, por_pagina=1000)
+        self.assertEqual(len(status['mes_atual']['invoices']), 30)
+        self.assertEqual(status['paginacao']['por_pagina'], 100)
+
+    def test_grafico_responde_304_ate_dados_mudarem(self):
+        url = '/financeiro/dashboard/graficos/evolucao/'
+        resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('labels', resposta.json())
+        etag = resposta['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Cliente.objects.create(nome='Novo', email='novo@example.com', tipo='pessoa_fisica')
+
+        resposta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], etag)
+        self.assertEqual(self.client.get('/financeiro/dashboard/graficos/inexistente/').status_code, 404)
+
+
+class AgingRecebiveisTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hoje = date(2026, 5, 31)
+        self.cliente = Cliente.objects.create(nome='Devedor', email='devedor@example.com', tipo='pessoa_juridica')
+        outro = Cliente.objects.create(nome='Em Dia', email='emdia@example.com', tipo='pessoa_fisica')
+
+        from invoices.models import Invoice
+
+        def invoice(cliente, dias_atraso, valor, status='pendente'):
+            return Invoice(
+                cliente=cliente,
+                mes_referencia=5,
+                ano_referencia=2026,
+                valor_total=Decimal(valor),
+                vencimento=self.hoje - timedelta(days=dias_atraso),
+                status=status,
+            )
+
+        Invoice.objects.bulk_create([
+            invoice(self.cliente, 0, '10.00'),
+            invoice(self.cliente, 15, '20.00', status='atrasado'),
+            invoice(self.cliente, 16, '30.00', status='atrasado'),
+            invoice(self.cliente, 61, '40.00', status='atrasado'),
+            invoice(self.cliente, 90, '99.00', status='pago'),
+            invoice(outro, -5, '50.00'),
+        ])
+
+    def test_aging_agrupa_por_cliente_e_faixa_em_uma_query(self):
+        from infra.financeiro.services.contas_receber import aging_recebiveis
+
+        with self.assertNumQueries(1):
+            aging = aging_recebiveis(hoje=self.hoje)
+
+        devedor, em_dia = aging['clientes']
+        self.assertEqual(devedor['cliente'], 'Devedor')
+        self.assertEqual(devedor['valores'], [
+            Decimal('10.00'), Decimal('20.00'), Decimal('30.00'), Decimal('0.00'), Decimal('40.00')
+        ])
+        self.assertEqual(devedor['vencido'], Decimal('90.00'))
+        self.assertEqual(em_dia['a_vencer'], Decimal('50.00'))
+        self.assertEqual(aging['total']['total'], Decimal('150.00'))
+        self.assertEqual(aging['total']['qtd'], 5)
+
+    def test_exportacao_em_planilha(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+
+        resposta = self.client.get('/financeiro/contas-a-receber/aging.xlsx')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('aging_recebiveis_', resposta['Content-Disposition'])
+        self.assertEqual(self.client.get('/financeiro/dashboard/secoes/aging/').status_code, 200)
+
+
+class ReceitaRecorrenteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def criar_contrato(self, cliente, valor, inicio, fim=None):
+        return Contrato.objects.create(
+            cliente=cliente,
+            nome=f'Contrato {cliente.nome} {valor}',
+            valor_mensal=Decimal(valor),
+            data_inicio=inicio,
+            data_fim=fim,
+        )
+
+    def test_linha_do_tempo_classifica_movimentos_em_uma_query(self):
+        from infra.financeiro.services.receita_recorrente import linha_do_tempo_mrr
+
+        antigo = Cliente.objects.create(nome='Antigo', email='antigo@example.com', tipo='pessoa_juridica')
+        novo = Cliente.objects.create(nome='Novo', email='novo-mrr@example.com', tipo='pessoa_juridica')
+        saiu = Cliente.objects.create(nome='Saiu', email='saiu@example.com', tipo='pessoa_fisica')
+        interno = Cliente.objects.create(nome='Interno', email='interno@example.com', tipo='interno')
+
+        self.criar_contrato(antigo, '100.00', date(2025, 1, 10))
+        self.criar_contrato(antigo, '50.00', date(2026, 3, 5))  # expansão em março
+        self.criar_contrato(novo, '80.00', date(2026, 2, 1), date(2026, 2, 28))  # só fevereiro
+        self.criar_contrato(saiu, '30.00', date(2025, 6, 1), date(2026, 2, 15))
+        self.criar_contrato(interno, '0.00', date(2025, 1, 1))
+
+        with self.assertNumQueries(1):
+            linha = linha_do_tempo_mrr(meses=3, hoje=date(2026, 3, 20))
+
+        janeiro, fevereiro, marco = linha
+        self.assertEqual([m['mes'] for m in linha], ['01/2026', '02/2026', '03/2026'])
+        self.assertEqual(janeiro['mrr'], Decimal('130.00'))
+        self.assertEqual(janeiro['novo'], Decimal('0.00'))
+        self.assertEqual(fevereiro['mrr'], Decimal('210.00'))
+        self.assertEqual((fevereiro['novo'], fevereiro['clientes_novos']), (Decimal('80.00'), 1))
+        self.assertEqual(marco['mrr'], Decimal('150.00'))
+        self.assertEqual(marco['expansao'], Decimal('50.00'))
+        self.assertEqual(marco['churn'], Decimal('110.00'))
+        self.assertEqual((marco['clientes'], marco['clientes_churn']), (1, 2))
+
+    def test_grafico_mrr_em_colunas(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+
+        dados = self.client.get('/financeiro/dashboard/graficos/mrr/').json()
+
+        self.assertEqual(len(dados['labels']), 12)
+        self.assertEqual(len(dados['churn']), 12)
+        self.assertEqual(self.client.get('/financeiro/dashboard/secoes/mrr/').status_code, 200)
+
+
+class FluxoCaixaTests(TestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create(nome='Fluxo', email='fluxo@example.com', tipo='pessoa_juridica')
+        contrato = Contrato.objects.create(
+            cliente=cliente, nome='Mensal', valor_mensal=Decimal('100.00'), data_inicio=date(2025, 1, 1)
+        )
+        Contrato.objects.create(
+            cliente=cliente, nome='Encerrando', valor_mensal=Decimal('50.00'),
+            data_inicio=date(2025, 1, 1), data_fim=date(2026, 2, 10),
+        )
+        DespesaAdicional.objects.create(
+            contrato=contrato, descricao='Licença', valor=Decimal('5.00'), mes_referencia=4, ano_referencia=2026
+        )
+
+        def custo(origem_id, valor_total, periodo_meses, vencimento, data_fim=None):
+            CustoInfra.objects.create(
+                categoria='vps', origem_tipo='vps.vpscost', origem_id=origem_id,
+                recurso_tipo='vps.vps', recurso_id=origem_id, recurso_nome=f'VPS {origem_id}',
+                valor_total=Decimal(valor_total), periodo_meses=periodo_meses,
+                custo_mensal=Decimal(valor_total) / periodo_meses,
+                data_inicio=date(2025, 1, 1), data_fim=data_fim, vencimento=vencimento,
+            )
+
+        custo(1, '120.00', 12, date(2026, 3, 1))  # anual, renova em março
+        custo(2, '30.00', 1, date(2025, 12, 10), data_fim=date(2026, 6, 30))  # mensal, vencido
+
+    def test_projecao_por_vencimento_e_competencia(self):
+        from infra.financeiro.services.fluxo_caixa import projetar_fluxo_caixa
+
+        with self.assertNumQueries(3):
+            projecao = projetar_fluxo_caixa(meses=12, hoje=date(2026, 1, 15))
+
+        janeiro, fevereiro, marco, abril = projecao[:4]
+        self.assertEqual(len(projecao), 12)
+        self.assertEqual((janeiro['receita'], janeiro['saida_caixa'], janeiro['custo_competencia']),
+                         (Decimal('150.00'), Decimal('30.00'), Decimal('40.00')))
+        self.assertEqual(fevereiro['receita'], Decimal('150.00'))
+        self.assertEqual((marco['receita'], marco['saida_caixa']), (Decimal('100.00'), Decimal('150.00')))
+        self.assertEqual((abril['saida_caixa'], abril['custo_competencia']), (Decimal('35.00'), Decimal('45.00')))
+        self.assertEqual(projecao[6]['custo_competencia'], Decimal('10.00'))
+        self.assertEqual(projecao[-1]['saldo_acumulado'], sum(m['saldo_caixa'] for m in projecao))
+
+    def test_cenario_reajusta_a_partir_da_renovacao(self):
+        from infra.financeiro.services.fluxo_caixa import projetar_fluxo_caixa
+
+        projecao = projetar_fluxo_caixa(meses=12, hoje=date(2026, 1, 15), reajuste_custos=10, churn_mensal=10)
+
+        self.assertEqual(projecao[0]['saida_caixa'], Decimal('30.00'))
+        self.assertEqual(projecao[1]['saida_caixa'], Decimal('33.00'))
+        self.assertEqual(projecao[2]['saida_caixa'], Decimal('165.00'))
+        self.assertEqual(projecao[2]['custo_competencia'], Decimal('44.00'))
+        self.assertEqual(projecao[2]['receita'], Decimal('81.00'))
+
+    def test_endpoint_valida_parametros(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+
+        resposta = self.client.get('/financeiro/fluxo-caixa.json', {'meses': 6, 'reajuste_custos': '5'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json()['meses']), 6)
+        self.assertEqual(self.client.get('/financeiro/fluxo-caixa.json', {'churn_mensal': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/financeiro/fluxo-caixa.json', {'meses': 99}).status_code, 400)
+
+
+class LivroCustosTests(FechamentoPeriodoTestMixin, TestCase):
+    def setUp(self):
+        self.criar_cenario()
+
+    def test_signals_mantem_livro_sincronizado(self):
+        linha_vps = CustoInfra.objects.get(origem_tipo='vps.vpscost')
+        self.assertEqual(linha_vps.recurso_tipo, 'vps.vps')
+        self.assertEqual(linha_vps.recurso_id, self.vps.id)
+        self.assertEqual(linha_vps.custo_mensal, Decimal('100.00'))
+
+        self.vps.nome = 'vps-principal'
+        self.vps.save()
+        self.email.costs.get().delete()
+
+        linha_vps.refresh_from_db()
+        self.assertEqual(linha_vps.recurso_nome, 'vps-principal')
+        self.assertEqual(
+            sorted(CustoInfra.objects.values_list('categoria', flat=True)),
+            ['dominios', 'vps'],
+        )
+
+    def test_custo_mensal_vigente_em_uma_query(self):
+        with self.assertNumQueries(1):
+            total = custo_mensal_vigente(date(2026, 1, 1))
+
+        # VPS 100 + domínio 120/12 + email 30
+        self.assertEqual(total, Decimal('140.00'))
+        self.assertEqual(custo_mensal_vigente(date(2024, 12, 1)), Decimal('0.00'))
+
+    def test_reconstruir_livro_apos_update_em_massa(self):
+        VPSCost.objects.filter(vps=self.vps).update(valor_total=Decimal('160.00'))
+
+        self.assertEqual(reconstruir_livro(), 3)
+        self.assertEqual(custo_mensal_vigente(date(2026, 1, 1)), Decimal('200.00'))
+
+
+class VigenciaCustosTests(FechamentoPeriodoTestMixin, TestCase):
+    def setUp(self):
+        self.criar_cenario()
+        self.custo_antigo = self.vps.costs.get()
+        self.custo_antigo.data_fim = date(2026, 3, 31)
+        self.custo_antigo.save()
+        self.custo_novo = VPSCost.objects.create(
+            vps=self.vps,
+            valor_total=Decimal('130.00'),
+            periodo_meses=1,
+            data_inicio=date(2026, 4, 1),
+            vencimento=date(2026, 12, 5),
+        )
+
+    def test_custo_vigente_por_data(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(custo_vigente(self.vps, date(2026, 3, 31)), self.custo_antigo)
+        self.assertEqual(custo_vigente(self.vps, date(2026, 4, 1)), self.custo_novo)
+        self.assertIsNone(custo_vigente(self.vps, date(2024, 12, 31)))
+        self.assertEqual(
+            list(VPSCost.objects.vigentes(date(2026, 3, 1), date(2026, 4, 30)).order_by('data_inicio')),
+            [self.custo_antigo, self.custo_novo],
+        )
+
+    def test_clean_rejeita_vigencia_sobreposta(self):
+        sobreposto = VPSCost(
+            vps=self.vps,
+            valor_total=Decimal('90.00'),
+            periodo_meses=1,
+            data_inicio=date(2026, 3, 15),
+            data_fim=date(2026, 5, 31),
+            vencimento=date(2026, 12, 5),
+        )
+        with self.assertRaisesMessage(ValidationError, 'sobrepõe outro custo ativo'):
+            sobreposto.full_clean()
+
+        # Inativos e o próprio registro não contam
+        sobreposto.ativo = False
+        sobreposto.full_clean()
+        self.custo_novo.full_clean()
+
+    def test_save_rejeita_vigencia_sobreposta(self):
+        with self.assertRaisesMessage(ValidationError, 'sobrepõe outro custo ativo'):
+            VPSCost.objects.create(
+                vps=self.vps,
+                valor_total=Decimal('90.00'),
+                periodo_meses=1,
+                data_inicio=date(2026, 5, 1),
+                vencimento=date(2026, 12, 5),
+            )
+
+        # Reabrir o custo encerrado também cruzaria o novo
+        self.custo_antigo.data_fim = None
+        with self.assertRaisesMessage(ValidationError, 'sobrepõe outro custo ativo'):
+            self.custo_antigo.save()
+        self.assertEqual(VPSCost.objects.filter(vps=self.vps).count(), 2)
+
+    def test_sobreposicoes_antigas_sao_listadas_e_nao_bloqueiam_renovacao(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        # Cadastro anterior à validação (bulk_create não passa pelos signals)
+        [legado] = VPSCost.objects.bulk_create([VPSCost(
+            vps=self.vps,
+            valor_total=Decimal('140.00'),
+            periodo_meses=1,
+            data_inicio=date(2026, 6, 1),
+            vencimento=date(2026, 12, 5),
+        )])
+
+        saida = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '1 sobreposição'):
+            call_command('listar_custos_sobrepostos', stdout=saida)
+        self.assertIn(f'#{legado.pk} (01/06/2026 em aberto) sobrepõe #{self.custo_novo.pk}', saida.getvalue())
+
+        # Renovação (só vencimento) continua permitida; mudar a vigência não
+        legado.vencimento = date(2027, 1, 5)
+        legado.save()
+        legado.data_inicio = date(2026, 7, 1)
+        with self.assertRaisesMessage(ValidationError, 'sobrepõe outro custo ativo'):
+            legado.save()
+
+
+class ImportacaoCustosTests(FechamentoPeriodoTestMixin, TestCase):
+    CABECALHO = ['tipo', 'recurso', 'fornecedor', 'valor_total', 'periodo_meses', 'data_inicio', 'data_fim', 'vencimento']
+
+    def setUp(self):
+        self.criar_cenario()
+
+    def _xlsx(self, linhas):
+        planilha = Workbook()
+        planilha.active.append(self.CABECALHO)
+        for linha in linhas:
+            planilha.active.append(linha)
+        conteudo = io.BytesIO()
+        planilha.save(conteudo)
+        conteudo.seek(0)
+        return conteudo
+
+    def test_csv_em_simulacao_mostra_diff_sem_gravar(self):
+        arquivo = io.BytesIO(
+            'tipo;recurso;fornecedor;valor_total;periodo_meses;data_inicio;data_fim;vencimento\n'
+            'VPS;VPS-01;hetzner;130,00;1;01/04/2026;;05/04/2026\n'
+            'hosting;inexistente;X;10;1;2026-04-01;;2026-04-01\n'
+            'email;cliente.com.br;Zoho;abc;1;2026-04-01;;2026-04-01\n'.encode('utf-8')
+        )
+
+        resultado = importar_custos(ler_planilha(arquivo, 'extrato.csv'))
+
+        self.assertFalse(resultado['aplicado'])
+        self.assertEqual([erro['linha'] for erro in resultado['erros']], [3, 4])
+        [custo] = resultado['custos']
+        self.assertEqual(custo['custo_mensal_anterior'], Decimal('100.00'))
+        self.assertEqual(custo['custo_mensal'], Decimal('130.00'))
+        self.assertEqual(resultado['encerrados'][0]['data_fim'], date(2026, 3, 31))
+        self.assertEqual(VPSCost.objects.count(), 1)
+        self.assertIsNone(VPSCost.objects.get().data_fim)
+
+    def test_csv_em_cp1252_do_excel_e_aceito(self):
+        arquivo = io.BytesIO(
+            'tipo;recurso;fornecedor;valor_total;periodo_meses;data_inicio;data_fim;vencimento\n'
+            'Domínio;cliente.com.br;Registro.br;150,00;12;01/04/2026;;01/04/2027\n'.encode('cp1252')
+        )
+
+        resultado = importar_custos(ler_planilha(arquivo, 'extrato.csv'))
+
+        self.assertEqual(resultado['erros'], [])
+        [custo] = resultado['custos']
+        self.assertEqual(custo['recurso'], 'cliente.com.br')
+
+    def test_arquivo_ilegivel_vira_erro_de_validacao(self):
+        # 0x81 não existe em UTF-8 nem em cp1252; aparece depois da amostra
+        # usada para escolher a codificação
+        csv_ilegivel = io.BytesIO(
+            'tipo;recurso;fornecedor;valor_total;periodo_meses;data_inicio;data_fim;vencimento\n'.encode('utf-8')
+            + b'vps;vps-01;Hetzner;130;1;2026-04-01;;2026-04-05\n' * 2000
+            + b'vps;vps-\x81;Hetzner;130;1;2026-04-01;;2026-04-05\n'
+        )
+        with self.assertRaisesMessage(ValidationError, 'CSV UTF-8'):
+            importar_custos(ler_planilha(csv_ilegivel, 'extrato.csv'))
+
+        with self.assertRaisesMessage(ValidationError, 'corrompido'):
+            importar_custos(ler_planilha(io.BytesIO(b'PK\x03\x04 truncado'), 'extrato.xlsx'))
+
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+        resposta = self.client.post(
+            '/admin/financeiro/custoinfra/importar/',
+            {'arquivo': SimpleUploadedFile('extrato.xlsx', b'nao e um xlsx')},
+        )
+        self.assertContains(resposta, 'corrompido')
+
+    def test_valores_ambiguos_ou_acima_do_limite_sao_rejeitados(self):
+        arquivo = io.BytesIO(
+            'tipo;recurso;fornecedor;valor_total;periodo_meses;data_inicio;data_fim;vencimento\n'
+            'vps;vps-01;Hetzner;"1,234.56";12;2026-04-01;;2027-04-01\n'
+            'vps;vps-01;Hetzner;100000000;12;2026-04-01;;2027-04-01\n'
+            'vps;vps-01;Hetzner;NaN;12;2026-04-01;;2027-04-01\n'
+            'vps;vps-01;Hetzner;R$ 1.234,56;12;2026-04-01;;2027-04-01\n'.encode('utf-8')
+        )
+
+        resultado = importar_custos(ler_planilha(arquivo, 'extrato.csv'))
+
+        erros = {erro['linha']: erro['mensagem'] for erro in resultado['erros']}
+        self.assertEqual(sorted(erros), [2, 3, 4])
+        self.assertIn('ambíguo', erros[2])
+        self.assertIn('máximo', erros[3])
+        [custo] = resultado['custos']
+        self.assertEqual(custo['valor_total'], Decimal('1234.56'))
+
+    def test_xlsx_grava_em_lote_e_respeita_periodos_fechados(self):
+        fechar_periodo(self.periodo.id, 'teste')
+        linhas = [
+            ['vps', 'vps-01', 'Hetzner', 130, 1, date(2026, 4, 1), None, date(2026, 4, 5)],
+            ['email', 'cliente.com.br', 'Zoho', 36, 1, date(2026, 4, 1), None, date(2026, 4, 10)],
+            ['dominio', 'cliente.com.br', 'Registro.br', 150, 12, date(2026, 1, 15), None, date(2027, 1, 15)],
+        ]
+
+        com_erro = importar_custos(ler_planilha(self._xlsx(linhas), 'extrato.xlsx'), aplicar=True)
+        self.assertFalse(com_erro['aplicado'])
+        self.assertIn('período fechado', com_erro['erros'][0]['mensagem'])
+        self.assertEqual(VPSCost.objects.count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = importar_custos(ler_planilha(self._xlsx(linhas[:2]), 'extrato.xlsx'), aplicar=True)
+
+        self.assertTrue(resultado['aplicado'])
+        self.assertEqual(custo_vigente(self.vps, date(2026, 3, 31)).custo_mensal, Decimal('100.00'))
+        self.assertEqual(custo_vigente(self.vps, date(2026, 4, 1)).custo_mensal, Decimal('130.00'))
+        self.assertEqual(custo_vigente(self.email, date(2026, 4, 1)).custo_mensal, Decimal('36.00'))
+        self.assertEqual(custo_mensal_vigente(date(2026, 4, 1)), Decimal('176.00'))
+        # O encerramento não muda os períodos fechados: a auditoria continua batendo
+        self.assertEqual(recalcular_periodo(self.periodo)[self.contrato_b.id]['custo_total'], Decimal('120.00'))
+
+    def test_gravacao_trava_periodos_e_custos_conferidos(self):
+        from unittest import mock
+        from django.db.models import QuerySet
+
+        linhas = [['vps', 'vps-01', 'Hetzner', 130, 1, date(2026, 4, 1), None, date(2026, 4, 5)]]
+        travados = []
+        original = QuerySet.select_for_update
+
+        def registrar(queryset, *args, **kwargs):
+            travados.append(queryset.model)
+            return original(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=registrar):
+            importar_custos(ler_planilha(self._xlsx(linhas), 'extrato.xlsx'))
+            self.assertEqual(travados, [])
+            resultado = importar_custos(ler_planilha(self._xlsx(linhas), 'extrato.xlsx'), aplicar=True)
+
+        self.assertTrue(resultado['aplicado'])
+        self.assertEqual(travados, [PeriodoFinanceiro, VPSCost])
+
+    def test_encerrar_custo_sem_afetar_periodo_fechado(self):
+        fechar_periodo(self.periodo.id, 'teste')
+        custo = self.vps.costs.get()
+
+        custo.data_fim = date(2026, 3, 31)
+        custo.save()
+
+        custo.data_fim = date(2025, 12, 31)
+        with self.assertRaises(ValidationError):
+            custo.save()
+
+    def test_pagina_de_importacao_no_admin(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+        arquivo = SimpleUploadedFile(
+            'extrato.xlsx',
+            self._xlsx([['vps', 'vps-01', 'Hetzner', 130, 1, date(2026, 4, 1), None, date(2026, 4, 5)]]).read(),
+        )
+
+        resposta = self.client.post('/admin/financeiro/custoinfra/importar/', {'arquivo': arquivo})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, 'R$ 130,00')
+        self.assertEqual(VPSCost.objects.count(), 1)
+
+
+class AlertasVencimentoTests(FechamentoPeriodoTestMixin, TestCase):
+    def setUp(self):
+        self.criar_cenario()
+        # VPS vence em 05/12, email em 10/12 e domínio em 20/12/2026
+
+    def test_limiar_mais_urgente_atingido_uma_vez_por_vencimento(self):
+        from infra.financeiro.services.alertas_vencimento import alertas_pendentes, registrar_alertas
+
+        with self.assertNumQueries(2):
+            alertas = alertas_pendentes(date(2026, 11, 28), limiares=[30, 7, 0], recuperacao_dias=7)
+
+        self.assertEqual([(a['nome'], a['limiar']) for a in alertas], [
+            ('vps-01', 7), (f'Email {self.dominio.nome}', 30), (self.dominio.nome, 30),
+        ])
+        registrar_alertas(alertas)
+        self.assertEqual(alertas_pendentes(date(2026, 11, 29), limiares=[30, 7, 0], recuperacao_dias=7), [])
+
+        # A task ficou parada até depois do vencimento da VPS: recupera o alerta do dia
+        alertas = alertas_pendentes(date(2026, 12, 8), limiares=[30, 7, 0], recuperacao_dias=7)
+        self.assertEqual([(a['nome'], a['limiar']) for a in alertas], [
+            ('vps-01', 0), (f'Email {self.dominio.nome}', 7),
+        ])
+
+    def test_task_enfileira_email_e_registra_alertas(self):
+        from django.core import mail
+        from unittest import mock
+        from infra.financeiro.models import AlertaEnviado, EmailPendente
+        from infra.financeiro.tasks import task_alertar_vencimentos
+
+        with mock.patch('infra.financeiro.tasks.date') as data_mock, \
+                mock.patch('infra.financeiro.tasks.task_enviar_emails_pendentes') as envio_mock, \
+                override_settings(ALERTA_VENCIMENTO_LIMIARES=[7, 0], ALERT_EMAIL_RECIPIENT='ops@example.com'):
+            data_mock.today.return_value = date(2026, 12, 5)
+            with self.captureOnCommitCallbacks(execute=True):
+                resultado = task_alertar_vencimentos()
+            repetido = task_alertar_vencimentos()
+
+        self.assertEqual(resultado['total_alertas'], 2)
+        self.assertEqual(repetido['total_alertas'], 0)
+        self.assertEqual(envio_mock.delay.call_count, 1)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(AlertaEnviado.objects.count(), 2)
+
+        email = EmailPendente.objects.get()
+        self.assertEqual(email.destinatarios, ['ops@example.com'])
+        self.assertEqual(email.corpo_html.count('<h3 style='), 2)
+        self.assertIn('VENCENDO HOJE', email.corpo_html)
+        self.assertIn('vps-01', email.corpo_texto)
+
+
+class EmailsPendentesTests(TestCase):
+    def _enfileirar(self, assunto):
+        from infra.financeiro.services.emails_pendentes import enfileirar_email
+
+        return enfileirar_email(
+            assunto,
+            'financeiro/emails/alertas_vencimento.html',
+            'financeiro/emails/alertas_vencimento.txt',
+            {'data_referencia': date(2026, 12, 5), 'total_alertas': 0, 'valor_total': 0, 'secoes': []},
+            ['ops@example.com'],
+        )
+
+    def test_envia_lote_por_uma_conexao(self):
+        from django.core import mail
+        from unittest import mock
+        from infra.financeiro.services.emails_pendentes import enviar_pendentes
+
+        for indice in range(3):
+            self._enfileirar(f'Alerta {indice}')
+
+        with mock.patch(
+            'infra.financeiro.services.emails_pendentes.get_connection',
+            wraps=mail.get_connection,
+        ) as conexao_mock:
+            resultado = enviar_pendentes()
+            repetido = enviar_pendentes()
+
+        self.assertEqual(resultado, {'enviados': 3, 'erros': 0})
+        self.assertEqual(repetido, {'enviados': 0, 'erros': 0})
+        self.assertEqual(conexao_mock.call_count, 1)
+        self.assertEqual([m.subject for m in mail.outbox], ['Alerta 0', 'Alerta 1', 'Alerta 2'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+
+    def test_falha_marca_erro_e_tenta_de_novo(self):
+        from django.core import mail
+        from unittest import mock
+        from infra.financeiro.models import EmailPendente
+        from infra.financeiro.services.emails_pendentes import enviar_pendentes
+
+        email = self._enfileirar('Alerta')
+        with mock.patch.object(mail.EmailMultiAlternatives, 'send', side_effect=OSError('smtp fora')):
+            resultado = enviar_pendentes()
+
+        email.refresh_from_db()
+        self.assertEqual(resultado, {'enviados': 0, 'erros': 1})
+        self.assertEqual((email.status, email.tentativas, email.ultimo_erro), ('erro', 1, 'smtp fora'))
+
+        enviar_pendentes()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.tentativas), ('enviado', 2))
+        self.assertIsNotNone(email.enviado_em)
+        self.assertEqual(EmailPendente.objects.filter(status='enviado').count(), 1)
+
+    def test_queda_no_meio_do_lote_preserva_os_ja_enviados(self):
+        from django.core import mail
+        from unittest import mock
+        from infra.financeiro.services.emails_pendentes import RESERVA_EXPIRA, enviar_pendentes
+
+        primeiro, segundo = self._enfileirar('Alerta 1'), self._enfileirar('Alerta 2')
+        envio_original = mail.EmailMultiAlternatives.send
+
+        def cair_no_segundo(mensagem, *args, **kwargs):
+            if mensagem.subject == 'Alerta 2':
+                raise KeyboardInterrupt  # worker encerrado
+            return envio_original(mensagem, *args, **kwargs)
+
+        with mock.patch.object(mail.EmailMultiAlternatives, 'send', cair_no_segundo):
+            with self.assertRaises(KeyboardInterrupt):
+                enviar_pendentes()
+
+        primeiro.refresh_from_db()
+        segundo.refresh_from_db()
+        self.assertEqual(primeiro.status, 'enviado')
+        self.assertEqual((segundo.status, segundo.tentativas), ('enviando', 1))
+
+        # Reserva recente não é tocada; expirada volta à fila e é enviada
+        self.assertEqual(enviar_pendentes(), {'enviados': 0, 'erros': 0})
+        segundo.reservado_em -= RESERVA_EXPIRA
+        segundo.save(update_fields=['reservado_em'])
+        self.assertEqual(enviar_pendentes(), {'enviados': 1, 'erros': 0})
+        segundo.refresh_from_db()
+        self.assertEqual((segundo.status, segundo.tentativas), ('enviado', 2))
+        self.assertEqual([m.subject for m in mail.outbox], ['Alerta 1', 'Alerta 2'])
+
+    def test_falha_de_conexao_devolve_o_lote_sem_contar_tentativa(self):
+        from unittest import mock
+        from infra.financeiro.services.emails_pendentes import enviar_pendentes
+
+        email = self._enfileirar('Alerta')
+        with mock.patch(
+            'infra.financeiro.services.emails_pendentes.get_connection',
+            side_effect=OSError('smtp fora'),
+        ):
+            with self.assertRaises(OSError):
+                enviar_pendentes()
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.tentativas), ('erro', 0))
+        self.assertEqual(enviar_pendentes(), {'enviados': 1, 'erros': 0})
+
+
+class SimuladorRateioTests(FechamentoPeriodoTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.criar_cenario()
+
+    def test_grafo_reproduz_rateio_do_fechamento(self):
+        from infra.financeiro.services.simulador_rateio import GrafoRateio
+
+        grafo = GrafoRateio.carregar(date(2026, 1, 1))
+        fechar_periodo(self.periodo.id, 'teste')
+
+        for contrato in (self.contrato_a, self.contrato_b):
+            snapshot = ContratoSnapshot.objects.get(contrato=contrato, periodo=self.periodo)
+            custo = grafo.custo_por_contrato[contrato.id] + grafo.contratos[contrato.id]['despesas']
+            self.assertEqual(custo, snapshot.custo_total)
+
+    def test_simula_mudanca_de_vps_so_nos_contratos_afetados(self):
+        from infra.financeiro.services.simulador_rateio import GrafoRateio
+
+        grafo = GrafoRateio.carregar(date(2026, 1, 1))
+        antes = dict(grafo.custo_por_contrato)
+
+        resultado = grafo.simular([
+            {'acao': 'custo', 'recurso': ['vps', 'novo:nova'], 'custo_mensal': '60.00'},
+            {'acao': 'mover', 'recurso': ['vps', self.vps.id], 'destino': ['vps', 'novo:nova'], 'contrato': self.contrato_b.id},
+        ])
+
+        por_contrato = {item['contrato_id']: item for item in resultado}
+        self.assertEqual(por_contrato[self.contrato_a.id]['variacao'], Decimal('-50.00'))
+        self.assertEqual(por_contrato[self.contrato_b.id]['variacao'], Decimal('-10.00'))
+        self.assertEqual(
+            por_contrato[self.contrato_b.id]['margem_depois'],
+            Decimal('500.00') - Decimal('130.00'),
+        )
+        self.assertEqual(grafo.custo_por_contrato, antes)
+
+        with self.assertRaises(ValueError):
+            grafo.simular([{'acao': 'vincular', 'recurso': ['emails', self.email.id], 'contrato': self.contrato_a.id}])
+
+    def test_endpoint_simulador(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+        corpo = {
+            'competencia': '2026-01',
+            'alteracoes': [{'acao': 'desvincular', 'recurso': ['vps', self.vps.id], 'contrato': self.contrato_a.id}],
+        }
+
+        resposta = self.client.post('/financeiro/simulador-rateio/', corpo, content_type='application/json')
+
+        self.assertEqual(resposta.status_code, 200)
+        contratos = {item['contrato_id']: item for item in resposta.json()['contratos']}
+        self.assertEqual(contratos[self.contrato_b.id]['custo_depois'] - contratos[self.contrato_b.id]['custo_antes'], 50.0)
+        erro = self.client.post('/financeiro/simulador-rateio/', {'alteracoes': {}}, content_type='application/json')
+        self.assertEqual(erro.status_code, 400)
+
+    def test_endpoint_simulador_rejeita_corpo_malformado(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+        malformados = [
+            [],
+            'texto',
+            {'competencia': 202601},
+            {'alteracoes': ['vincular']},
+            {'alteracoes': [{'acao': 'vincular', 'recurso': ['vps', [1]], 'contrato': self.contrato_a.id}]},
+            # ID numérico em texto não pode virar um recurso novo
+            {'alteracoes': [{'acao': 'vincular', 'recurso': ['vps', str(self.vps.id)], 'contrato': self.contrato_a.id}]},
+            {'alteracoes': [{'acao': 'custo', 'recurso': ['vps', 'novo:'], 'custo_mensal': '10'}]},
+            {'alteracoes': [{'acao': 'vincular', 'recurso': ['vps', self.vps.id], 'contrato': [1]}]},
+        ]
+
+        for corpo in malformados:
+            resposta = self.client.post('/financeiro/simulador-rateio/', corpo, content_type='application/json')
+            self.assertEqual(resposta.status_code, 400, corpo)
+            self.assertIn('erro', resposta.json())
+
+        resposta = self.client.post('/financeiro/simulador-rateio/', b'{', content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+
+
+class AtribuicaoContratoTests(FechamentoPeriodoTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.criar_cenario()
+        backup = VPSBackup.objects.create(vps=self.vps, nome='snapshots', fornecedor='Hetzner')
+        VPSBackupCost.objects.create(
+            backup=backup,
+            valor_total=Decimal('20.00'),
+            periodo_meses=1,
+            data_inicio=date(2025, 1, 1),
+            vencimento=date(2026, 12, 5),
+        )
+        hosting = Hosting.objects.create(nome='cpanel', fornecedor='HostGator')
+        hosting.contratos.add(self.contrato_a, self.contrato_b)
+        HostingCost.objects.create(
+            hosting=hosting,
+            valor_total=Decimal('90.00'),
+            periodo_meses=3,
+            data_inicio=date(2025, 1, 1),
+            vencimento=date(2026, 12, 15),
+        )
+
+    def test_atribuicao_igual_ao_fechamento_com_queries_fixas(self):
+        esperados = recalcular_periodo(self.periodo)
+
+        for contrato in (self.contrato_a, self.contrato_b):
+            with CaptureQueriesContext(connection) as queries:
+                valores = atribuir_custos_contrato(contrato.id, date(2026, 1, 15))
+            self.assertEqual(len(queries), 8)
+            self.assertEqual(valores.pop('competencia'), '2026-01')
+            self.assertEqual(valores, esperados[contrato.id])
+
+    def test_cache_invalida_quando_vinculo_muda(self):
+        inicial = atribuicao_em_cache(self.contrato_a.id, date(2026, 1, 1))
+        with self.assertNumQueries(0):
+            atribuicao_em_cache(self.contrato_a.id, date(2026, 1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            VPSContrato.objects.filter(contrato=self.contrato_b).delete()
+
+        atualizado = atribuicao_em_cache(self.contrato_a.id, date(2026, 1, 1))
+        self.assertEqual(inicial['custo_vps'], Decimal('50.00'))
+        self.assertEqual(atualizado['custo_vps'], Decimal('100.00'))
+        self.assertEqual(atualizado['detalhamento']['backups'][0]['rateio'], 1)
+
+    def test_endpoint_atribuicao(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+
+        resposta = self.client.get(f'/financeiro/contratos/{self.contrato_b.id}/custos.json?competencia=2026-01')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['custo_total'], 145.0)
+        fora_de_vigencia = self.client.get(f'/financeiro/contratos/{self.contrato_b.id}/custos.json?competencia=2024-12')
+        self.assertEqual(fora_de_vigencia.status_code, 400)
+        self.assertEqual(self.client.get('/financeiro/contratos/0/custos.json').status_code, 404)
+
+
+class CalendarioVencimentosTests(FechamentoPeriodoTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.criar_cenario()
+
+    def test_vencimentos_em_uma_query_com_urgencia(self):
+        with self.assertNumQueries(1):
+            vencimentos = vencimentos_entre(
+                date(2026, 12, 1), date(2026, 12, 31), hoje=date(2026, 12, 8)
+            )
+
+        self.assertEqual(
+            [(v['tipo'], v['urgencia']['nivel'], v['vencido']) for v in vencimentos],
+            [
+                ('VPS', 'vencido', True),
+                ('Email', 'alta', False),
+                ('Domínio', 'media', False),
+            ],
+        )
+        self.assertEqual(vencimentos[1]['dias_restantes'], 2)
+
+    def test_feeds_json_e_ical(self):
+        parametros = {'inicio': '2026-12-01', 'fim': '2026-12-31'}
+
+        self.assertEqual(self.client.get('/financeiro/vencimentos.json', parametros).status_code, 403)
+
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+        resposta = self.client.get('/financeiro/vencimentos.json', parametros)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json()['vencimentos']), 3)
+        self.assertIn('max-age=300', resposta['Cache-Control'])
+
+        resposta = self.client.get('/financeiro/vencimentos.json', {'inicio': 'ontem'})
+        self.assertEqual(resposta.status_code, 400)
+
+    @override_settings(CALENDARIO_VENCIMENTOS_TOKEN='segredo')
+    def test_feed_ical_com_token(self):
+        parametros = {'inicio': '2026-12-01', 'fim': '2026-12-31'}
+
+        resposta = self.client.get('/financeiro/vencimentos.ics', {**parametros, 'token': 'errado'})
+        self.assertEqual(resposta.status_code, 403)
+
+        resposta = self.client.get('/financeiro/vencimentos.ics', {**parametros, 'token': 'segredo'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta['Content-Type'], 'text/calendar; charset=utf-8')
+        conteudo = resposta.content.decode()
+        self.assertEqual(conteudo.count('BEGIN:VEVENT'), 3)
+        self.assertIn('DTSTART;VALUE=DATE:20261205', conteudo)
+        self.assertIn('SUMMARY:Vencimento VPS: vps-01', conteudo)
@@ -6,4 +6,12 @@ app_name = 'financeiro'
 urlpatterns = [
     path('', views.dashboard_financeiro, name='dashboard_default'),
     path('dashboard/', views.dashboard_financeiro, name='dashboard'),
+    path('dashboard/secoes/<str:nome>/', views.dashboard_secao, name='dashboard_secao'),
+    path('dashboard/graficos/<str:nome>/', views.dashboard_grafico, name='dashboard_grafico'),
+    path('contas-a-receber/aging.xlsx', views.aging_xlsx, name='aging_xlsx'),
+    path('contratos/<int:contrato_id>/custos.json', views.atribuicao_contrato_json, name='atribuicao_contrato_json'),
+    path('simulador-rateio/', views.simulador_rateio, name='simulador_rateio'),
+    path('fluxo-caixa.json', views.fluxo_caixa_json, name='fluxo_caixa_json'),
+    path('vencimentos.json', views.vencimentos_json, name='vencimentos_json'),
+    path('vencimentos.ics', views.vencimentos_ical, name='vencimentos_ical'),
 ]
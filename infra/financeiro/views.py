@@ -1,6 +1,27 @@
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.template.loader import render_to_string
 from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.cache import patch_cache_control
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import condition, require_GET, require_POST
+from contratos.models import Contrato
+from .services.atribuicao_contrato import atribuicao_em_cache
 from .services.dashboard_service import DashboardService
+from .services.cache_dashboard import buscar_secao, dados_atualizados_em, secao_em_cache, versao_dados
+from .services.calendario_vencimentos import gerar_ical, vencimentos_entre
+from .services.contas_receber import aging_recebiveis, gerar_planilha_aging
+from .services.receita_recorrente import SERIES_MRR, linha_do_tempo_mrr
+from .services.fluxo_caixa import projetar_fluxo_caixa
+from .services.simulador_rateio import GrafoRateio
 
 
 @staff_member_required
@@ -12,38 +33,419 @@ def dashboard_financeiro(request):
     - Snapshots são IMUTÁVEIS
     - Períodos fechados são fonte de verdade
     - Dashboard = leitura, nunca cálculo crítico
+    
+    A página é só o esqueleto: cada seção é buscada em paralelo no
+    endpoint dashboard_secao, com cache e tempo próprios.
     """
+    return render(request, 'admin/financeiro/dashboard.html')
+
+
+def _pagina(request):
+    try:
+        return max(1, int(request.GET.get('pagina', 1)))
+    except ValueError:
+        return 1
+
+
+def _linha_do_tempo_mrr():
+    """Compartilhada entre a seção e o gráfico de MRR."""
+    return secao_em_cache('mrr:linha', lambda: linha_do_tempo_mrr(meses=12))
+
+
+def _colunas_mrr():
+    linha = _linha_do_tempo_mrr()
+    return {
+        'labels': [item['mes'] for item in linha],
+        **{
+            serie: [float(item[serie]) for item in linha]
+            for serie in SERIES_MRR
+        },
+    }
+
+
+# nome -> (contexto(service, request), chave de cache ou None para não cachear)
+# Alertas de anomalia dependem da fila de mensagens e do horário: sem cache.
+SECOES_DASHBOARD = {
+    'cards': (
+        lambda service, request: {'cards': service.get_cards_principais()},
+        lambda request: 'cards',
+    ),
+    'alertas': (
+        lambda service, request: {'alertas_anomalia': service.get_alertas_anomalia()},
+        None,
+    ),
+    'receita_mes': (
+        lambda service, request: {},
+        None,
+    ),
+    'invoices': (
+        lambda service, request: {'invoices_status': service.get_status_invoices(pagina=_pagina(request))},
+        lambda request: f'invoices:{_pagina(request)}',
+    ),
+    'aging': (
+        lambda service, request: {'aging': aging_recebiveis()},
+        lambda request: 'aging',
+    ),
+    'vencimentos': (
+        lambda service, request: {
+            'vencimentos': service.get_vencimentos_incluindo_vencidos(dias_futuro=30, dias_passado=30)
+        },
+        lambda request: 'vencimentos',
+    ),
+    'custos_clientes': (
+        lambda service, request: {'custos_clientes': service.get_custos_por_cliente(limit=10)},
+        lambda request: 'custos_clientes',
+    ),
+    'custos_categorias': (
+        lambda service, request: {'custos_categorias': service.get_custos_por_categoria()},
+        lambda request: 'custos_categorias',
+    ),
+    'custos_recursos': (
+        lambda service, request: {'custos_recursos': service.get_custos_por_recurso(limit=10)},
+        lambda request: 'custos_recursos',
+    ),
+    'analise_contratos': (
+        lambda service, request: {'analise_contratos': service.get_analise_contratos(limit=10)},
+        lambda request: 'analise_contratos',
+    ),
+    'contratos_prejuizo': (
+        lambda service, request: {'contratos_prejuizo': service.get_contratos_em_prejuizo(limit=10)},
+        lambda request: 'contratos_prejuizo',
+    ),
+    'evolucao': (
+        lambda service, request: {'evolucao_mensal': service.get_evolucao_mensal(meses=12)},
+        lambda request: 'evolucao',
+    ),
+    'mrr': (
+        lambda service, request: {'mrr': _linha_do_tempo_mrr()},
+        lambda request: 'mrr',
+    ),
+    'fluxo_caixa': (
+        lambda service, request: {'fluxo_caixa': projetar_fluxo_caixa(meses=12)},
+        lambda request: 'fluxo_caixa',
+    ),
+}
+
+
+@staff_member_required
+@require_GET
+def dashboard_secao(request, nome):
+    """
+    Uma seção do dashboard, renderizada e devolvida em JSON.
+    
+    Returns:
+        JSON: {'secao', 'html', 'cache': bool, 'tempo_ms'}
+        (tempo também no header Server-Timing)
+    """
+    if nome not in SECOES_DASHBOARD:
+        raise Http404('Seção inexistente')
+    
+    contexto, chave = SECOES_DASHBOARD[nome]
+    inicio = perf_counter()
+    
     service = DashboardService()
+    if chave is None:
+        dados, do_cache = contexto(service, request), False
+    else:
+        dados, do_cache = buscar_secao(chave(request), lambda: contexto(service, request))
     
-    context = {
-        # Cards principais (topo)
-        'cards': service.get_cards_principais(),
-        
-        # Análise por contrato (últimos 3 meses)
-        'analise_contratos': service.get_analise_contratos(limit=10),
-        
-        # Vencimentos (incluindo vencidos e próximos 30 dias)
-        'vencimentos': service.get_vencimentos_incluindo_vencidos(dias_futuro=30, dias_passado=30),
-        
-        # Status de Invoices
-        'invoices_status': service.get_status_invoices(),
-        
-        # Custos por categoria
-        'custos_categorias': service.get_custos_por_categoria(),
-        
-        # Custos por cliente
-        'custos_clientes': service.get_custos_por_cliente(limit=10),
-        
-        # Evolução mensal (gráfico)
-        'evolucao_mensal': service.get_evolucao_mensal(meses=12),
-        'evolucao_chart': service.get_evolucao_chart_data(meses=12),
-
-        # Alertas de anomalia
-        'alertas_anomalia': service.get_alertas_anomalia(),
-
-        # Gráficos auxiliares
-        'receita_chart': service.get_receita_mes_atual_chart_data(),
-        'custos_categoria_chart': service.get_custos_categoria_chart_data(),
-    }
+    html = render_to_string(f'admin/financeiro/secoes/{nome}.html', dados, request=request)
+    tempo_ms = round((perf_counter() - inicio) * 1000, 1)
     
-    return render(request, 'admin/financeiro/dashboard.html', context)
+    response = JsonResponse({
+        'secao': nome,
+        'html': html,
+        'cache': do_cache,
+        'tempo_ms': tempo_ms,
+    })
+    descricao = f'{nome} (cache)' if do_cache else nome
+    response['Server-Timing'] = f'secao;dur={tempo_ms};desc="{descricao}"'
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@staff_member_required
+@require_GET
+def aging_xlsx(request):
+    """Aging de contas a receber em planilha (mesmo cache da seção do dashboard)."""
+    aging = secao_em_cache('aging', lambda: {'aging': aging_recebiveis()})['aging']
+    response = HttpResponse(
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="aging_recebiveis_{aging["data_base"]:%Y_%m_%d}.xlsx"'
+    )
+    gerar_planilha_aging(aging).save(response)
+    return response
+
+
+# ========================================
+# PROJEÇÃO DE FLUXO DE CAIXA (CENÁRIOS)
+# ========================================
+
+FLUXO_CAIXA_MAX_MESES = 36
+PARAMETROS_CENARIO = ('reajuste_custos', 'crescimento_receita', 'churn_mensal')
+
+
+def _cenario_fluxo_caixa(request):
+    """
+    Lê ?meses=12&reajuste_custos=10&crescimento_receita=2&churn_mensal=1
+    (percentuais; padrão: 12 meses, cenário base).
+
+    Raises:
+        ValueError: Parâmetros inválidos
+    """
+    meses = int(request.GET.get('meses') or 12)
+    if not 1 <= meses <= FLUXO_CAIXA_MAX_MESES:
+        raise ValueError(f'meses deve estar entre 1 e {FLUXO_CAIXA_MAX_MESES}')
+
+    cenario = {}
+    for parametro in PARAMETROS_CENARIO:
+        try:
+            valor = Decimal(request.GET.get(parametro) or '0')
+        except InvalidOperation:
+            raise ValueError(f'{parametro} inválido')
+        if not valor.is_finite() or not Decimal('-100') <= valor <= Decimal('100'):
+            raise ValueError(f'{parametro} deve estar entre -100 e 100')
+        cenario[parametro] = valor
+    return meses, cenario
+
+
+@staff_member_required
+@require_GET
+def fluxo_caixa_json(request):
+    """Projeção de fluxo de caixa mês a mês para o cenário informado, em JSON."""
+    try:
+        meses, cenario = _cenario_fluxo_caixa(request)
+    except ValueError as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+
+    chave = ':'.join(f'{cenario[parametro].normalize()}' for parametro in PARAMETROS_CENARIO)
+    projecao = secao_em_cache(
+        f'fluxo_caixa:{meses}:{chave}',
+        lambda: projetar_fluxo_caixa(meses=meses, **cenario),
+    )
+
+    response = JsonResponse({
+        'cenario': {parametro: float(valor) for parametro, valor in cenario.items()},
+        'meses': [
+            {campo: (valor if campo == 'mes' else float(valor)) for campo, valor in item.items()}
+            for item in projecao
+        ],
+    })
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# ========================================
+# ATRIBUIÇÃO DE CUSTOS POR CONTRATO
+# ========================================
+
+@staff_member_required
+@require_GET
+def atribuicao_contrato_json(request, contrato_id):
+    """
+    Custos rateados, receita e margem de um contrato no mês, sem fechar
+    o período.
+
+    Query string: competencia=AAAA-MM (opcional, padrão: mês atual)
+    """
+    try:
+        competencia = request.GET.get('competencia')
+        competencia = date.fromisoformat(f'{competencia}-01') if competencia else None
+        valores = atribuicao_em_cache(contrato_id, competencia)
+    except Contrato.DoesNotExist:
+        raise Http404('Contrato não encontrado')
+    except (ValueError, ValidationError) as e:
+        mensagem = e.messages[0] if isinstance(e, ValidationError) else str(e)
+        return JsonResponse({'erro': mensagem}, status=400)
+
+    response = JsonResponse({
+        campo: (float(valor) if isinstance(valor, Decimal) else valor)
+        for campo, valor in valores.items()
+    })
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# ========================================
+# SIMULADOR DE ALOCAÇÃO (E SE...?)
+# ========================================
+
+@staff_member_required
+@require_POST
+def simulador_rateio(request):
+    """
+    Simula vínculos/custos hipotéticos e devolve a margem antes/depois.
+
+    Corpo JSON:
+        {"competencia": "AAAA-MM" (opcional, padrão: mês atual),
+         "alteracoes": [{"acao": "mover", "recurso": ["vps", 1],
+                         "destino": ["vps", 2], "contrato": 7}, ...]}
+
+    IDs de recursos existentes são inteiros; recursos hipotéticos usam
+    "novo:<nome>" (ex: ["vps", "novo:vps-maior"]).
+    """
+    try:
+        corpo = json.loads(request.body or b'{}')
+        if not isinstance(corpo, dict):
+            raise ValueError('O corpo deve ser um objeto JSON')
+        competencia = corpo.get('competencia')
+        if competencia is not None and not isinstance(competencia, str):
+            raise ValueError('competencia deve ser AAAA-MM')
+        competencia = date.fromisoformat(f'{competencia}-01') if competencia else date.today().replace(day=1)
+        alteracoes = corpo.get('alteracoes', [])
+        if not isinstance(alteracoes, list):
+            raise ValueError('alteracoes deve ser uma lista')
+
+        grafo = secao_em_cache(
+            f'simulador:grafo:{competencia:%Y-%m}',
+            lambda: GrafoRateio.carregar(competencia),
+        )
+        contratos = grafo.simular(alteracoes)
+    except ValueError as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+
+    return JsonResponse({
+        'competencia': f'{competencia:%Y-%m}',
+        'contratos': [
+            {campo: (float(valor) if isinstance(valor, Decimal) else valor) for campo, valor in item.items()}
+            for item in contratos
+        ],
+    })
+
+
+# ========================================
+# DADOS DOS GRÁFICOS (GET CONDICIONAL)
+# ========================================
+
+GRAFICOS_DASHBOARD = {
+    'evolucao': lambda service: service.get_evolucao_chart_data(meses=12),
+    'receita_mes': lambda service: service.get_receita_mes_atual_chart_data(),
+    'custos_categoria': lambda service: service.get_custos_categoria_chart_data(),
+    'mrr': lambda service: _colunas_mrr(),
+}
+
+
+def _etag_grafico(request, nome):
+    """Versão dos dados + dia (os gráficos do mês corrente mudam com a data)."""
+    if nome not in GRAFICOS_DASHBOARD:
+        return None
+    return f'fin-{nome}-v{versao_dados()}-{date.today():%Y%m%d}'
+
+
+def _last_modified_grafico(request, nome):
+    if nome not in GRAFICOS_DASHBOARD:
+        return None
+    inicio_do_dia = timezone.make_aware(datetime.combine(date.today(), time.min))
+    return max(dados_atualizados_em(), inicio_do_dia)
+
+
+@staff_member_required
+@require_GET
+@condition(etag_func=_etag_grafico, last_modified_func=_last_modified_grafico)
+def dashboard_grafico(request, nome):
+    """
+    Dados colunares de um gráfico do dashboard ({'labels': [...], '<serie>': [...]}).
+    
+    Com ETag/Last-Modified derivados da versão dos dados, o navegador
+    revalida e recebe 304 enquanto nada mudar.
+    """
+    if nome not in GRAFICOS_DASHBOARD:
+        raise Http404('Gráfico inexistente')
+    
+    service = DashboardService()
+    dados = secao_em_cache(f'grafico:{nome}', lambda: GRAFICOS_DASHBOARD[nome](service))
+    
+    response = JsonResponse(dados)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# ========================================
+# CALENDÁRIO DE VENCIMENTOS (JSON / iCal)
+# ========================================
+
+CALENDARIO_MAX_DIAS = 731
+CALENDARIO_MAX_AGE = 300  # segundos
+
+
+def _calendario_autorizado(request):
+    """Staff logado ou token do feed (para clientes de calendário sem sessão)."""
+    if request.user.is_active and request.user.is_staff:
+        return True
+    token = settings.CALENDARIO_VENCIMENTOS_TOKEN
+    return bool(token) and constant_time_compare(request.GET.get('token', ''), token)
+
+
+def _intervalo_calendario(request):
+    """
+    Lê ?inicio=AAAA-MM-DD&fim=AAAA-MM-DD (padrão: 30 dias atrás a 90 à frente).
+
+    Raises:
+        ValueError: Datas inválidas ou intervalo grande demais
+    """
+    hoje = date.today()
+    inicio = request.GET.get('inicio')
+    fim = request.GET.get('fim')
+    inicio = date.fromisoformat(inicio) if inicio else hoje - timedelta(days=30)
+    fim = date.fromisoformat(fim) if fim else hoje + timedelta(days=90)
+    if fim < inicio:
+        raise ValueError('fim deve ser maior ou igual a inicio')
+    if (fim - inicio).days > CALENDARIO_MAX_DIAS:
+        raise ValueError(f'intervalo máximo de {CALENDARIO_MAX_DIAS} dias')
+    return inicio, fim
+
+
+def _vencimentos_calendario(request):
+    inicio, fim = _intervalo_calendario(request)
+    return secao_em_cache(
+        f'calendario:{inicio.isoformat()}:{fim.isoformat()}',
+        lambda: vencimentos_entre(inicio, fim),
+    )
+
+
+@require_GET
+def vencimentos_json(request):
+    """Vencimentos de infraestrutura no intervalo, em JSON."""
+    if not _calendario_autorizado(request):
+        return JsonResponse({'erro': 'não autorizado'}, status=403)
+    try:
+        vencimentos = _vencimentos_calendario(request)
+    except ValueError as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+
+    response = JsonResponse({
+        'vencimentos': [{
+            'tipo': item['tipo'],
+            'categoria': item['categoria'],
+            'nome': item['nome'],
+            'fornecedor': item['fornecedor'],
+            'valor': float(item['valor']),
+            'vencimento': item['vencimento'].isoformat(),
+            'dias_restantes': item['dias_restantes'],
+            'urgencia': item['urgencia']['nivel'],
+            'vencido': item['vencido'],
+        } for item in vencimentos],
+    })
+    patch_cache_control(response, private=True, max_age=CALENDARIO_MAX_AGE)
+    return response
+
+
+@require_GET
+def vencimentos_ical(request):
+    """Feed iCal (RFC 5545) dos vencimentos, para assinar no calendário de operações."""
+    if not _calendario_autorizado(request):
+        return HttpResponse('não autorizado', status=403, content_type='text/plain; charset=utf-8')
+    try:
+        vencimentos = _vencimentos_calendario(request)
+    except ValueError as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain; charset=utf-8')
+
+    response = HttpResponse(
+        gerar_ical(vencimentos, dominio=request.get_host().split(':')[0]),
+        content_type='text/calendar; charset=utf-8',
+    )
+    response['Content-Disposition'] = 'inline; filename="vencimentos.ics"'
+    patch_cache_control(response, private=True, max_age=CALENDARIO_MAX_AGE)
+    return response
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from infra.core.admin import CustoAtualAdminMixin
 from .models import Hosting, HostingCost
 
 
@@ -19,8 +20,11 @@ class HostingCostInline(admin.TabularInline):
 
 
 @admin.register(Hosting)
-class HostingAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'fornecedor', 'ativo', 'custo_atual', 'criado_em')
+class HostingAdmin(CustoAtualAdminMixin, admin.ModelAdmin):
+    list_display = (
+        'nome', 'fornecedor', 'ativo', 'valor_atual', 'custo_atual',
+        'contratos_vinculados', 'criado_em'
+    )
     list_filter = ('ativo', 'fornecedor', 'criado_em')
     search_fields = ('nome', 'fornecedor')
     filter_horizontal = ('contratos',)
@@ -37,13 +41,6 @@ class HostingAdmin(admin.ModelAdmin):
             'fields': ('ativo',)
         }),
     )
-    
-    def custo_atual(self, obj):
-        cost = obj.costs.filter(ativo=True).order_by('-data_inicio').first()
-        if cost:
-            return f"R$ {cost.custo_mensal:,.2f}/mês"
-        return "Sem custo"
-    custo_atual.short_description = 'Custo Atual'
 
 
 @admin.register(HostingCost)
@@ -10,6 +10,8 @@ class Hosting(core_models.InfraModel):
 
 
 class HostingCost(core_models.InfraCostModel):
+    campo_recurso = 'hosting'
+
     hosting = models.ForeignKey(
         Hosting,
         on_delete=models.PROTECT,
@@ -18,3 +20,7 @@ class HostingCost(core_models.InfraCostModel):
 
     class Meta:
         ordering = ['-data_inicio']
+        indexes = [
+            models.Index(fields=['hosting', 'data_inicio'], name='hostingcost_recurso_idx'),
+            models.Index(fields=['ativo', 'data_inicio', 'data_fim'], name='hostingcost_vigencia_idx'),
+        ]
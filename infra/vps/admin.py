@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.db.models import Q
+from infra.core.admin import CustoAtualAdminMixin
 from .models import VPS, VPSCost, VPSContrato
 
 
@@ -25,8 +27,14 @@ class VPSContratoInline(admin.TabularInline):
 
 
 @admin.register(VPS)
-class VPSAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'fornecedor', 'ativo', 'custo_atual', 'criado_em')
+class VPSAdmin(CustoAtualAdminMixin, admin.ModelAdmin):
+    list_display = (
+        'nome', 'fornecedor', 'ativo', 'valor_atual', 'custo_atual',
+        'contratos_vinculados', 'criado_em'
+    )
+    # Somente vínculos ativos entram no rateio
+    lookup_contratos = 'vpscontrato'
+    filtro_contratos = Q(vpscontrato__ativo=True)
     list_filter = ('ativo', 'fornecedor', 'criado_em')
     search_fields = ('nome', 'fornecedor')
     inlines = [VPSContratoInline, VPSCostInline]
@@ -39,13 +47,6 @@ class VPSAdmin(admin.ModelAdmin):
             'fields': ('ativo',)
         }),
     )
-    
-    def custo_atual(self, obj):
-        cost = obj.costs.filter(ativo=True).order_by('-data_inicio').first()
-        if cost:
-            return f"R$ {cost.custo_mensal:,.2f}/mês"
-        return "Sem custo"
-    custo_atual.short_description = 'Custo Atual'
 
 
 @admin.register(VPSCost)
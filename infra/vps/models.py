@@ -37,6 +37,8 @@ class VPSContrato(models.Model):
 
 
 class VPSCost(core_models.InfraCostModel):
+    campo_recurso = 'vps'
+
     vps = models.ForeignKey(
         VPS,
         on_delete=models.PROTECT,
@@ -45,3 +47,7 @@ class VPSCost(core_models.InfraCostModel):
 
     class Meta:
         ordering = ['-data_inicio']
+        indexes = [
+            models.Index(fields=['vps', 'data_inicio'], name='vpscost_recurso_idx'),
+            models.Index(fields=['ativo', 'data_inicio', 'data_fim'], name='vpscost_vigencia_idx'),
+        ]
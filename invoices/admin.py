@@ -1,8 +1,52 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.forms import BaseInlineFormSet
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import format_html
+
+from app.busca import BuscaIndexadaAdminMixin
+from app.paginacao import PaginadorContagemAproximada
 from .models import Invoice, InvoiceContrato, MessageQueue
+from .services.acoes_em_massa import (
+    executar_sincrono,
+    iniciar_progresso,
+    obter_progresso,
+    processar_em_lotes,
+)
+from .tasks import task_acao_em_massa
+
+
+DESCRICOES_ACOES = {
+    'marcar_pagos': 'Marcar como pagos',
+    'cancelar': 'Cancelar invoices',
+    'regenerar_checkouts': 'Regenerar checkout InfinitePay',
+    'reenfileirar_mensagens': 'Reenfileirar mensagens com erro',
+}
+
+
+def executar_acao_em_massa(request, queryset, acao):
+    """
+    Aplica a ação na requisição ou, para seleções grandes, no Celery.
+
+    No segundo caso redireciona para a página de progresso.
+    """
+    ids = list(queryset.order_by().values_list('pk', flat=True))
+    descricao = DESCRICOES_ACOES[acao]
+
+    if executar_sincrono(acao, len(ids)):
+        alterados = processar_em_lotes(acao, ids)
+        messages.success(request, f"{descricao}: {alterados} de {len(ids)} registro(s) alterado(s).")
+        return None
+
+    identificador = iniciar_progresso(acao, len(ids))
+    transaction.on_commit(lambda: task_acao_em_massa.delay(acao, ids, identificador))
+    messages.info(request, f"{descricao}: {len(ids)} registro(s) enviados para processamento.")
+    return redirect('admin:invoices_acao_em_massa', identificador=identificador)
 
 
 class InvoiceContratoInlineFormSet(BaseInlineFormSet):
@@ -24,8 +68,11 @@ class InvoiceContratoInline(admin.TabularInline):
     fields = ('contrato', 'valor', 'criado_em')
     readonly_fields = ('criado_em',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('contrato__cliente')
+
 @admin.register(Invoice)
-class InvoiceAdmin(admin.ModelAdmin):
+class InvoiceAdmin(BuscaIndexadaAdminMixin, admin.ModelAdmin):
     list_display = (
         'get_invoice_number', 'cliente', 'contrato_vinculado', 'valor_total_display',
         'vencimento', 'status_badge', 'pago_em', 'order_nsu', 'invoice_slug'
@@ -37,9 +84,14 @@ class InvoiceAdmin(admin.ModelAdmin):
     search_fields = (
         'cliente__nome', 'order_nsu', 'invoice_slug', 'transaction_nsu',
     )
+    busca_indexada = ('cliente',)
     date_hierarchy = 'vencimento'
     readonly_fields = ('criado_em', 'pago_em')
     inlines = (InvoiceContratoInline,)
+    list_select_related = ('cliente',)
+    paginator = PaginadorContagemAproximada
+    show_full_result_count = False
+    actions = ['marcar_pagos', 'cancelar', 'regenerar_checkouts']
 
     fieldsets = (
         ('Cliente e Período', {
@@ -61,6 +113,54 @@ class InvoiceAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Contagem de contratos por subquery correlacionada: sem GROUP BY
+        # sobre a página inteira e sem uma query por linha
+        itens = InvoiceContrato.objects.filter(
+            invoice=OuterRef('pk')
+        ).order_by().values('invoice').annotate(total=Count('pk')).values('total')
+        return super().get_queryset(request).annotate(
+            total_contratos=Coalesce(Subquery(itens), 0)
+        )
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'acoes/<str:identificador>/',
+                self.admin_site.admin_view(self.progresso_acao_view),
+                name='invoices_acao_em_massa',
+            ),
+        ]
+        return custom_urls + urls
+
+    def progresso_acao_view(self, request, identificador):
+        """Progresso de uma ação em massa executada no Celery."""
+        progresso = obter_progresso(identificador)
+        percentual = 0
+        if progresso and progresso['total']:
+            percentual = round(100 * progresso['processados'] / progresso['total'])
+        contexto = {
+            **self.admin_site.each_context(request),
+            'title': 'Progresso da ação em massa',
+            'progresso': progresso,
+            'descricao': DESCRICOES_ACOES.get(progresso['acao']) if progresso else '',
+            'percentual': percentual,
+        }
+        return TemplateResponse(request, 'admin/invoices/progresso_acao.html', contexto)
+
+    @admin.action(description=DESCRICOES_ACOES['marcar_pagos'])
+    def marcar_pagos(self, request, queryset):
+        return executar_acao_em_massa(request, queryset, 'marcar_pagos')
+
+    @admin.action(description=DESCRICOES_ACOES['cancelar'])
+    def cancelar(self, request, queryset):
+        return executar_acao_em_massa(request, queryset, 'cancelar')
+
+    @admin.action(description=DESCRICOES_ACOES['regenerar_checkouts'])
+    def regenerar_checkouts(self, request, queryset):
+        return executar_acao_em_massa(request, queryset, 'regenerar_checkouts')
+
     def get_invoice_number(self, obj):
         return f"{obj.mes_referencia:02d}/{obj.ano_referencia}"
     get_invoice_number.short_description = 'Período'
@@ -71,11 +171,11 @@ class InvoiceAdmin(admin.ModelAdmin):
     valor_total_display.admin_order_field = 'valor_total'
     
     def contrato_vinculado(self, obj):
-        total = obj.itens_contrato.count()
-        if total == 0:
+        if obj.total_contratos == 0:
             return '—'
-        return f"{total} contrato(s)"
+        return f"{obj.total_contratos} contrato(s)"
     contrato_vinculado.short_description = 'Contrato'
+    contrato_vinculado.admin_order_field = 'total_contratos'
 
     def save_formset(self, request, form, formset, change):
         formset.save()
@@ -96,8 +196,17 @@ class InvoiceAdmin(admin.ModelAdmin):
 
 
 @admin.register(MessageQueue)
-class MessageQueueAdmin(admin.ModelAdmin):
+class MessageQueueAdmin(BuscaIndexadaAdminMixin, admin.ModelAdmin):
     list_display = ('invoice', 'tipo', 'status', 'agendado_para', 'tentativas', 'enviado_em')
     list_filter = ('tipo', 'status')
-    search_fields = ('invoice__id', 'telefone', 'mensagem')
+    search_fields = ('=invoice__id', 'telefone', 'mensagem')
+    busca_indexada = ('',)
+    actions = ['reenfileirar_mensagens']
     date_hierarchy = 'agendado_para'
+    list_select_related = ('invoice__cliente',)
+    paginator = PaginadorContagemAproximada
+    show_full_result_count = False
+
+    @admin.action(description=DESCRICOES_ACOES['reenfileirar_mensagens'])
+    def reenfileirar_mensagens(self, request, queryset):
+        return executar_acao_em_massa(request, queryset, 'reenfileirar_mensagens')
@@ -0,0 +1,203 @@
+"""
+Ações em massa do admin sobre invoices e fila de mensagens.
+
+Cada ação recebe uma lista de IDs e aplica a transição com UPDATE/DELETE
+em lote e bulk_create, sem o save() por objeto. Seleções grandes são
+processadas em lotes pela task_acao_em_massa, com o progresso guardado
+no cache.
+
+Atualizações em lote não disparam signals: as ações de invoice
+invalidam o cache do dashboard explicitamente após o commit.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from infra.financeiro.services.cache_dashboard import invalidar_dashboard
+from invoices.models import Invoice, MessageQueue
+from invoices.services.infinitepay_service import InfinitePayService
+from invoices.services.message_queue_service import TIPOS_COBRANCA, montar_mensagem_confirmacao
+
+# Acima disso a ação vai para o Celery
+LIMITE_SINCRONO = 500
+TAMANHO_LOTE = 500
+TIMEOUT_PROGRESSO = 60 * 60 * 24
+
+
+def _remover_cobrancas_pendentes(invoice_ids) -> int:
+    removidas, _ = MessageQueue.objects.filter(
+        invoice_id__in=invoice_ids,
+        tipo__in=TIPOS_COBRANCA,
+        status='pendente',
+    ).delete()
+    return removidas
+
+
+@transaction.atomic
+def marcar_pagos(invoice_ids) -> int:
+    """
+    Marca como pagos os invoices pendentes/atrasados.
+
+    Remove as cobranças pendentes e enfileira a confirmação de pagamento
+    (enviada pelo task_processar_fila_waha).
+
+    Returns:
+        int: Quantidade de invoices alterados
+    """
+    invoices = list(
+        Invoice.objects.select_for_update().filter(
+            pk__in=invoice_ids,
+            status__in=['pendente', 'atrasado'],
+        ).select_related('cliente')
+    )
+    if not invoices:
+        return 0
+
+    ids = [invoice.pk for invoice in invoices]
+    agora = timezone.now()
+    Invoice.objects.filter(pk__in=ids).update(status='pago', pago_em=agora)
+    _remover_cobrancas_pendentes(ids)
+    MessageQueue.objects.bulk_create(
+        [
+            MessageQueue(
+                invoice=invoice,
+                tipo='confirmacao',
+                telefone=invoice.cliente.telefone,
+                mensagem=montar_mensagem_confirmacao(invoice),
+                agendado_para=agora,
+                status='pendente',
+            )
+            for invoice in invoices if invoice.cliente.telefone
+        ],
+        ignore_conflicts=True,
+    )
+    transaction.on_commit(invalidar_dashboard)
+    return len(ids)
+
+
+@transaction.atomic
+def cancelar_invoices(invoice_ids) -> int:
+    """
+    Cancela invoices ainda não pagos e remove as cobranças pendentes.
+
+    Returns:
+        int: Quantidade de invoices cancelados
+    """
+    ids = list(
+        Invoice.objects.filter(pk__in=invoice_ids).exclude(
+            status__in=['pago', 'cancelado']
+        ).values_list('pk', flat=True)
+    )
+    if not ids:
+        return 0
+
+    Invoice.objects.filter(pk__in=ids).update(status='cancelado')
+    _remover_cobrancas_pendentes(ids)
+    transaction.on_commit(invalidar_dashboard)
+    return len(ids)
+
+
+def regenerar_checkouts(invoice_ids) -> int:
+    """
+    Gera novamente o checkout InfinitePay dos invoices em aberto.
+
+    Uma chamada HTTP por invoice (não há endpoint em lote), por isso
+    esta ação sempre roda no Celery.
+
+    Returns:
+        int: Quantidade de checkouts gerados com sucesso
+    """
+    service = InfinitePayService()
+    invoices = Invoice.objects.filter(
+        pk__in=invoice_ids,
+        status__in=['pendente', 'atrasado'],
+    ).select_related('cliente')
+    return sum(1 for invoice in invoices if service.try_create_checkout(invoice))
+
+
+def reenfileirar_mensagens(mensagem_ids) -> int:
+    """
+    Volta para a fila as mensagens com erro, zerando as tentativas.
+
+    Returns:
+        int: Quantidade de mensagens reenfileiradas
+    """
+    total = MessageQueue.objects.filter(
+        pk__in=mensagem_ids,
+        status='erro',
+    ).update(status='pendente', tentativas=0, agendado_para=timezone.now())
+    transaction.on_commit(invalidar_dashboard)
+    return total
+
+
+# nome -> (função, sempre assíncrona)
+ACOES = {
+    'marcar_pagos': (marcar_pagos, False),
+    'cancelar': (cancelar_invoices, False),
+    'regenerar_checkouts': (regenerar_checkouts, True),
+    'reenfileirar_mensagens': (reenfileirar_mensagens, False),
+}
+
+
+def executar_sincrono(acao: str, total: int) -> bool:
+    """Se a ação deve rodar na própria requisição do admin."""
+    _, sempre_assincrona = ACOES[acao]
+    return not sempre_assincrona and total <= LIMITE_SINCRONO
+
+
+def _chave_progresso(identificador: str) -> str:
+    return f'invoices:acao_em_massa:{identificador}'
+
+
+def iniciar_progresso(acao: str, total: int) -> str:
+    """Registra uma execução em segundo plano e retorna seu identificador."""
+    identificador = uuid.uuid4().hex
+    cache.set(_chave_progresso(identificador), {
+        'acao': acao,
+        'total': total,
+        'processados': 0,
+        'alterados': 0,
+        'concluido': False,
+        'erro': '',
+    }, TIMEOUT_PROGRESSO)
+    return identificador
+
+
+def obter_progresso(identificador: str):
+    """Progresso da execução, ou None se desconhecida/expirada."""
+    return cache.get(_chave_progresso(identificador))
+
+
+def processar_em_lotes(acao: str, ids: list, identificador: str = None) -> int:
+    """
+    Aplica a ação em lotes de TAMANHO_LOTE, atualizando o progresso.
+
+    Um lote com erro encerra a execução: o progresso é marcado como
+    concluído com o erro (os lotes anteriores já foram gravados) e a
+    exceção é propagada.
+
+    Returns:
+        int: Total de registros alterados
+    """
+    funcao, _ = ACOES[acao]
+    progresso = obter_progresso(identificador) if identificador else None
+    alterados = 0
+
+    try:
+        for inicio in range(0, len(ids), TAMANHO_LOTE):
+            alterados += funcao(ids[inicio:inicio + TAMANHO_LOTE])
+            if progresso is not None:
+                progresso.update(processados=min(inicio + TAMANHO_LOTE, len(ids)), alterados=alterados)
+                cache.set(_chave_progresso(identificador), progresso, TIMEOUT_PROGRESSO)
+    except Exception as exc:
+        if progresso is not None:
+            progresso.update(concluido=True, erro=str(exc)[:500] or exc.__class__.__name__)
+            cache.set(_chave_progresso(identificador), progresso, TIMEOUT_PROGRESSO)
+        raise
+
+    if progresso is not None:
+        progresso.update(processados=len(ids), concluido=True)
+        cache.set(_chave_progresso(identificador), progresso, TIMEOUT_PROGRESSO)
+    return alterados
@@ -8,6 +8,7 @@ from django.db import models
 import logging
 
 from invoices.models import Invoice, MessageQueue
+from invoices.services.acoes_em_massa import processar_em_lotes
 from invoices.services.invoice_service import gerar_invoices_mensais
 from invoices.services.infinitepay_service import InfinitePayService
 from invoices.services.message_queue_service import (
@@ -297,3 +298,24 @@ def task_processar_checkouts_infinitepay(self, limite=100):
         'sucessos': sucessos,
         'falhas': falhas,
     }
+
+
+@shared_task(bind=True)
+def task_acao_em_massa(self, acao, ids, identificador=None):
+    """
+    Executa em lotes uma ação em massa do admin (invoices ou mensagens).
+
+    Disparada pelo admin quando a seleção passa de LIMITE_SINCRONO ou a
+    ação depende de chamadas externas. O progresso fica no cache, sob o
+    identificador informado; um erro encerra o progresso com a mensagem.
+    Sem retry automático: os lotes já aplicados não seriam refeitos do
+    zero, e o admin pode disparar a ação de novo para o restante.
+    """
+    alterados = processar_em_lotes(acao, ids, identificador)
+
+    logger.info("Acao em massa %s: %s selecionados, %s alterados", acao, len(ids), alterados)
+    return {
+        'acao': acao,
+        'total': len(ids),
+        'alterados': alterados,
+    }
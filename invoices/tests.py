@@ -3,12 +3,16 @@ from datetime import timedelta
 from decimal import Decimal
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
 from clientes.models import Cliente
-from invoices.models import Invoice, MessageQueue
+from contratos.models import Contrato
+from invoices.models import Invoice, InvoiceContrato, MessageQueue
 from invoices.services.message_queue_service import montar_mensagem_cobranca
 from invoices.tasks import task_processar_fila_waha
 
@@ -180,3 +184,250 @@ class InvoicesWahaQueueProcessingTests(TestCase):
         args, _ = send_message_mock.call_args
         self.assertEqual(args[0], self.cliente.telefone)
         self.assertIn('venceu em', args[1])
+
+
+class InvoicesAdminChangelistTests(TestCase):
+    def setUp(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+        self.indice = 0
+
+    def _criar_invoices(self, quantidade):
+        for _ in range(quantidade):
+            self.indice += 1
+            cliente = Cliente.objects.create(
+                nome=f'Cliente {self.indice}',
+                email=f'cliente-admin-{self.indice}@example.com',
+                telefone=f'1197777{self.indice:04d}',
+                tipo='pessoa_juridica',
+            )
+            contrato = Contrato.objects.create(
+                cliente=cliente,
+                nome=f'Contrato {self.indice}',
+                valor_mensal=Decimal('100.00'),
+                data_inicio=timezone.localdate(),
+            )
+            invoice = Invoice.objects.create(
+                cliente=cliente,
+                mes_referencia=3,
+                ano_referencia=2026,
+                valor_total=Decimal('100.00'),
+                vencimento=timezone.localdate(),
+            )
+            InvoiceContrato.objects.create(invoice=invoice, contrato=contrato, valor=Decimal('100.00'))
+            MessageQueue.objects.create(
+                invoice=invoice,
+                telefone=cliente.telefone,
+                mensagem='Cobrança',
+                tipo='no_dia',
+                agendado_para=timezone.now(),
+            )
+
+    def _queries_changelist(self, nome_url):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(reverse(nome_url))
+        self.assertEqual(resposta.status_code, 200)
+        return len(contexto.captured_queries), resposta
+
+    def test_changelists_com_numero_fixo_de_queries(self):
+        for nome_url in ('admin:invoices_invoice_changelist', 'admin:invoices_messagequeue_changelist'):
+            with self.subTest(nome_url=nome_url):
+                self._criar_invoices(2)
+                poucas, _ = self._queries_changelist(nome_url)
+                self._criar_invoices(10)
+                muitas, resposta = self._queries_changelist(nome_url)
+                # O filtro lateral de clientes lista os clientes numa única query
+                self.assertEqual(poucas, muitas)
+
+        self.assertContains(
+            self.client.get(reverse('admin:invoices_invoice_changelist')), '1 contrato(s)', count=24
+        )
+
+
+class InvoicesBuscaIndexadaTests(TestCase):
+    def setUp(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+        self.cliente = Cliente.objects.create(
+            nome='Padaria São João',
+            email='padaria@example.com',
+            telefone='11955555555',
+            tipo='pessoa_juridica',
+        )
+        outro = Cliente.objects.create(
+            nome='Oficina Central',
+            email='oficina@example.com',
+            tipo='pessoa_juridica',
+        )
+        self.invoice = Invoice.objects.create(
+            cliente=self.cliente,
+            mes_referencia=3,
+            ano_referencia=2026,
+            valor_total=Decimal('80.00'),
+            vencimento=timezone.localdate(),
+            order_nsu='NSU-778899',
+        )
+        self.outro_invoice = Invoice.objects.create(
+            cliente=outro,
+            mes_referencia=3,
+            ano_referencia=2026,
+            valor_total=Decimal('90.00'),
+            vencimento=timezone.localdate(),
+        )
+        self.mensagem = MessageQueue.objects.create(
+            invoice=self.invoice,
+            telefone=self.cliente.telefone,
+            mensagem='Olá! Sua cobrança de março vence hoje.',
+            tipo='no_dia',
+            agendado_para=timezone.now(),
+        )
+
+    def _ids_encontrados(self, url, termo):
+        resposta = self.client.get(reverse(url), {'q': termo})
+        self.assertEqual(resposta.status_code, 200)
+        return {obj.pk for obj in resposta.context['cl'].result_list}
+
+    def test_busca_por_prefixo_sem_acento_via_indice(self):
+        from app.busca import subconsulta_busca
+
+        self.assertIsNotNone(subconsulta_busca(MessageQueue, 'cobranca'))
+        url = 'admin:invoices_messagequeue_changelist'
+        self.assertEqual(self._ids_encontrados(url, 'cobranca marc'), {self.mensagem.pk})
+        self.assertEqual(self._ids_encontrados(url, 'abril'), set())
+        # Campo fora do índice continua na busca padrão
+        self.assertEqual(self._ids_encontrados(url, str(self.invoice.pk)), {self.mensagem.pk})
+
+        # Os triggers mantêm o índice em atualizações
+        self.mensagem.mensagem = 'Pagamento de abril confirmado'
+        self.mensagem.save()
+        self.assertEqual(self._ids_encontrados(url, 'abril'), {self.mensagem.pk})
+        self.assertEqual(self._ids_encontrados(url, 'cobranca'), set())
+
+    def test_busca_de_invoices_pelo_nome_do_cliente_e_nsu(self):
+        url = 'admin:invoices_invoice_changelist'
+        self.assertEqual(self._ids_encontrados(url, 'joao pada'), {self.invoice.pk})
+        self.assertEqual(self._ids_encontrados(url, '778899'), {self.invoice.pk})
+        self.assertEqual(self._ids_encontrados(url, 'oficina'), {self.outro_invoice.pk})
+
+    def test_busca_por_trecho_de_identificadores(self):
+        # Telefone e NSU ficam fora do índice: trechos do meio também casam
+        self.assertEqual(
+            self._ids_encontrados('admin:invoices_invoice_changelist', '8899'), {self.invoice.pk}
+        )
+        self.assertEqual(
+            self._ids_encontrados('admin:invoices_messagequeue_changelist', '55555'), {self.mensagem.pk}
+        )
+
+
+class InvoicesAcoesEmMassaTests(TestCase):
+    def setUp(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(usuario)
+        self.invoices = []
+        for indice, status in enumerate(['pendente', 'atrasado', 'pago']):
+            cliente = Cliente.objects.create(
+                nome=f'Cliente Massa {indice}',
+                email=f'cliente-massa-{indice}@example.com',
+                telefone=f'1196666{indice:04d}',
+                tipo='pessoa_juridica',
+            )
+            invoice = Invoice.objects.create(
+                cliente=cliente,
+                mes_referencia=3,
+                ano_referencia=2026,
+                valor_total=Decimal('50.00'),
+                vencimento=timezone.localdate(),
+                status=status,
+            )
+            MessageQueue.objects.create(
+                invoice=invoice,
+                telefone=cliente.telefone,
+                mensagem='Cobrança',
+                tipo='no_dia',
+                agendado_para=timezone.now(),
+            )
+            self.invoices.append(invoice)
+
+    def _executar(self, acao, objetos, url='admin:invoices_invoice_changelist'):
+        return self.client.post(reverse(url), {
+            'action': acao,
+            '_selected_action': [obj.pk for obj in objetos],
+        })
+
+    def test_marcar_pagos_em_lote(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self._executar('marcar_pagos', self.invoices)
+
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(
+            list(Invoice.objects.order_by('pk').values_list('status', flat=True)),
+            ['pago', 'pago', 'pago'],
+        )
+        self.assertEqual(Invoice.objects.filter(pago_em__isnull=False).count(), 2)
+        # Cobranças pendentes removidas e confirmação enfileirada só para os alterados
+        self.assertEqual(
+            sorted(MessageQueue.objects.values_list('invoice_id', 'tipo')),
+            sorted([
+                (self.invoices[0].pk, 'confirmacao'),
+                (self.invoices[1].pk, 'confirmacao'),
+                (self.invoices[2].pk, 'no_dia'),
+            ]),
+        )
+
+    def test_reenfileirar_mensagens_com_erro(self):
+        MessageQueue.objects.filter(invoice=self.invoices[0]).update(status='erro', tentativas=3)
+
+        self._executar('reenfileirar_mensagens', MessageQueue.objects.all(), 'admin:invoices_messagequeue_changelist')
+
+        mensagem = MessageQueue.objects.get(invoice=self.invoices[0])
+        self.assertEqual((mensagem.status, mensagem.tentativas), ('pendente', 0))
+
+    @patch('invoices.services.acoes_em_massa.TAMANHO_LOTE', 1)
+    @patch('invoices.services.acoes_em_massa.LIMITE_SINCRONO', 1)
+    @patch('invoices.admin.task_acao_em_massa')
+    def test_selecao_grande_vai_para_o_celery_com_progresso(self, task_mock):
+        from invoices.tasks import task_acao_em_massa
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self._executar('cancelar', self.invoices)
+
+        self.assertEqual(Invoice.objects.filter(status='cancelado').count(), 0)
+        acao, ids, identificador = task_mock.delay.call_args.args
+        self.assertRedirects(resposta, reverse('admin:invoices_acao_em_massa', args=[identificador]))
+        self.assertContains(self.client.get(resposta.url), '0 de 3 registro(s)')
+
+        resultado = task_acao_em_massa.run(acao, ids, identificador)
+
+        self.assertEqual(resultado['alterados'], 2)
+        self.assertEqual(Invoice.objects.filter(status='cancelado').count(), 2)
+        self.assertFalse(MessageQueue.objects.filter(invoice__status='cancelado').exists())
+        progresso = self.client.get(resposta.url)
+        self.assertContains(progresso, '3 de 3 registro(s) processados (100%), 2 alterado(s)')
+        self.assertContains(progresso, 'Concluído')
+
+    @patch('invoices.services.acoes_em_massa.TAMANHO_LOTE', 1)
+    def test_erro_em_um_lote_encerra_o_progresso_com_a_mensagem(self):
+        from invoices.services.acoes_em_massa import ACOES, iniciar_progresso, obter_progresso
+        from invoices.tasks import task_acao_em_massa
+
+        ids = [invoice.pk for invoice in self.invoices]
+        identificador = iniciar_progresso('cancelar', len(ids))
+        cancelar, assincrona = ACOES['cancelar']
+        chamadas = []
+
+        def falhar_no_segundo_lote(lote):
+            chamadas.append(lote)
+            if len(chamadas) == 2:
+                raise RuntimeError('banco indisponível')
+            return cancelar(lote)
+
+        with patch.dict(ACOES, {'cancelar': (falhar_no_segundo_lote, assincrona)}):
+            with self.assertRaises(RuntimeError):
+                task_acao_em_massa.run('cancelar', ids, identificador)
+
+        progresso = obter_progresso(identificador)
+        self.assertTrue(progresso['concluido'])
+        self.assertEqual((progresso['processados'], progresso['erro']), (1, 'banco indisponível'))
+        pagina = self.client.get(reverse('admin:invoices_acao_em_massa', args=[identificador]))
+        self.assertContains(pagina, 'Interrompido:</strong> banco indisponível')
+        self.assertNotContains(pagina, 'http-equiv="refresh"')
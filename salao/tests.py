@@ -973,6 +973,30 @@ class SalaoViewsTests(TestCase):
         rows = list(response.context['despesas_por_subcategoria'])
         self.assertTrue(any(item['subcategoria_nome'] == self.subcategoria.nome for item in rows))
 
+    def test_dashboard_grafico_comparativo_com_get_condicional(self):
+        self._login()
+        self._create_lancamento(data=date(2026, 3, 10), valor_bruto=Decimal('100.00'))
+        url = reverse('salao:dashboard_grafico', args=['comparativo'])
+
+        response = self.client.get(url, {'ano': 2026, 'mes': 3})
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual(dados['labels'][-1], '03/2026')
+        self.assertEqual(dados['faturamento'][-1], 100.0)
+        self.assertEqual(dados['atendimentos'][-1], 1)
+
+        response_304 = self.client.get(url, {'ano': 2026, 'mes': 3}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response_304.status_code, 304)
+
+        self._create_lancamento(data=date(2026, 3, 11), valor_bruto=Decimal('50.00'))
+        response_novo = self.client.get(url, {'ano': 2026, 'mes': 3}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response_novo.status_code, 200)
+        self.assertEqual(response_novo.json()['atendimentos'][-1], 2)
+
+        dias = self.client.get(reverse('salao:dashboard_grafico', args=['atendimentos-dia']), {'ano': 2026, 'mes': 3})
+        self.assertEqual(len(dias.json()['labels']), 31)
+        self.assertEqual(self.client.get(reverse('salao:dashboard_grafico', args=['x'])).status_code, 404)
+
     def test_grid_lancamentos_filtra_por_servico_e_pagamento(self):
         self._login()
         outro_servico = ServicoSalao.objects.create(
@@ -11,6 +11,7 @@ urlpatterns = [
     path('produtos/', views.produtos, name='produtos'),
     path('estoque/', views.estoque, name='estoque'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/graficos/<str:nome>/', views.dashboard_grafico, name='dashboard_grafico'),
     path(
         'dashboard/relatorio-lancamentos/',
         views.dashboard_relatorio_lancamentos,
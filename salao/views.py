@@ -1,4 +1,5 @@
 import calendar
+import hashlib
 import re
 import uuid
 from datetime import date
@@ -10,13 +11,15 @@ from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import CharField, Count, F, Sum, Value
+from django.db.models import CharField, Count, F, Max, Sum, Value
 from django.db.models.deletion import ProtectedError
 from django.db.models.functions import Coalesce
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
 
 from .models import (
     CompraEstoqueItemSalao,
@@ -1537,6 +1540,134 @@ def pagamentos(request):
     return render(request, 'salao/pagamentos.html', context)
 
 
+def _series_mensais_dashboard(ano, mes, quantidade=6):
+    """
+    Séries dos últimos meses para os gráficos comparativo e de operação.
+
+    Lançamentos e despesas da janela inteira são agrupados por mês em
+    uma query cada (em vez de cinco queries por mês).
+    """
+    serie_meses = _iter_months_backwards(ano, mes, quantidade=quantidade)
+    ano_inicio, mes_inicio = serie_meses[0]
+    inicio = date(ano_inicio, mes_inicio, 1)
+    fim = date(ano, mes, calendar.monthrange(ano, mes)[1])
+
+    lancamentos_por_mes = {
+        (item['data__year'], item['data__month']): item
+        for item in LancamentoSalao.objects.filter(data__gte=inicio, data__lte=fim)
+        .values('data__year', 'data__month')
+        .annotate(faturamento=Sum('valor_cobrado'), taxas=Sum('valor_taxa'), qtd=Count('id'))
+        .order_by()
+    }
+    despesas_por_mes = {
+        (item['data__year'], item['data__month']): item['total']
+        for item in DespesaSalao.objects.filter(data__gte=inicio, data__lte=fim)
+        .values('data__year', 'data__month')
+        .annotate(total=Sum('valor'))
+        .order_by()
+    }
+    existing_commissions = {
+        (item.ano, item.mes): item.percentual
+        for item in ComissaoMensalSalao.objects.filter(
+            ano__in={item_ano for item_ano, _ in serie_meses}
+        )
+    }
+
+    series = {
+        'labels': [],
+        'faturamento': [],
+        'taxas': [],
+        'despesas': [],
+        'lucro': [],
+        'atendimentos': [],
+        'ticket_medio': [],
+    }
+
+    for ano_item, mes_item in serie_meses:
+        lancamentos_item = lancamentos_por_mes.get((ano_item, mes_item), {})
+
+        faturamento_item = lancamentos_item.get('faturamento') or Decimal('0.00')
+        taxas_item = lancamentos_item.get('taxas') or Decimal('0.00')
+        despesas_item_total = despesas_por_mes.get((ano_item, mes_item)) or Decimal('0.00')
+        percentual_item = existing_commissions.get((ano_item, mes_item), Decimal('20.00'))
+        comissao_item = (faturamento_item * percentual_item / Decimal('100.00')).quantize(
+            Decimal('0.01'),
+            rounding=ROUND_HALF_UP,
+        )
+        lucro_item = faturamento_item - comissao_item - despesas_item_total
+        qtd_item = lancamentos_item.get('qtd', 0)
+        ticket_item = (
+            (faturamento_item / Decimal(qtd_item)).quantize(Decimal('0.01'))
+            if qtd_item > 0
+            else Decimal('0.00')
+        )
+
+        series['labels'].append(f"{mes_item:02d}/{ano_item}")
+        series['faturamento'].append(float(faturamento_item))
+        series['taxas'].append(float(taxas_item))
+        series['despesas'].append(float(despesas_item_total))
+        series['lucro'].append(float(lucro_item))
+        series['atendimentos'].append(qtd_item)
+        series['ticket_medio'].append(float(ticket_item))
+
+    return series
+
+
+def _serie_atendimentos_dia(ano, mes):
+    atendimentos_por_dia_qs = (
+        LancamentoSalao.objects.filter(data__year=ano, data__month=mes)
+        .values('data__day')
+        .annotate(qtd=Count('id'), total=Sum('valor_cobrado'))
+        .order_by('data__day')
+    )
+    map_qtd_por_dia = {item['data__day']: item['qtd'] for item in atendimentos_por_dia_qs}
+    map_total_por_dia = {item['data__day']: float(item['total'] or 0) for item in atendimentos_por_dia_qs}
+    dias_mes_chart = calendar.monthrange(ano, mes)[1]
+    return {
+        'labels': [f"{dia:02d}" for dia in range(1, dias_mes_chart + 1)],
+        'atendimentos': [map_qtd_por_dia.get(dia, 0) for dia in range(1, dias_mes_chart + 1)],
+        'faturamento': [map_total_por_dia.get(dia, 0.0) for dia in range(1, dias_mes_chart + 1)],
+    }
+
+
+def _versao_graficos_salao(request):
+    """
+    Versão dos dados dos gráficos: quantidade e última alteração de
+    lançamentos, despesas e comissões (exclusões mudam a quantidade).
+    Calculada uma vez por request e usada no ETag e no Last-Modified.
+    """
+    if not hasattr(request, '_versao_graficos_salao'):
+        partes = []
+        ultima_alteracao = None
+        for model, campo in (
+            (LancamentoSalao, 'atualizado_em'),
+            (DespesaSalao, 'atualizado_em'),
+            (ComissaoMensalSalao, 'updated_at'),
+        ):
+            info = model.objects.aggregate(qtd=Count('id'), ultima=Max(campo))
+            partes.append(f"{info['qtd']}:{info['ultima'].isoformat() if info['ultima'] else '-'}")
+            if info['ultima'] and (ultima_alteracao is None or info['ultima'] > ultima_alteracao):
+                ultima_alteracao = info['ultima']
+        request._versao_graficos_salao = ('|'.join(partes), ultima_alteracao)
+    return request._versao_graficos_salao
+
+
+def _etag_grafico_salao(request, nome):
+    ano, mes = _parse_competencia(request)
+    versao, _ = _versao_graficos_salao(request)
+    return hashlib.md5(f'{nome}:{ano}:{mes}:{versao}'.encode()).hexdigest()
+
+
+def _last_modified_grafico_salao(request, nome):
+    return _versao_graficos_salao(request)[1]
+
+
+GRAFICOS_DASHBOARD = {
+    'comparativo': lambda ano, mes: _series_mensais_dashboard(ano, mes),
+    'atendimentos-dia': lambda ano, mes: _serie_atendimentos_dia(ano, mes),
+}
+
+
 @_salao_superuser_required
 def dashboard(request):
     ano, mes = _parse_competencia(request)
@@ -1651,62 +1782,8 @@ def dashboard(request):
         .order_by('saldo_atual', 'codigo')[:15]
     )
 
-    serie_meses = _iter_months_backwards(ano, mes, quantidade=6)
-    existing_commissions = {
-        (item.ano, item.mes): item.percentual
-        for item in ComissaoMensalSalao.objects.filter(
-            ano__in={item_ano for item_ano, _ in serie_meses}
-        )
-    }
-
-    chart_labels = []
-    chart_faturamento = []
-    chart_taxas = []
-    chart_despesas = []
-    chart_lucro = []
-    chart_atendimentos = []
-    chart_ticket = []
-
-    for ano_item, mes_item in serie_meses:
-        label = f"{mes_item:02d}/{ano_item}"
-        lancamentos_item = LancamentoSalao.objects.filter(data__year=ano_item, data__month=mes_item)
-        despesas_item = DespesaSalao.objects.filter(data__year=ano_item, data__month=mes_item)
-
-        faturamento_item = lancamentos_item.aggregate(total=Sum('valor_cobrado'))['total'] or Decimal('0.00')
-        taxas_item = lancamentos_item.aggregate(total=Sum('valor_taxa'))['total'] or Decimal('0.00')
-        despesas_item_total = despesas_item.aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
-        percentual_item = existing_commissions.get((ano_item, mes_item), Decimal('20.00'))
-        comissao_item = (faturamento_item * percentual_item / Decimal('100.00')).quantize(
-            Decimal('0.01'),
-            rounding=ROUND_HALF_UP,
-        )
-        lucro_item = faturamento_item - comissao_item - despesas_item_total
-        qtd_item = lancamentos_item.count()
-        ticket_item = (
-            (faturamento_item / Decimal(qtd_item)).quantize(Decimal('0.01'))
-            if qtd_item > 0
-            else Decimal('0.00')
-        )
-
-        chart_labels.append(label)
-        chart_faturamento.append(float(faturamento_item))
-        chart_taxas.append(float(taxas_item))
-        chart_despesas.append(float(despesas_item_total))
-        chart_lucro.append(float(lucro_item))
-        chart_atendimentos.append(qtd_item)
-        chart_ticket.append(float(ticket_item))
-
-    atendimentos_por_dia_qs = (
-        lancamentos_mes.values('data__day')
-        .annotate(qtd=Count('id'), total=Sum('valor_cobrado'))
-        .order_by('data__day')
-    )
-    map_qtd_por_dia = {item['data__day']: item['qtd'] for item in atendimentos_por_dia_qs}
-    map_total_por_dia = {item['data__day']: float(item['total'] or 0) for item in atendimentos_por_dia_qs}
-    dias_mes_chart = calendar.monthrange(ano, mes)[1]
-    dias_labels = [f"{dia:02d}" for dia in range(1, dias_mes_chart + 1)]
-    dias_qtd = [map_qtd_por_dia.get(dia, 0) for dia in range(1, dias_mes_chart + 1)]
-    dias_total = [map_total_por_dia.get(dia, 0.0) for dia in range(1, dias_mes_chart + 1)]
+    series_mensais = _series_mensais_dashboard(ano, mes)
+    atendimentos_dia_chart = _serie_atendimentos_dia(ano, mes)
 
     context = {
         'active_tab': 'dashboard',
@@ -1746,26 +1823,35 @@ def dashboard(request):
             'faltante': float(valor_faltante_meta or Decimal('0.00')),
         },
         'comparativo_chart': {
-            'labels': chart_labels,
-            'faturamento': chart_faturamento,
-            'taxas': chart_taxas,
-            'despesas': chart_despesas,
-            'lucro': chart_lucro,
+            'labels': series_mensais['labels'],
+            'faturamento': series_mensais['faturamento'],
+            'taxas': series_mensais['taxas'],
+            'despesas': series_mensais['despesas'],
+            'lucro': series_mensais['lucro'],
         },
         'operacao_chart': {
-            'labels': chart_labels,
-            'atendimentos': chart_atendimentos,
-            'ticket_medio': chart_ticket,
-        },
-        'atendimentos_dia_chart': {
-            'labels': dias_labels,
-            'atendimentos': dias_qtd,
-            'faturamento': dias_total,
+            'labels': series_mensais['labels'],
+            'atendimentos': series_mensais['atendimentos'],
+            'ticket_medio': series_mensais['ticket_medio'],
         },
+        'atendimentos_dia_chart': atendimentos_dia_chart,
     }
     return render(request, 'salao/dashboard.html', context)
 
 
+@_salao_superuser_required
+@require_GET
+@condition(etag_func=_etag_grafico_salao, last_modified_func=_last_modified_grafico_salao)
+def dashboard_grafico(request, nome):
+    """Dados colunares de um gráfico do dashboard, com GET condicional (304)."""
+    if nome not in GRAFICOS_DASHBOARD:
+        raise Http404('Gráfico inexistente')
+    ano, mes = _parse_competencia(request)
+    response = JsonResponse(GRAFICOS_DASHBOARD[nome](ano, mes))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 @_salao_superuser_required
 def dashboard_relatorio_lancamentos(request):
     ano, mes = _parse_competencia(request)
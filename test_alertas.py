@@ -8,102 +8,46 @@ Uso:
 import os
 import sys
 import django
-from datetime import date, timedelta
+from datetime import date
 
 # Setup Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 django.setup()
 
+from django.conf import settings
+
 from infra.financeiro.tasks import task_alertar_vencimentos
-from infra.dominios.models import DomainCost
-from infra.vps.models import VPSCost
-from infra.emails.models import DomainEmailCost
-from infra.hosting.models import HostingCost
-from infra.backups.models import VPSBackupCost
+from infra.financeiro.services.alertas_vencimento import alertas_pendentes, limiares_configurados
 
 
-def verificar_custos_ativos():
-    """Verifica quantos custos ativos existem no sistema."""
+def verificar_alertas_pendentes():
+    """Mostra, sem registrar nada, os alertas que a task enviaria hoje."""
     print("\n" + "="*60)
-    print("🔍 VERIFICAÇÃO DE CUSTOS ATIVOS")
+    print("🔍 PRÉVIA DOS ALERTAS PENDENTES")
     print("="*60)
     
     hoje = date.today()
-    datas_alerta = [
-        hoje,
-        hoje + timedelta(days=7),
-        hoje + timedelta(days=30)
-    ]
+    limiares = limiares_configurados()
     
     print(f"\n📅 Data de hoje: {hoje.strftime('%d/%m/%Y')}")
-    print(f"📅 Datas monitoradas:")
-    for d in datas_alerta:
-        print(f"   - {d.strftime('%d/%m/%Y')} ({(d - hoje).days} dias)")
-    
-    # Domínios
-    dominios = DomainCost.objects.filter(ativo=True)
-    dominios_vencendo = dominios.filter(vencimento__in=datas_alerta)
-    print(f"\n🌐 Domínios:")
-    print(f"   Total ativos: {dominios.count()}")
-    print(f"   Vencendo: {dominios_vencendo.count()}")
-    for cost in dominios_vencendo:
-        dias = (cost.vencimento - hoje).days
-        print(f"      • {cost.domain.nome} - Vence em {dias} dias ({cost.vencimento.strftime('%d/%m/%Y')}) - R$ {cost.valor_total}")
-    
-    # VPS
-    vps = VPSCost.objects.filter(ativo=True)
-    vps_vencendo = vps.filter(vencimento__in=datas_alerta)
-    print(f"\n💻 VPS:")
-    print(f"   Total ativos: {vps.count()}")
-    print(f"   Vencendo: {vps_vencendo.count()}")
-    for cost in vps_vencendo:
-        dias = (cost.vencimento - hoje).days
-        print(f"      • {cost.vps.nome} - Vence em {dias} dias ({cost.vencimento.strftime('%d/%m/%Y')}) - R$ {cost.valor_total}")
-    
-    # Emails
-    emails = DomainEmailCost.objects.filter(ativo=True)
-    emails_vencendo = emails.filter(vencimento__in=datas_alerta)
-    print(f"\n📧 Emails:")
-    print(f"   Total ativos: {emails.count()}")
-    print(f"   Vencendo: {emails_vencendo.count()}")
-    for cost in emails_vencendo:
-        dias = (cost.vencimento - hoje).days
-        print(f"      • {cost.email.dominio.nome} - Vence em {dias} dias ({cost.vencimento.strftime('%d/%m/%Y')}) - R$ {cost.valor_total}")
-    
-    # Hosting
-    hostings = HostingCost.objects.filter(ativo=True)
-    hostings_vencendo = hostings.filter(vencimento__in=datas_alerta)
-    print(f"\n🌐 Hostings:")
-    print(f"   Total ativos: {hostings.count()}")
-    print(f"   Vencendo: {hostings_vencendo.count()}")
-    for cost in hostings_vencendo:
-        dias = (cost.vencimento - hoje).days
-        print(f"      • {cost.hosting.nome} - Vence em {dias} dias ({cost.vencimento.strftime('%d/%m/%Y')}) - R$ {cost.valor_total}")
-    
-    # Backups
-    backups = VPSBackupCost.objects.filter(ativo=True)
-    backups_vencendo = backups.filter(vencimento__in=datas_alerta)
-    print(f"\n💾 Backups VPS:")
-    print(f"   Total ativos: {backups.count()}")
-    print(f"   Vencendo: {backups_vencendo.count()}")
-    for cost in backups_vencendo:
-        dias = (cost.vencimento - hoje).days
-        print(f"      • {cost.backup.nome} ({cost.backup.vps.nome}) - Vence em {dias} dias ({cost.vencimento.strftime('%d/%m/%Y')}) - R$ {cost.valor_total}")
-    
-    total_vencendo = (
-        dominios_vencendo.count() + 
-        vps_vencendo.count() + 
-        emails_vencendo.count() + 
-        hostings_vencendo.count() + 
-        backups_vencendo.count()
-    )
+    print(f"📅 Limiares (ALERTA_VENCIMENTO_LIMIARES): {', '.join(f'{l} dias' for l in limiares)}")
+    print(f"📅 Recuperação: vencidos há até {settings.ALERTA_VENCIMENTO_RECUPERACAO_DIAS} dias")
+    
+    # Cada custo entra no limiar mais urgente já atingido e ainda não enviado
+    alertas = alertas_pendentes(hoje)
+    for alerta in alertas:
+        vencimento = date.fromisoformat(alerta['vencimento'])
+        print(
+            f"   • {alerta['tipo']}: {alerta['nome']} - Vence em {alerta['dias_restantes']} dias "
+            f"({vencimento.strftime('%d/%m/%Y')}) - limiar {alerta['limiar']} - R$ {alerta['valor']:.2f}"
+        )
     
     print(f"\n{'='*60}")
-    print(f"📊 TOTAL DE VENCIMENTOS: {total_vencendo}")
+    print(f"📊 TOTAL DE ALERTAS PENDENTES: {len(alertas)}")
     print(f"{'='*60}\n")
     
-    return total_vencendo
+    return len(alertas)
 
 
 def testar_task():
@@ -125,11 +69,12 @@ def testar_task():
                 print(f"\n   • {alerta['tipo']}: {alerta['nome']}")
                 print(f"     Vencimento: {alerta['vencimento']}")
                 print(f"     Dias restantes: {alerta['dias_restantes']}")
+                print(f"     Limiar: {alerta['limiar']} dias")
                 print(f"     Valor: R$ {alerta['valor']:.2f}")
                 if 'fornecedor' in alerta:
                     print(f"     Fornecedor: {alerta['fornecedor']}")
         else:
-            print(f"\n   ℹ️ Nenhum vencimento encontrado nos próximos 30 dias.")
+            print(f"\n   ℹ️ Nenhum limiar de vencimento atingido.")
         
         return True
         
@@ -147,8 +92,8 @@ def main():
     print("🧪 TESTE DO SISTEMA DE ALERTAS DE VENCIMENTO")
     print("="*60)
     
-    # 1. Verificar custos
-    total_vencimentos = verificar_custos_ativos()
+    # 1. Prévia dos alertas
+    total_vencimentos = verificar_alertas_pendentes()
     
     # 2. Executar task
     sucesso = testar_task()
@@ -159,18 +104,16 @@ def main():
     print("="*60)
     
     if total_vencimentos == 0:
-        print("\n⚠️ ATENÇÃO: Não há vencimentos nos próximos 30 dias.")
-        print("   Para testar o envio de email, cadastre custos com vencimento:")
-        print("   - Hoje")
-        print("   - Daqui a 7 dias")
-        print("   - Daqui a 30 dias")
+        print("\n⚠️ ATENÇÃO: Nenhum alerta pendente.")
+        print("   Para testar o envio de email, cadastre um custo que vença em até")
+        print(f"   {max(limiares_configurados(), default=0)} dias (alertas já enviados não se repetem).")
     else:
         print(f"\n✅ {total_vencimentos} vencimento(s) encontrado(s).")
     
     if sucesso:
         print("\n✅ Task executada com sucesso!")
         if total_vencimentos > 0:
-            print("\n📧 Email enviado para: nicolaskcdev@gmail.com")
+            print(f"\n📧 Email enfileirado para: {settings.ALERT_EMAIL_RECIPIENT}")
             print("   Verifique sua caixa de entrada.")
     else:
         print("\n❌ Erro ao executar task.")